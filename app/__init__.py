@@ -10,12 +10,22 @@ def create_app(config_class=Config):
     # Initialize extensions
     db.init_app(app)
     migrate.init_app(app, db)
+    from app.utils.query_stats import init_query_stats
+    init_query_stats(app) # Per-request/task query counts, slow-query log
 
     # Import models so Alembic can detect them
     from app import models
     jwt.init_app(app)
-    socketio.init_app(app)
+    from app.services import token_blocklist # Register the JWT revocation check
+    # Handlers must be registered before init_app so every app's server gets them
     from app.sockets import location_socket # Register socket events
+    # Drop a queue manager left by a previously created app (tests create many apps)
+    socketio.server_options.pop('client_manager', None)
+    socketio.init_app(
+        app,
+        message_queue=app.config.get('SOCKETIO_MESSAGE_QUEUE'),
+        channel=app.config.get('SOCKETIO_CHANNEL', 'asfalis-socketio')
+    )
     mail.init_app(app)
     cors.init_app(app)
     limiter.init_app(app)
@@ -23,6 +33,7 @@ def create_app(config_class=Config):
     # Initialize Celery
     from app.utils.celery_utils import celery_init_app
     celery_init_app(app)
+    from app import tasks # Register Celery tasks
 
     # Register Blueprints
     from app.routes.auth import auth_bp
@@ -34,6 +45,8 @@ def create_app(config_class=Config):
     from app.routes.device import device_bp
     from app.routes.support import support_bp
     from app.routes.protection import protection_bp
+    from app.routes.geofence import geofence_bp
+    from app.routes.tracking import tracking_bp
 
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(user_bp, url_prefix='/api/user')
@@ -44,11 +57,21 @@ def create_app(config_class=Config):
     app.register_blueprint(device_bp, url_prefix='/api/device')
     app.register_blueprint(support_bp, url_prefix='/api/support')
     app.register_blueprint(protection_bp, url_prefix='/api/protection')
+    app.register_blueprint(geofence_bp, url_prefix='/api/geofences')
+    app.register_blueprint(tracking_bp, url_prefix='/track')
+
+    from app.commands import register_commands
+    register_commands(app)
 
     @app.route('/health')
     def health_check():
         return jsonify({"status": "healthy", "service": "Asfalis-backend"}), 200
 
+    @app.route('/metrics')
+    def metrics_endpoint():
+        from app.utils.metrics import render_prometheus
+        return render_prometheus(), 200, {'Content-Type': 'text/plain; version=0.0.4'}
+
     
     # Global Error Handlers
     @app.errorhandler(400)
@@ -0,0 +1,30 @@
+"""Flask CLI commands (`flask <command>`)."""
+from flask import Flask
+import click
+
+
+@click.command('explain-audit')
+@click.option('--seed-rows', default=200, show_default=True, help='Throwaway rows per table (rolled back).')
+@click.option('--verbose', is_flag=True, help='Print every plan, not just the failures.')
+def explain_audit(seed_rows, verbose):
+    """EXPLAIN the hot service queries; exit 1 if any does a full table scan."""
+    from app.utils.query_audit import run_audit
+
+    failures = 0
+    for name, plan, scans in run_audit(seed_rows=seed_rows):
+        if scans:
+            failures += 1
+            click.echo(f"SCAN  {name}: full scan of {', '.join(sorted(set(scans)))}")
+        else:
+            click.echo(f"ok    {name}")
+        if scans or verbose:
+            for line in plan:
+                click.echo(f"        {line}")
+
+    if failures:
+        click.echo(f"{failures} quer{'y' if failures == 1 else 'ies'} without a usable index")
+        raise SystemExit(1)
+
+
+def register_commands(app: Flask):
+    app.cli.add_command(explain_audit)
@@ -1,6 +1,8 @@
 
 import os
 from datetime import timedelta
+from celery.schedules import crontab
+from kombu import Queue
 
 # Detect if running inside a Docker container
 _in_docker = os.path.exists('/.dockerenv')
@@ -18,25 +20,42 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///Asfalis.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Log statements slower than this; X-DB-Queries/X-DB-Time headers are added in debug or with SQL_QUERY_HEADERS
+    SQL_SLOW_QUERY_MS = float(os.environ.get('SQL_SLOW_QUERY_MS', 200))
+    SQL_QUERY_HEADERS = os.environ.get('SQL_QUERY_HEADERS', 'false').lower() in ['true', 'on', '1']
     
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-key'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(seconds=int(os.environ.get('JWT_ACCESS_TOKEN_EXPIRES', 900)))
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(seconds=int(os.environ.get('JWT_REFRESH_TOKEN_EXPIRES', 2592000)))
+    # Revoked jtis (logout) are kept in Redis, with a per-worker Bloom filter in front
+    TOKEN_BLOCKLIST_BLOOM_CAPACITY = int(os.environ.get('TOKEN_BLOCKLIST_BLOOM_CAPACITY', 100000))
+    TOKEN_BLOCKLIST_BLOOM_ERROR_RATE = float(os.environ.get('TOKEN_BLOCKLIST_BLOOM_ERROR_RATE', 0.001))
     
     OTP_EXPIRY_SECONDS = int(os.environ.get('OTP_EXPIRY_SECONDS', 300))
     MAX_OTP_ATTEMPTS = int(os.environ.get('MAX_OTP_ATTEMPTS', 5))
+    # Where OTP codes live: auto (redis if CACHE_REDIS_URL is set, else sql), redis, sql, memory
+    OTP_BACKEND = os.environ.get('OTP_BACKEND', 'auto')
     
     MAIL_SERVER = os.environ.get('MAIL_SERVER')
     MAIL_PORT = int(os.environ.get('MAIL_PORT', 587))
     MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS', 'true').lower() in ['true', 'on', '1']
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
+    # Pooled SMTP sender: close the shared connection after this many idle seconds
+    MAIL_POOL_IDLE_TIMEOUT = float(os.environ.get('MAIL_POOL_IDLE_TIMEOUT', 60))
+    MAIL_POOL_BATCH_SIZE = int(os.environ.get('MAIL_POOL_BATCH_SIZE', 20))
     
     TWILIO_ACCOUNT_SID = os.environ.get('TWILIO_ACCOUNT_SID')
     TWILIO_AUTH_TOKEN = os.environ.get('TWILIO_AUTH_TOKEN')
     TWILIO_PHONE_NUMBER = os.environ.get('TWILIO_PHONE_NUMBER')
     TWILIO_WHATSAPP_FROM = os.environ.get('TWILIO_WHATSAPP_FROM', 'whatsapp:+14155238886')
     TWILIO_SANDBOX_CODE = os.environ.get('TWILIO_SANDBOX_CODE', 'join <sandbox-code>')
+    # Password hashing (bcrypt runs on a thread pool, see app/services/password_hasher.py).
+    # Changing BCRYPT_ROUNDS re-hashes each password on its next login.
+    BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 4))
+    # Country code assumed for phone numbers entered without one (stored as E.164)
+    DEFAULT_PHONE_COUNTRY_CODE = os.environ.get('DEFAULT_PHONE_COUNTRY_CODE', '91')
     
     # Background Task Configuration (Celery)
     # Priority: explicit env var > Docker-resolved REDIS_URL > localhost default
@@ -45,7 +64,106 @@ class Config:
         broker_url=_resolve_redis_url(os.environ.get('CELERY_BROKER_URL', _redis_url)),
         result_backend=_resolve_redis_url(os.environ.get('CELERY_RESULT_BACKEND', _redis_url)),
         task_ignore_result=True,
+        # Separate queues so bulk/background work can never sit in front of SOS delivery
+        task_queues=(
+            Queue('sos'),
+            Queue('notifications'),
+            Queue('ingest'),
+            Queue('ml'),
+        ),
+        task_default_queue='notifications',
+        task_routes={
+            'sos.*': {'queue': 'sos'},
+            'notifications.*': {'queue': 'notifications'},
+            'ingest.*': {'queue': 'ingest'},
+            'ml.*': {'queue': 'ml'},
+        },
+        # Ack after the task runs so a crashed worker's SOS task is redelivered
+        task_acks_late=True,
+        task_reject_on_worker_lost=True,
+        beat_schedule={
+            # Retry/sweep notification outbox rows that weren't delivered on trigger
+            'deliver-pending-notifications': {
+                'task': 'sos.deliver_notifications',
+                'schedule': float(os.environ.get('NOTIFICATION_SWEEP_SECONDS', 30)),
+            },
+            # Cancel countdown alerts older than COUNTDOWN_EXPIRY_SECONDS
+            'expire-stale-countdowns': {
+                'task': 'sos.expire_stale_countdowns',
+                'schedule': float(os.environ.get('SOS_COUNTDOWN_SWEEP_SECONDS', 30)),
+            },
+            # Douglas-Peucker compaction of old tracks, once a day
+            'compact-location-history': {
+                'task': 'ingest.compact_location_history',
+                'schedule': crontab(hour=3, minute=0),
+            },
+            'rollup-location-history': {
+                'task': 'ingest.rollup_location_history',
+                'schedule': crontab(hour=0, minute=30),
+            },
+            # Future partitions + retention (PostgreSQL); daily so a missed run self-heals
+            'maintain-location-partitions': {
+                'task': 'ingest.maintain_location_partitions',
+                'schedule': crontab(hour=4, minute=0),
+            },
+            # Drop expired/used otp_records rows (no-op unless OTP_BACKEND resolves to sql)
+            'purge-expired-otps': {
+                'task': 'auth.purge_expired_otps',
+                'schedule': float(os.environ.get('OTP_PURGE_SECONDS', 3600)),
+            },
+        },
     )
+
+    # Per-queue worker settings used by `python celery_worker.py --queue <name>`.
+    # SOS workers prefetch one task at a time so a slow task never holds others back.
+    CELERY_WORKER_QUEUES = {
+        'sos': {
+            'concurrency': int(os.environ.get('CELERY_SOS_CONCURRENCY', 4)),
+            'prefetch_multiplier': 1,
+        },
+        'notifications': {
+            'concurrency': int(os.environ.get('CELERY_NOTIFICATIONS_CONCURRENCY', 4)),
+            'prefetch_multiplier': 4,
+        },
+        'ingest': {
+            'concurrency': int(os.environ.get('CELERY_INGEST_CONCURRENCY', 2)),
+            'prefetch_multiplier': 8,
+        },
+        'ml': {
+            'concurrency': int(os.environ.get('CELERY_ML_CONCURRENCY', 1)),
+            'prefetch_multiplier': 1,
+        },
+    }
+
+    # Socket.IO message queue: lets every web worker, and Celery workers, emit to any room.
+    # Unset = single-process mode (one web worker only). Tests can use 'memory://'.
+    _socketio_queue = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+    SOCKETIO_MESSAGE_QUEUE = _resolve_redis_url(_socketio_queue) if _socketio_queue else None
+    SOCKETIO_CHANNEL = os.environ.get('SOCKETIO_CHANNEL', 'asfalis-socketio')
+    # Live location: at most one update per tracking room per interval (0 = no throttling)
+    LOCATION_BROADCAST_MIN_INTERVAL = float(os.environ.get('LOCATION_BROADCAST_MIN_INTERVAL', 1.0))
+    USER_DISPLAY_CACHE_SIZE = int(os.environ.get('USER_DISPLAY_CACHE_SIZE', 10000))
+    USER_DISPLAY_CACHE_TTL = int(os.environ.get('USER_DISPLAY_CACHE_TTL', 300))
+    # load_user_context(): user + settings + contacts snapshots, per worker (invalidated on all workers via Redis)
+    USER_CONTEXT_CACHE_SIZE = int(os.environ.get('USER_CONTEXT_CACHE_SIZE', 10000))
+    USER_CONTEXT_CACHE_TTL = int(os.environ.get('USER_CONTEXT_CACHE_TTL', 15))
+    # join_tracking authorization answers, per (viewer, tracked user)
+    TRACKING_AUTHZ_CACHE_SIZE = int(os.environ.get('TRACKING_AUTHZ_CACHE_SIZE', 10000))
+    TRACKING_AUTHZ_CACHE_TTL = int(os.environ.get('TRACKING_AUTHZ_CACHE_TTL', 30))
+    # Public tracking links (/location/share/start -> GET /track/<session_id>)
+    TRACKING_BASE_URL = os.environ.get('TRACKING_BASE_URL', 'https://Asfalis.app/track')
+    TRACKING_SESSION_TTL_MINUTES = int(os.environ.get('TRACKING_SESSION_TTL_MINUTES', 240))
+    TRACKING_SESSION_CACHE_SIZE = int(os.environ.get('TRACKING_SESSION_CACHE_SIZE', 10000))
+    TRACKING_SESSION_CACHE_TTL = int(os.environ.get('TRACKING_SESSION_CACHE_TTL', 60))
+    TRACKING_LONG_POLL_MAX_SECONDS = float(os.environ.get('TRACKING_LONG_POLL_MAX_SECONDS', 25))
+    TRACKING_LONG_POLL_INTERVAL = float(os.environ.get('TRACKING_LONG_POLL_INTERVAL', 1.0))
+
+    # SOS notification outbox
+    # 'thread' needs no Celery/Redis; 'celery' hands delivery to the worker
+    NOTIFICATION_DELIVERY_MODE = os.environ.get('NOTIFICATION_DELIVERY_MODE', 'thread')
+    NOTIFICATION_BATCH_SIZE = int(os.environ.get('NOTIFICATION_BATCH_SIZE', 50))
+    NOTIFICATION_MAX_ATTEMPTS = int(os.environ.get('NOTIFICATION_MAX_ATTEMPTS', 5))
+    NOTIFICATION_CLAIM_TIMEOUT_SECONDS = int(os.environ.get('NOTIFICATION_CLAIM_TIMEOUT_SECONDS', 120))
     
     # Flask-Limiter Storage
     # Falls back to in-memory if no Redis URL is configured (safe for local dev without Redis)
@@ -53,6 +171,57 @@ class Config:
     RATELIMIT_STORAGE_URI = _resolve_redis_url(_ratelimit_url) if _ratelimit_url else 'memory://'
     RATELIMIT_SWALLOW_ERRORS = True  # Don't crash the app if Redis is unavailable
 
+    # Optional Redis for shared caches (last location, ...); unset = in-process cache + DB only
+    _cache_redis_url = os.environ.get('CACHE_REDIS_URL')
+    CACHE_REDIS_URL = _resolve_redis_url(_cache_redis_url) if _cache_redis_url else None
+    CACHE_REDIS_TIMEOUT = float(os.environ.get('CACHE_REDIS_TIMEOUT', 0.5))
+
+    # Last-known location cache
+    LAST_LOCATION_CACHE_SIZE = int(os.environ.get('LAST_LOCATION_CACHE_SIZE', 10000))
+    LAST_LOCATION_CACHE_TTL = int(os.environ.get('LAST_LOCATION_CACHE_TTL', 30))
+    LAST_LOCATION_REDIS_TTL = int(os.environ.get('LAST_LOCATION_REDIS_TTL', 86400))
+
+    # Location ingest buffer: points are written in batches every interval (0 = write inline)
+    LOCATION_FLUSH_INTERVAL = float(os.environ.get('LOCATION_FLUSH_INTERVAL', 1.0))
+    LOCATION_FLUSH_BATCH_SIZE = int(os.environ.get('LOCATION_FLUSH_BATCH_SIZE', 500))
+    LOCATION_FLUSH_MAX_RETRIES = int(os.environ.get('LOCATION_FLUSH_MAX_RETRIES', 5))
+
+    # Location history downsampling: a point is stored only if it moved, aged or changed enough
+    LOCATION_PERSIST_MIN_DISTANCE_M = float(os.environ.get('LOCATION_PERSIST_MIN_DISTANCE_M', 25))
+    LOCATION_PERSIST_MIN_SECONDS = float(os.environ.get('LOCATION_PERSIST_MIN_SECONDS', 60))
+    LOCATION_PERSIST_ACCURACY_DELTA_M = float(os.environ.get('LOCATION_PERSIST_ACCURACY_DELTA_M', 20))
+    # Douglas-Peucker compaction of stored tracks older than N days
+    LOCATION_COMPACT_AFTER_DAYS = int(os.environ.get('LOCATION_COMPACT_AFTER_DAYS', 7))
+    LOCATION_COMPACT_EPSILON_M = float(os.environ.get('LOCATION_COMPACT_EPSILON_M', 10))
+    LOCATION_HISTORY_MAX_PAGE_SIZE = int(os.environ.get('LOCATION_HISTORY_MAX_PAGE_SIZE', 5000))
+    # POST /api/location/batch (offline replay)
+    LOCATION_BATCH_MAX_POINTS = int(os.environ.get('LOCATION_BATCH_MAX_POINTS', 1000))
+    LOCATION_BATCH_MAX_CLOCK_SKEW = int(os.environ.get('LOCATION_BATCH_MAX_CLOCK_SKEW', 300))
+    # Safe zones: circles indexed on a lat/lng grid, checked on every location update
+    MAX_GEOFENCES_PER_USER = int(os.environ.get('MAX_GEOFENCES_PER_USER', 20))
+    GEOFENCE_MAX_RADIUS_M = float(os.environ.get('GEOFENCE_MAX_RADIUS_M', 5000))
+    GEOFENCE_HYSTERESIS_M = float(os.environ.get('GEOFENCE_HYSTERESIS_M', 20))
+    GEOFENCE_GRID_CELL_DEG = float(os.environ.get('GEOFENCE_GRID_CELL_DEG', 0.01))
+    GEOFENCE_CACHE_SIZE = int(os.environ.get('GEOFENCE_CACHE_SIZE', 10000))
+    GEOFENCE_CACHE_TTL = int(os.environ.get('GEOFENCE_CACHE_TTL', 60))
+    # Monthly partitions of location_history (PostgreSQL) and retention of raw points
+    LOCATION_PARTITION_MONTHS_AHEAD = int(os.environ.get('LOCATION_PARTITION_MONTHS_AHEAD', 3))
+    LOCATION_RETENTION_MONTHS = int(os.environ.get('LOCATION_RETENTION_MONTHS', 12))
+    LOCATION_ARCHIVE_DIR = os.environ.get('LOCATION_ARCHIVE_DIR') # unset = drop without archiving
+
+    # Provider timeouts (Twilio, SMTP, FCM) in seconds
+    PROVIDER_CONNECT_TIMEOUT = float(os.environ.get('PROVIDER_CONNECT_TIMEOUT', 5))
+    PROVIDER_READ_TIMEOUT = float(os.environ.get('PROVIDER_READ_TIMEOUT', 10))
+
+    # Per-provider circuit breakers
+    BREAKER_FAILURE_RATE = float(os.environ.get('BREAKER_FAILURE_RATE', 0.5))
+    BREAKER_SLOW_CALL_SECONDS = float(os.environ.get('BREAKER_SLOW_CALL_SECONDS', 5))
+    BREAKER_SLOW_CALL_RATE = float(os.environ.get('BREAKER_SLOW_CALL_RATE', 0.5))
+    BREAKER_MIN_CALLS = int(os.environ.get('BREAKER_MIN_CALLS', 5))
+    BREAKER_WINDOW_SIZE = int(os.environ.get('BREAKER_WINDOW_SIZE', 20))
+    BREAKER_OPEN_SECONDS = float(os.environ.get('BREAKER_OPEN_SECONDS', 30))
+    BREAKER_HALF_OPEN_CALLS = int(os.environ.get('BREAKER_HALF_OPEN_CALLS', 2))
+
     FIREBASE_CREDENTIALS_PATH = os.environ.get('FIREBASE_CREDENTIALS_PATH')
     FIREBASE_CREDENTIALS_JSON = os.environ.get('FIREBASE_CREDENTIALS_JSON')
     
@@ -2,10 +2,13 @@
 from app.models.user import User
 from app.models.trusted_contact import TrustedContact
 from app.models.sos_alert import SOSAlert
-from app.models.location import LocationHistory
+from app.models.location import LocationHistory, UserLastLocation, LocationDailyRollup
 from app.models.device import ConnectedDevice
 from app.models.settings import UserSettings
 from app.models.otp import OTPRecord
 from app.models.support import SupportTicket
 from app.models.sensor_data import SensorTrainingData
 from app.models.ml_model import MLModel
+from app.models.notification import NotificationOutbox
+from app.models.geofence import Geofence
+from app.models.tracking_session import TrackingSession
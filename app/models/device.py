@@ -5,6 +5,11 @@ import uuid
 
 class ConnectedDevice(db.Model):
     __tablename__ = 'connected_devices'
+    __table_args__ = (
+        # Bracelet pairing and SOS look devices up by MAC
+        db.Index('ix_connected_devices_device_mac', 'device_mac'),
+        db.Index('ix_connected_devices_user_last_seen', 'user_id', 'last_seen'),
+    )
 
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
@@ -0,0 +1,33 @@
+from app.extensions import db
+from datetime import datetime
+import uuid
+
+class Geofence(db.Model):
+    """A circular safe zone. Contacts are alerted when the user leaves (or enters) it."""
+    __tablename__ = 'geofences'
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False, index=True)
+    name = db.Column(db.String(100), nullable=False)
+    latitude = db.Column(db.Float, nullable=False)
+    longitude = db.Column(db.Float, nullable=False)
+    radius_m = db.Column(db.Float, nullable=False)
+    notify_on = db.Column(db.Enum('exit', 'enter', 'both', name='geofence_notify_enum'), nullable=False, default='exit')
+    is_active = db.Column(db.Boolean, nullable=False, default=True)
+    # Last known side of the boundary (NULL until the first location after creation)
+    is_inside = db.Column(db.Boolean, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'latitude': self.latitude,
+            'longitude': self.longitude,
+            'radius_m': self.radius_m,
+            'notify_on': self.notify_on,
+            'is_active': self.is_active,
+            'is_inside': self.is_inside,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
@@ -1,10 +1,12 @@
-
 from app.extensions import db
 from datetime import datetime
 import uuid
 
 class LocationHistory(db.Model):
     __tablename__ = 'location_history'
+    __table_args__ = (
+        db.Index('ix_location_history_user_recorded', 'user_id', 'recorded_at'),
+    )
 
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
@@ -24,3 +26,56 @@ class LocationHistory(db.Model):
             'is_sharing': self.is_sharing,
             'recorded_at': self.recorded_at.isoformat()
         }
+
+class UserLastLocation(db.Model):
+    """One row per user with their latest point, so lookups never scan history."""
+    __tablename__ = 'user_last_location'
+
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), primary_key=True)
+    latitude = db.Column(db.Float, nullable=False)
+    longitude = db.Column(db.Float, nullable=False)
+    address = db.Column(db.String(500), nullable=True)
+    accuracy = db.Column(db.Float, nullable=True)
+    is_sharing = db.Column(db.Boolean, nullable=False, default=False)
+    recorded_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'latitude': self.latitude,
+            'longitude': self.longitude,
+            'address': self.address,
+            'accuracy': self.accuracy,
+            'is_sharing': self.is_sharing,
+            'recorded_at': self.recorded_at.isoformat()
+        }
+
+class LocationDailyRollup(db.Model):
+    """Per-user, per-day summary of location history, kept after raw points expire."""
+    __tablename__ = 'location_daily_rollup'
+
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    point_count = db.Column(db.Integer, nullable=False, default=0)
+    min_latitude = db.Column(db.Float, nullable=False)
+    max_latitude = db.Column(db.Float, nullable=False)
+    min_longitude = db.Column(db.Float, nullable=False)
+    max_longitude = db.Column(db.Float, nullable=False)
+    distance_m = db.Column(db.Float, nullable=False, default=0.0)
+    first_recorded_at = db.Column(db.DateTime, nullable=False)
+    last_recorded_at = db.Column(db.DateTime, nullable=False)
+
+    def to_dict(self):
+        return {
+            'day': self.day.isoformat(),
+            'point_count': self.point_count,
+            'bounding_box': {
+                'min_latitude': self.min_latitude,
+                'max_latitude': self.max_latitude,
+                'min_longitude': self.min_longitude,
+                'max_longitude': self.max_longitude
+            },
+            'distance_m': round(self.distance_m, 1),
+            'first_recorded_at': self.first_recorded_at.isoformat(),
+            'last_recorded_at': self.last_recorded_at.isoformat()
+        }
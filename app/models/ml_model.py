@@ -5,6 +5,10 @@ import uuid
 
 class MLModel(db.Model):
     __tablename__ = 'ml_models'
+    __table_args__ = (
+        # Protection service: newest active model
+        db.Index('ix_ml_models_active_created', 'is_active', 'created_at'),
+    )
 
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     version = db.Column(db.String(20), nullable=False) # e.g. "v1.0", "v1.1"
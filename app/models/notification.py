@@ -0,0 +1,41 @@
+from app.extensions import db
+from datetime import datetime
+import uuid
+
+class NotificationOutbox(db.Model):
+    __tablename__ = 'notification_outbox'
+    __table_args__ = (
+        # Idempotency key: exactly one message per alert, recipient and channel
+        db.UniqueConstraint('alert_id', 'recipient', 'channel', name='uq_notification_outbox_alert_recipient_channel'),
+        # Delivery workers claim rows by status and retry time
+        db.Index('ix_notification_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    alert_id = db.Column(db.String(36), db.ForeignKey('sos_alerts.id'), nullable=False, index=True)
+    channel = db.Column(db.Enum('sms', 'whatsapp', 'push', 'email', name='notification_channel_enum'), nullable=False)
+    recipient = db.Column(db.String(255), nullable=False) # Phone number, email or user id depending on channel
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.Enum('pending', 'processing', 'sent', 'failed', name='notification_status_enum'), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.String(500), nullable=True)
+    provider_message_id = db.Column(db.String(100), nullable=True)
+    latency_ms = db.Column(db.Float, nullable=True) # Provider round-trip of the last attempt
+    next_attempt_at = db.Column(db.DateTime, nullable=True)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'alert_id': self.alert_id,
+            'channel': self.channel,
+            'recipient': self.recipient,
+            'status': self.status,
+            'attempts': self.attempts,
+            'last_error': self.last_error,
+            'latency_ms': self.latency_ms,
+            'created_at': self.created_at.isoformat(),
+            'sent_at': self.sent_at.isoformat() if self.sent_at else None
+        }
@@ -9,9 +9,26 @@ class OTPRecord(db.Model):
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     phone = db.Column(db.String(20), nullable=True)
     email = db.Column(db.String(255), nullable=True)
-    otp_code = db.Column(db.String(6), nullable=False) # Hashed in production usually, keeping simple for now or hashed
+    otp_code = db.Column(db.String(64), nullable=False) # HMAC-SHA256 hex digest, see app/utils/otp.py
     purpose = db.Column(db.Enum('login', 'verify', 'reset_password', 'email_verification', name='otp_purpose_enum'), nullable=False)
     attempts = db.Column(db.Integer, default=0)
     is_used = db.Column(db.Boolean, default=False)
     expires_at = db.Column(db.DateTime, nullable=False)
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        # verify: latest unused code for (recipient, purpose). Partial, so used codes
+        # (nearly all rows) aren't indexed; queries filter on is_used.is_(False), which
+        # renders the same literal predicate
+        db.Index(
+            'ix_otp_records_phone_lookup', 'phone', 'purpose', 'created_at',
+            postgresql_where=db.text('is_used IS false'),
+            sqlite_where=db.text('is_used IS 0')
+        ),
+        db.Index(
+            'ix_otp_records_email_lookup', 'email', 'purpose', 'created_at',
+            postgresql_where=db.text('is_used IS false'),
+            sqlite_where=db.text('is_used IS 0')
+        ),
+        db.Index('ix_otp_records_expires_at', 'expires_at'),
+    )
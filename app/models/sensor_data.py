@@ -5,6 +5,9 @@ import uuid
 
 class SensorTrainingData(db.Model):
     __tablename__ = 'sensor_training_data'
+    __table_args__ = (
+        db.Index('ix_sensor_training_data_user_type_ts', 'user_id', 'sensor_type', 'timestamp'),
+    )
 
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
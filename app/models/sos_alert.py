@@ -5,10 +5,28 @@ import uuid
 
 class SOSAlert(db.Model):
     __tablename__ = 'sos_alerts'
+    # The partial indexes only hold live countdowns, so they stay tiny. Queries
+    # match them by rendering status = 'countdown' inline (see sos_service._is_countdown)
+    __table_args__ = (
+        # Trigger path: the user's live countdown
+        db.Index(
+            'ix_sos_alerts_user_countdown', 'user_id',
+            postgresql_where=db.text("status = 'countdown'"),
+            sqlite_where=db.text("status = 'countdown'")
+        ),
+        # Countdown sweeper: countdowns older than the cutoff, across users
+        db.Index(
+            'ix_sos_alerts_countdown_triggered', 'triggered_at',
+            postgresql_where=db.text("status = 'countdown'"),
+            sqlite_where=db.text("status = 'countdown'")
+        ),
+        # SOS history, newest first
+        db.Index('ix_sos_alerts_user_triggered', 'user_id', 'triggered_at'),
+    )
 
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
-    trigger_type = db.Column(db.Enum('manual', 'auto_fall', 'auto_shake', 'bracelet', name='trigger_type_enum'), nullable=False)
+    trigger_type = db.Column(db.Enum('manual', 'auto_fall', 'auto_shake', 'bracelet', 'auto_accelerometer', 'auto_gyroscope', 'auto_sensor_window', 'geofence', name='trigger_type_enum'), nullable=False)
     latitude = db.Column(db.Float, nullable=False)
     longitude = db.Column(db.Float, nullable=False)
     address = db.Column(db.String(500), nullable=True)
@@ -19,6 +37,8 @@ class SOSAlert(db.Model):
     sent_at = db.Column(db.DateTime, nullable=True)
     resolved_at = db.Column(db.DateTime, nullable=True)
 
+    notifications = db.relationship('NotificationOutbox', backref='alert', lazy=True, cascade="all, delete-orphan")
+
     def to_dict(self):
         return {
             'alert_id': self.id,
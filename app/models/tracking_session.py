@@ -0,0 +1,25 @@
+from app.extensions import db
+from datetime import datetime
+import uuid
+
+class TrackingSession(db.Model):
+    """A public live-location link created by /location/share/start."""
+    __tablename__ = 'tracking_sessions'
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    ended_at = db.Column(db.DateTime, nullable=True)
+
+    @property
+    def is_active(self):
+        return self.ended_at is None and self.expires_at > datetime.utcnow()
+
+    def to_dict(self):
+        return {
+            'session_id': self.id,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'expires_at': self.expires_at.isoformat(),
+            'ended_at': self.ended_at.isoformat() if self.ended_at else None
+        }
@@ -1,10 +1,16 @@
 
 from app.extensions import db
+from app.utils.validators import to_e164
+from sqlalchemy.orm import validates
 from datetime import datetime
 import uuid
 
 class TrustedContact(db.Model):
     __tablename__ = 'trusted_contacts'
+    __table_args__ = (
+        # join_tracking: "does <user_id> list this phone number as a contact?"
+        db.Index('ix_trusted_contacts_user_phone', 'user_id', 'phone'),
+    )
 
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
@@ -15,6 +21,10 @@ class TrustedContact(db.Model):
     is_primary = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
+    @validates('phone')
+    def _normalize_phone(self, key, phone):
+        return to_e164(phone)
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -1,5 +1,7 @@
 
 from app.extensions import db
+from app.utils.validators import to_e164
+from sqlalchemy.orm import validates
 from datetime import datetime
 import uuid
 from sqlalchemy.dialects.postgresql import UUID
@@ -25,10 +27,17 @@ class User(db.Model):
     # Relationships
     trusted_contacts = db.relationship('TrustedContact', backref='user', lazy=True, cascade="all, delete-orphan")
     sos_alerts = db.relationship('SOSAlert', backref='user', lazy=True, cascade="all, delete-orphan")
-    location_history = db.relationship('LocationHistory', backref='user', lazy=True, cascade="all, delete-orphan")
+    # Never loaded in bulk: rows are removed with purge_user_locations() before the user
+    location_history = db.relationship('LocationHistory', backref='user', lazy='dynamic', passive_deletes='all')
     settings = db.relationship('UserSettings', uselist=False, backref='user', lazy=True, cascade="all, delete-orphan")
     devices = db.relationship('ConnectedDevice', backref='user', lazy=True, cascade="all, delete-orphan")
     support_tickets = db.relationship('SupportTicket', backref='user', lazy=True, cascade="all, delete-orphan")
+    geofences = db.relationship('Geofence', backref='user', lazy=True, cascade="all, delete-orphan")
+    tracking_sessions = db.relationship('TrackingSession', backref='user', lazy=True, cascade="all, delete-orphan")
+
+    @validates('phone')
+    def _normalize_phone(self, key, phone):
+        return to_e164(phone)
 
     def to_dict(self):
         return {
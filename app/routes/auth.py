@@ -5,7 +5,9 @@ from app.models.user import User
 from app.models.settings import UserSettings
 from app.models.trusted_contact import TrustedContact
 from app.services.email_service import send_otp_email
-from app.utils.validators import validate_password, validate_phone
+from app.services.password_hasher import hash_password, verify_password, needs_rehash
+from app.services.token_blocklist import revoke_token
+from app.utils.validators import validate_password, validate_phone, to_e164
 from app.utils.otp import generate_otp, store_otp, verify_otp
 from app.schemas.auth_schema import (
     EmailRegisterSchema, EmailLoginSchema, PhoneLoginSchema, 
@@ -14,10 +16,9 @@ from app.schemas.auth_schema import (
 )
 from flask_jwt_extended import (
     create_access_token, create_refresh_token, jwt_required, 
-    get_jwt_identity, get_jwt
+    get_jwt_identity, get_jwt, decode_token
 )
 from marshmallow import ValidationError
-import bcrypt
 from datetime import datetime
 
 auth_bp = Blueprint('auth', __name__)
@@ -36,7 +37,7 @@ def register_email():
     if not validate_password(data['password']):
         return jsonify(success=False, error={"code": "VALIDATION_ERROR", "message": "Password weak"}), 400
 
-    hashed_pw = bcrypt.hashpw(data['password'].encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    hashed_pw = hash_password(data['password'])
 
     # Basic mapping, can be expanded or moved to a utility/constants file
     # Expanded emergency numbers list
@@ -162,9 +163,14 @@ def login_email():
     if not user or not user.password_hash:
         return jsonify(success=False, error={"code": "UNAUTHORIZED", "message": "Invalid credentials"}), 401
 
-    if not bcrypt.checkpw(data['password'].encode('utf-8'), user.password_hash.encode('utf-8')):
+    if not verify_password(data['password'], user.password_hash):
         return jsonify(success=False, error={"code": "UNAUTHORIZED", "message": "Invalid credentials"}), 401
 
+    # Cost factor changed since this hash was made: upgrade it while we have the password
+    if needs_rehash(user.password_hash):
+        user.password_hash = hash_password(data['password'])
+        db.session.commit()
+
     access_token = create_access_token(identity=user.id)
     refresh_token = create_refresh_token(identity=user.id)
 
@@ -185,12 +191,12 @@ def send_otp_route():
     except ValidationError as err:
         return jsonify(success=False, error={"code": "VALIDATION_ERROR", "message": "Invalid request", "details": err.messages}), 400
 
-    phone = data['phone']
+    phone = to_e164(data['phone'])
     # In production remove this mock
     otp_code = generate_otp()
     
     # Store OTP
-    store_otp(phone, otp_code, 'login')
+    store_otp(phone=phone, otp_code=otp_code, purpose='login')
 
     # Send SMS (Mock for now, would call SMS service)
     print(f"------------ OTP for {phone}: {otp_code} ------------")
@@ -205,10 +211,10 @@ def verify_otp_route():
     except ValidationError as err:
         return jsonify(success=False, error={"code": "VALIDATION_ERROR", "message": "Invalid request", "details": err.messages}), 400
 
-    phone = data['phone']
+    phone = to_e164(data['phone'])
     otp_code = data['otp_code']
 
-    valid, msg = verify_otp(phone, otp_code, 'login')
+    valid, msg = verify_otp(phone=phone, otp_code=otp_code, purpose='login')
     if not valid:
         return jsonify(success=False, error={"code": "OTP_INVALID", "message": msg}), 422
 
@@ -250,7 +256,21 @@ def refresh():
 @auth_bp.route('/logout', methods=['POST'])
 @jwt_required()
 def logout():
-    # In a real app we'd blacklist the token in the database here if needed.
+    """Revoke the access token, and the refresh token if one is sent in the body."""
+    claims = get_jwt()
+    refresh_token = (request.get_json(silent=True) or {}).get('refresh_token')
+    refresh_claims = None
+    if refresh_token:
+        try:
+            refresh_claims = decode_token(refresh_token)
+        except Exception:
+            return jsonify(success=False, error={"code": "VALIDATION_ERROR", "message": "Invalid refresh token"}), 400
+        if refresh_claims.get('type') != 'refresh' or refresh_claims.get('sub') != claims['sub']:
+            return jsonify(success=False, error={"code": "VALIDATION_ERROR", "message": "Invalid refresh token"}), 400
+
+    revoke_token(claims)
+    if refresh_claims:
+        revoke_token(refresh_claims)
     return jsonify(success=True, message="Logged out successfully"), 200
 
 @auth_bp.route('/validate', methods=['GET'])
@@ -268,11 +288,11 @@ def resend_otp():
     except ValidationError as err:
         return jsonify(success=False, error={"code": "VALIDATION_ERROR", "message": "Invalid request", "details": err.messages}), 400
 
-    phone = data['phone']
+    phone = to_e164(data['phone'])
     # Check if user exists or if it's a new login flow? 
     # For now, just resend if valid phone format
     otp_code = generate_otp()
-    store_otp(phone, otp_code, 'login')
+    store_otp(phone=phone, otp_code=otp_code, purpose='login')
     
     print(f"------------ RESENT OTP for {phone}: {otp_code} ------------")
     
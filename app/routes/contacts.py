@@ -7,7 +7,8 @@ from app.schemas.contact_schema import ContactSchema
 from marshmallow import ValidationError
 from app.config import Config
 from app.services.email_service import send_contact_added_email
-from app.models.user import User
+from app.services.tracking_service import invalidate_tracking_authz
+from app.services.user_context import load_user_context, invalidate_user_context
 
 contacts_bp = Blueprint('contacts', __name__)
 
@@ -15,18 +16,21 @@ contacts_bp = Blueprint('contacts', __name__)
 @jwt_required()
 def get_contacts():
     current_user_id = get_jwt_identity()
-    contacts = TrustedContact.query.filter_by(user_id=current_user_id).all()
+    context = load_user_context(current_user_id)
+    contacts = context.contacts if context else ()
     
-    return jsonify(success=True, data=[contact.to_dict() for contact in contacts], count=len(contacts)), 200
+    return jsonify(success=True, data=[contact._asdict() for contact in contacts], count=len(contacts)), 200
 
 @contacts_bp.route('', methods=['POST'])
 @jwt_required()
 def add_contact():
     current_user_id = get_jwt_identity()
     
-    # Check max contacts
-    count = TrustedContact.query.filter_by(user_id=current_user_id).count()
-    if count >= int(Config.MAX_TRUSTED_CONTACTS or 5):
+    # Check max contacts (against the database, not another worker's stale snapshot)
+    context = load_user_context(current_user_id, fresh=True)
+    if not context:
+        return jsonify(success=False, error={"code": "NOT_FOUND", "message": "User not found"}), 404
+    if len(context.contacts) >= int(Config.MAX_TRUSTED_CONTACTS or 5):
         return jsonify(success=False, error={"code": "Limit Exceeded", "message": "Max trusted contacts reached"}), 400
 
     schema = ContactSchema()
@@ -51,18 +55,18 @@ def add_contact():
     db.session.add(new_contact)
     db.session.add(new_contact)
     db.session.commit()
+    invalidate_tracking_authz(target_user_id=current_user_id)
+    invalidate_user_context(current_user_id)
 
     # Send notification email if email is provided
     if new_contact.email:
-        user = User.query.get(current_user_id)
-        if user:
-            send_contact_added_email(
-                to_email=new_contact.email,
-                contact_name=new_contact.name,
-                user_name=user.full_name,
-                twilio_number=Config.TWILIO_PHONE_NUMBER,
-                sandbox_code=Config.TWILIO_SANDBOX_CODE
-            )
+        send_contact_added_email(
+            to_email=new_contact.email,
+            contact_name=new_contact.name,
+            user_name=context.user.full_name,
+            twilio_number=Config.TWILIO_PHONE_NUMBER,
+            sandbox_code=Config.TWILIO_SANDBOX_CODE
+        )
 
     return jsonify(success=True, data=new_contact.to_dict()), 201
 
@@ -91,6 +95,8 @@ def update_contact(contact_id):
     if 'is_primary' in data: contact.is_primary = data['is_primary']
 
     db.session.commit()
+    invalidate_tracking_authz(target_user_id=current_user_id)
+    invalidate_user_context(current_user_id)
     return jsonify(success=True, data=contact.to_dict()), 200
 
 @contacts_bp.route('/<contact_id>', methods=['DELETE'])
@@ -104,6 +110,8 @@ def delete_contact(contact_id):
 
     db.session.delete(contact)
     db.session.commit()
+    invalidate_tracking_authz(target_user_id=current_user_id)
+    invalidate_user_context(current_user_id)
     return jsonify(success=True, message="Contact deleted"), 200
 
 @contacts_bp.route('/<contact_id>/primary', methods=['PUT'])
@@ -118,5 +126,6 @@ def set_primary_contact(contact_id):
     TrustedContact.query.filter_by(user_id=current_user_id, is_primary=True).update({'is_primary': False})
     contact.is_primary = True
     db.session.commit()
+    invalidate_user_context(current_user_id)
 
     return jsonify(success=True, message="Primary contact updated"), 200
@@ -0,0 +1,86 @@
+from flask import Blueprint, current_app, jsonify, request
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from app.models.geofence import Geofence
+from app.extensions import db
+from app.schemas.geofence_schema import GeofenceSchema
+from app.services.geofence_service import invalidate_user_geofences
+from marshmallow import ValidationError
+
+geofence_bp = Blueprint('geofence', __name__)
+
+def _radius_error(data):
+    max_radius = float(current_app.config.get('GEOFENCE_MAX_RADIUS_M', 5000))
+    if data.get('radius_m', 0) > max_radius:
+        return jsonify(success=False, error={"code": "VALIDATION_ERROR", "message": f"radius_m must be at most {max_radius:g}"}), 400
+    return None
+
+@geofence_bp.route('', methods=['GET'])
+@jwt_required()
+def get_geofences():
+    current_user_id = get_jwt_identity()
+    zones = Geofence.query.filter_by(user_id=current_user_id).order_by(Geofence.created_at).all()
+    return jsonify(success=True, data=[zone.to_dict() for zone in zones], count=len(zones)), 200
+
+@geofence_bp.route('', methods=['POST'])
+@jwt_required()
+def add_geofence():
+    current_user_id = get_jwt_identity()
+
+    count = Geofence.query.filter_by(user_id=current_user_id).count()
+    if count >= int(current_app.config.get('MAX_GEOFENCES_PER_USER', 20)):
+        return jsonify(success=False, error={"code": "Limit Exceeded", "message": "Max safe zones reached"}), 400
+
+    try:
+        data = GeofenceSchema().load(request.json)
+    except ValidationError as err:
+        return jsonify(success=False, error={"code": "VALIDATION_ERROR", "message": "Invalid request", "details": err.messages}), 400
+    error = _radius_error(data)
+    if error:
+        return error
+
+    zone = Geofence(user_id=current_user_id, **data)
+    db.session.add(zone)
+    db.session.commit()
+    invalidate_user_geofences(current_user_id)
+
+    return jsonify(success=True, data=zone.to_dict()), 201
+
+@geofence_bp.route('/<geofence_id>', methods=['PUT'])
+@jwt_required()
+def update_geofence(geofence_id):
+    current_user_id = get_jwt_identity()
+    zone = Geofence.query.filter_by(id=geofence_id, user_id=current_user_id).first()
+
+    if not zone:
+        return jsonify(success=False, error={"code": "NOT_FOUND", "message": "Safe zone not found"}), 404
+
+    try:
+        data = GeofenceSchema(partial=True).load(request.json)
+    except ValidationError as err:
+        return jsonify(success=False, error={"code": "VALIDATION_ERROR", "message": "Invalid request", "details": err.messages}), 400
+    error = _radius_error(data)
+    if error:
+        return error
+
+    for field, value in data.items():
+        setattr(zone, field, value)
+    if {'latitude', 'longitude', 'radius_m', 'is_active'} & set(data):
+        zone.is_inside = None # Boundary moved: re-baseline on the next location
+    db.session.commit()
+    invalidate_user_geofences(current_user_id)
+
+    return jsonify(success=True, data=zone.to_dict()), 200
+
+@geofence_bp.route('/<geofence_id>', methods=['DELETE'])
+@jwt_required()
+def delete_geofence(geofence_id):
+    current_user_id = get_jwt_identity()
+    zone = Geofence.query.filter_by(id=geofence_id, user_id=current_user_id).first()
+
+    if not zone:
+        return jsonify(success=False, error={"code": "NOT_FOUND", "message": "Safe zone not found"}), 404
+
+    db.session.delete(zone)
+    db.session.commit()
+    invalidate_user_geofences(current_user_id)
+    return jsonify(success=True, message="Safe zone deleted"), 200
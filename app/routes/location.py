@@ -1,9 +1,16 @@
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.services.location_service import update_location, get_last_location, start_sharing, stop_sharing
-from marshmallow import Schema, fields, ValidationError
-import uuid
+from app.services.location_service import update_location, ingest_location_batch, get_last_location, start_sharing, stop_sharing, get_location_history_page, stream_location_history
+from app.services.tracking_service import create_tracking_session, end_tracking_sessions
+from app.services.location_retention import retention_cutoff
+from app.utils.geo import encode_polyline
+from app.models.location import LocationDailyRollup
+from marshmallow import Schema, fields, validate, ValidationError
+from datetime import date, datetime, timedelta, timezone
+import base64
+import binascii
+import json
 
 location_bp = Blueprint('location', __name__)
 
@@ -33,6 +40,53 @@ def update():
 
     return jsonify(success=True, message="Location updated"), 200
 
+class BatchPointSchema(Schema):
+    latitude = fields.Float(required=True, validate=validate.Range(min=-90, max=90))
+    longitude = fields.Float(required=True, validate=validate.Range(min=-180, max=180))
+    accuracy = fields.Float(allow_none=True)
+    is_sharing = fields.Bool(missing=False)
+    recorded_at = fields.DateTime(required=True)
+
+class LocationBatchSchema(Schema):
+    points = fields.List(fields.Nested(BatchPointSchema), required=True, validate=validate.Length(min=1))
+
+@location_bp.route('/batch', methods=['POST'])
+@jwt_required()
+def update_batch():
+    """Upload points buffered while offline: { points: [{latitude, longitude, recorded_at, ...}] }.
+    Stored with the client's recorded_at; only the newest point updates live state."""
+    current_user_id = get_jwt_identity()
+    try:
+        data = LocationBatchSchema().load(request.json)
+    except ValidationError as err:
+        return jsonify(success=False, error={"code": "VALIDATION_ERROR", "message": "Invalid request", "details": err.messages}), 400
+
+    points = data['points']
+    max_points = current_app.config.get('LOCATION_BATCH_MAX_POINTS', 1000)
+    if len(points) > max_points:
+        return jsonify(success=False, error={"code": "VALIDATION_ERROR", "message": f"At most {max_points} points per batch"}), 400
+
+    now = datetime.utcnow()
+    latest_allowed = now + timedelta(seconds=current_app.config.get('LOCATION_BATCH_MAX_CLOCK_SKEW', 300))
+    # Older months may already be dropped (no partition to insert into)
+    earliest_allowed = datetime.combine(retention_cutoff(), datetime.min.time())
+    for point in points:
+        recorded_at = point['recorded_at']
+        if recorded_at.tzinfo is not None:
+            recorded_at = recorded_at.astimezone(timezone.utc).replace(tzinfo=None)
+        if recorded_at > latest_allowed:
+            return jsonify(success=False, error={"code": "VALIDATION_ERROR", "message": "recorded_at is in the future"}), 400
+        if recorded_at < earliest_allowed:
+            return jsonify(success=False, error={"code": "VALIDATION_ERROR", "message": "recorded_at is older than the retention window"}), 400
+        # Within the allowed skew, but never ahead of live (server-time) updates
+        point['recorded_at'] = min(recorded_at, now)
+
+    newest = ingest_location_batch(current_user_id, points)
+    return jsonify(success=True, data={
+        "accepted": len(points),
+        "latest_recorded_at": newest['recorded_at'].isoformat()
+    }), 200
+
 @location_bp.route('/current', methods=['GET'])
 @jwt_required()
 def get_current():
@@ -44,20 +98,102 @@ def get_current():
 
     return jsonify(success=True, data=location.to_dict()), 200
 
+def _parse_datetime(value):
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def _encode_cursor(position):
+    if position is None:
+        return None
+    recorded_at, row_id = position
+    return base64.urlsafe_b64encode(f"{recorded_at.isoformat()}|{row_id}".encode()).decode()
+
+def _decode_cursor(cursor):
+    recorded_at, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|', 1)
+    return datetime.fromisoformat(recorded_at), row_id
+
+@location_bp.route('/history', methods=['GET'])
+@jwt_required()
+def get_history():
+    """Location history in ascending time order.
+
+    Query params: `from`/`to` (ISO 8601), `limit` (page size), `cursor` (from the
+    previous page's `next_cursor`) and `format`:
+      - `json` (default): a page of points
+      - `polyline`: the same page as a Google encoded polyline
+      - `ndjson`: every point in the range, streamed one JSON object per line
+    """
+    current_user_id = get_jwt_identity()
+    output = request.args.get('format', 'json')
+    max_limit = current_app.config.get('LOCATION_HISTORY_MAX_PAGE_SIZE', 5000)
+    try:
+        start = _parse_datetime(request.args['from']) if 'from' in request.args else None
+        end = _parse_datetime(request.args['to']) if 'to' in request.args else None
+        after = _decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        limit = min(max(int(request.args.get('limit', 500)), 1), max_limit)
+    except (ValueError, TypeError, binascii.Error):
+        return jsonify(success=False, error={"code": "VALIDATION_ERROR", "message": "Invalid from/to, limit or cursor"}), 400
+    if output not in ('json', 'polyline', 'ndjson'):
+        return jsonify(success=False, error={"code": "VALIDATION_ERROR", "message": "format must be json, polyline or ndjson"}), 400
+
+    if output == 'ndjson':
+        def generate():
+            for point in stream_location_history(current_user_id, start, end, after):
+                yield json.dumps(point.to_dict()) + '\n'
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    rows, next_position = get_location_history_page(current_user_id, start, end, after, limit)
+    next_cursor = _encode_cursor(next_position)
+
+    if output == 'polyline':
+        return jsonify(success=True, data={
+            "polyline": encode_polyline([(r.latitude, r.longitude) for r in rows]),
+            "count": len(rows),
+            "first_recorded_at": rows[0].recorded_at.isoformat() if rows else None,
+            "last_recorded_at": rows[-1].recorded_at.isoformat() if rows else None,
+            "next_cursor": next_cursor
+        }), 200
+
+    return jsonify(success=True, data={
+        "points": [r.to_dict() for r in rows],
+        "next_cursor": next_cursor
+    }), 200
+
+@location_bp.route('/history/daily', methods=['GET'])
+@jwt_required()
+def get_daily_history():
+    """Per-day summaries (point count, bounding box, distance) between `from` and `to` (YYYY-MM-DD)."""
+    current_user_id = get_jwt_identity()
+    today = datetime.utcnow().date() # Rollup days are UTC, like recorded_at
+    try:
+        start = date.fromisoformat(request.args['from']) if 'from' in request.args else today - timedelta(days=30)
+        end = date.fromisoformat(request.args['to']) if 'to' in request.args else today
+    except ValueError:
+        return jsonify(success=False, error={"code": "VALIDATION_ERROR", "message": "Dates must be YYYY-MM-DD"}), 400
+
+    rollups = LocationDailyRollup.query.filter(
+        LocationDailyRollup.user_id == current_user_id,
+        LocationDailyRollup.day >= start,
+        LocationDailyRollup.day <= end
+    ).order_by(LocationDailyRollup.day).all()
+
+    return jsonify(success=True, data=[r.to_dict() for r in rollups]), 200
+
 @location_bp.route('/share/start', methods=['POST'])
 @jwt_required()
 def start_sharing_route():
     current_user_id = get_jwt_identity()
     contacts = start_sharing(current_user_id)
-    
-    # Generate a dummy tracking URL
-    tracking_session_id = str(uuid.uuid4())
-    tracking_url = f"https://Asfalis.app/track/{tracking_session_id}"
+    session = create_tracking_session(current_user_id)
+    tracking_url = f"{current_app.config['TRACKING_BASE_URL'].rstrip('/')}/{session.id}"
 
     return jsonify(success=True, data={
-        "sharing_session_id": tracking_session_id,
+        "sharing_session_id": session.id,
         "shared_with": [c.to_dict() for c in contacts],
-        "tracking_url": tracking_url
+        "tracking_url": tracking_url,
+        "expires_at": session.expires_at.isoformat()
     }), 200
 
 @location_bp.route('/share/stop', methods=['POST'])
@@ -65,4 +201,5 @@ def start_sharing_route():
 def stop_sharing_route():
     current_user_id = get_jwt_identity()
     stop_sharing(current_user_id)
+    end_tracking_sessions(current_user_id)
     return jsonify(success=True, message="Sharing stopped"), 200
@@ -4,6 +4,7 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models.settings import UserSettings
 from app.extensions import db
 from app.schemas.settings_schema import SettingsSchema
+from app.services.user_context import load_user_context, invalidate_user_context
 from marshmallow import ValidationError
 
 settings_bp = Blueprint('settings', __name__)
@@ -12,12 +13,12 @@ settings_bp = Blueprint('settings', __name__)
 @jwt_required()
 def get_settings():
     current_user_id = get_jwt_identity()
-    settings = UserSettings.query.filter_by(user_id=current_user_id).first()
+    context = load_user_context(current_user_id)
     
-    if not settings:
+    if not context or not context.settings:
         return jsonify(success=False, error={"code": "NOT_FOUND", "message": "Settings not found"}), 404
 
-    return jsonify(success=True, data=settings.to_dict()), 200
+    return jsonify(success=True, data=context.settings._asdict()), 200
 
 @settings_bp.route('', methods=['PUT'])
 @jwt_required()
@@ -41,4 +42,5 @@ def update_settings():
     if 'haptic_feedback' in data: settings.haptic_feedback = data['haptic_feedback']
 
     db.session.commit()
+    invalidate_user_context(current_user_id)
     return jsonify(success=True, data=settings.to_dict()), 200
@@ -1,9 +1,9 @@
 
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.services.sos_service import trigger_sos, dispatch_sos, cancel_sos
-from app.models.sos_alert import SOSAlert
-from app.models.trusted_contact import TrustedContact
+from app.extensions import db
+from app.services.sos_service import trigger_sos, dispatch_sos, cancel_sos, sos_history_query
+from app.services.user_context import load_user_context
 from marshmallow import Schema, fields, ValidationError
 
 sos_bp = Blueprint('sos', __name__)
@@ -19,8 +19,8 @@ def trigger():
     current_user_id = get_jwt_identity()
 
     # Block SOS if no trusted contacts saved
-    contact_count = TrustedContact.query.filter_by(user_id=current_user_id).count()
-    if contact_count == 0:
+    context = load_user_context(current_user_id, fresh=True)
+    if context and not context.contacts:
         return jsonify(success=False, error={
             "code": "NO_CONTACTS",
             "message": "You must add at least one emergency contact before sending an SOS."
@@ -74,5 +74,5 @@ def cancel():
 @jwt_required()
 def history():
     current_user_id = get_jwt_identity()
-    alerts = SOSAlert.query.filter_by(user_id=current_user_id).order_by(SOSAlert.triggered_at.desc()).all()
+    alerts = db.session.scalars(sos_history_query(current_user_id)).all()
     return jsonify(success=True, data=[a.to_dict() for a in alerts]), 200
@@ -0,0 +1,70 @@
+from flask import Blueprint, current_app, jsonify, request
+from app.extensions import socketio
+from app.services.broadcast_service import get_user_display
+from app.services.location_service import get_live_location
+from app.services.tracking_service import resolve_tracking_session
+from app.utils import metrics
+from datetime import datetime
+import hashlib
+import json
+import time
+
+tracking_bp = Blueprint('tracking', __name__)
+
+def _view(session_id, user_id, expires_at):
+    """Viewer payload and its ETag. Built from caches only (no location_history)."""
+    snapshot = get_live_location(user_id)
+    location = None
+    if snapshot and snapshot['is_sharing']:
+        location = {
+            "latitude": snapshot['latitude'],
+            "longitude": snapshot['longitude'],
+            "accuracy": snapshot['accuracy'],
+            "recorded_at": snapshot['recorded_at'].isoformat()
+        }
+    payload = {
+        "session_id": session_id,
+        "name": get_user_display(user_id)['name'],
+        "is_sharing": location is not None,
+        "location": location,
+        "expires_at": expires_at.isoformat()
+    }
+    etag = hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+    return payload, etag
+
+@tracking_bp.route('/<session_id>', methods=['GET'])
+def view_tracking_session(session_id):
+    """Public live location for a tracking link.
+
+    Send the last ETag in If-None-Match to get 304 when nothing changed. With
+    `?wait=N` (seconds, capped at TRACKING_LONG_POLL_MAX_SECONDS) the request is
+    held until the location changes or N seconds pass.
+    """
+    entry = resolve_tracking_session(session_id)
+    if entry is None:
+        metrics.inc_counter('tracking_views_total', result='not_found')
+        return jsonify(success=False, error={"code": "NOT_FOUND", "message": "Tracking link not found or expired"}), 404
+    user_id, expires_at = entry
+
+    config = current_app.config
+    try:
+        wait = min(max(float(request.args.get('wait', 0)), 0.0), float(config.get('TRACKING_LONG_POLL_MAX_SECONDS', 25)))
+    except ValueError:
+        return jsonify(success=False, error={"code": "VALIDATION_ERROR", "message": "wait must be a number of seconds"}), 400
+    interval = float(config.get('TRACKING_LONG_POLL_INTERVAL', 1.0))
+
+    payload, etag = _view(session_id, user_id, expires_at)
+    deadline = time.monotonic() + wait
+    while request.if_none_match.contains(etag) and time.monotonic() < deadline and datetime.utcnow() < expires_at:
+        socketio.sleep(min(interval, max(deadline - time.monotonic(), 0)))
+        payload, etag = _view(session_id, user_id, expires_at)
+
+    if request.if_none_match.contains(etag):
+        metrics.inc_counter('tracking_views_total', result='not_modified')
+        response = current_app.response_class(status=304)
+    else:
+        metrics.inc_counter('tracking_views_total', result='ok')
+        response = jsonify(success=True, data=payload)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
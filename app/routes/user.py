@@ -2,9 +2,12 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from app.models.user import User
-from app.models.trusted_contact import TrustedContact
 from app.extensions import db, limiter
 from app.schemas.user_schema import UpdateProfileSchema, FCMTokenSchema
+from app.services.location_retention import purge_user_locations
+from app.services.broadcast_service import invalidate_user_display
+from app.services.tracking_service import invalidate_tracking_authz
+from app.services.user_context import load_user_context, invalidate_user_context
 from marshmallow import ValidationError
 
 user_bp = Blueprint('user', __name__)
@@ -13,10 +16,11 @@ user_bp = Blueprint('user', __name__)
 @jwt_required()
 def get_profile():
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    context = load_user_context(current_user_id)
     
-    if not user:
+    if not context:
         return jsonify(success=False, error={"code": "NOT_FOUND", "message": "User not found"}), 404
+    user = context.user
 
     # Calculate member since string
     member_since = user.created_at.strftime('%B %Y')
@@ -25,7 +29,7 @@ def get_profile():
     is_protection_active = True 
 
     # Get trusted/emergency contacts
-    contacts = TrustedContact.query.filter_by(user_id=current_user_id).all()
+    contacts = context.contacts
 
     return jsonify(success=True, data={
         "user_id": user.id,
@@ -33,11 +37,10 @@ def get_profile():
         "email": user.email,
         "country": user.country,
         "phone": user.phone,
-        "phone": user.phone,
         "sos_message": user.sos_message,
         "profile_image_url": user.profile_image_url,
-        "emergency_contact": user.settings.emergency_number if user.settings else None,
-        "trusted_contacts": [c.to_dict() for c in contacts],
+        "emergency_contact": context.settings.emergency_number if context.settings else None,
+        "trusted_contacts": [c._asdict() for c in contacts],
         "trusted_contacts_count": len(contacts),
         "member_since": member_since,
         "is_protection_active": is_protection_active,
@@ -77,6 +80,10 @@ def update_profile():
              return jsonify(success=False, error={"code": "CONFLICT", "message": "Email or Phone number already in use"}), 409
         return jsonify(success=False, error={"code": "INTERNAL_ERROR", "message": "An unexpected error occurred"}), 500
 
+    invalidate_user_display(current_user_id)
+    invalidate_user_context(current_user_id)
+    if 'phone' in data:
+        invalidate_tracking_authz(requester_id=current_user_id)
     return jsonify(success=True, message="Profile updated successfully"), 200
 
 @user_bp.route('/fcm-token', methods=['PUT'])
@@ -108,9 +115,11 @@ def delete_account():
     if not user:
         return jsonify(success=False, error={"code": "NOT_FOUND", "message": "User not found"}), 404
 
-    # Logic to delete related data would go here (cascade delete handles most if configured)
+    # Location data is bulk-deleted; the ORM cascade handles the rest
+    purge_user_locations(user.id)
     db.session.delete(user)
     db.session.commit()
+    invalidate_user_context(user.id)
 
     return jsonify(success=True, message="Account deleted successfully"), 200
 
@@ -128,7 +137,9 @@ def delete_user_by_id(user_id):
     if not user:
         return jsonify(success=False, error={"code": "NOT_FOUND", "message": "User not found"}), 404
 
+    purge_user_locations(user.id)
     db.session.delete(user)
     db.session.commit()
+    invalidate_user_context(user.id)
 
     return jsonify(success=True, message=f"User {user_id} deleted successfully"), 200
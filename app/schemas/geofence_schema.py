@@ -0,0 +1,9 @@
+from marshmallow import Schema, fields, validate
+
+class GeofenceSchema(Schema):
+    name = fields.Str(required=True, validate=validate.Length(min=1, max=100))
+    latitude = fields.Float(required=True, validate=validate.Range(min=-90, max=90))
+    longitude = fields.Float(required=True, validate=validate.Range(min=-180, max=180))
+    radius_m = fields.Float(required=True, validate=validate.Range(min=25))
+    notify_on = fields.Str(validate=validate.OneOf(['exit', 'enter', 'both']))
+    is_active = fields.Bool()
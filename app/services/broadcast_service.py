@@ -0,0 +1,211 @@
+"""
+Emitting Socket.IO events to rooms from anywhere: request handlers, background
+threads and Celery workers. With SOCKETIO_MESSAGE_QUEUE set, emits go through
+the queue, so whichever web worker holds the subscriber's connection delivers it.
+
+Live location goes through broadcast_location(), which:
+  - skips rooms nobody has joined (occupancy is counted on join/leave/disconnect,
+    in Redis when CACHE_REDIS_URL is set so every worker sees the same counts).
+    With a message queue but no CACHE_REDIS_URL, a viewer may have joined on
+    another worker, so every room counts as occupied
+  - caches each sharer's display name instead of loading the user per update
+    (invalidated on every worker through app.utils.cache_invalidation)
+  - sends at most one update per room every LOCATION_BROADCAST_MIN_INTERVAL
+    seconds; updates in between are merged and the latest one is sent when
+    the interval is up
+"""
+from app.extensions import socketio
+from app.utils import metrics
+from app.utils.cache import TTLCache
+from app.utils.cache_invalidation import caches_synced, invalidate, register_cache
+from app.utils.redis_client import get_redis
+from flask import current_app
+from datetime import datetime
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+LOCATION_NAMESPACE = '/location'
+_OCCUPANCY_KEY = 'socketio:room_occupancy'
+
+
+def emit_to_room(event, payload, room, namespace=LOCATION_NAMESPACE):
+    """Emit `event` to `room`. Never raises: a failed broadcast must not fail the caller."""
+    try:
+        socketio.emit(event, payload, to=room, namespace=namespace)
+        return True
+    except Exception as e:
+        logger.error(f"Failed to emit {event} to {room}: {e}")
+        return False
+
+
+def tracking_room(user_id):
+    return f"tracking_{user_id}"
+
+
+def user_room(user_id):
+    return f"user_{user_id}"
+
+
+# ---------------------------------------------------------------------------
+# Room occupancy
+# ---------------------------------------------------------------------------
+_local_occupancy = {}
+_occupancy_lock = threading.Lock()
+
+
+def _change_occupancy(room, delta):
+    client = get_redis()
+    if client is not None:
+        try:
+            count = client.hincrby(_OCCUPANCY_KEY, room, delta)
+            if count <= 0:
+                client.hdel(_OCCUPANCY_KEY, room)
+            return
+        except Exception as e:
+            logger.warning(f"Redis room occupancy update failed for {room}: {e}")
+    with _occupancy_lock:
+        count = _local_occupancy.get(room, 0) + delta
+        if count > 0:
+            _local_occupancy[room] = count
+        else:
+            _local_occupancy.pop(room, None)
+
+
+def room_joined(room):
+    _change_occupancy(room, 1)
+
+
+def room_left(room):
+    _change_occupancy(room, -1)
+
+
+def room_occupancy(room):
+    """Number of connections in `room` (across workers when Redis is configured).
+    At least 1 whenever the count can't be known."""
+    client = get_redis()
+    if client is not None:
+        try:
+            return int(client.hget(_OCCUPANCY_KEY, room) or 0)
+        except Exception as e:
+            # Unknown: assume someone is listening rather than drop updates
+            logger.warning(f"Redis room occupancy read failed for {room}: {e}")
+            return 1
+    if current_app.config.get('SOCKETIO_MESSAGE_QUEUE'):
+        # Several workers but no shared counts: joins on the others are invisible here
+        return 1
+    with _occupancy_lock:
+        return _local_occupancy.get(room, 0)
+
+
+def reset_occupancy():
+    """Forget local room counts (tests)."""
+    with _occupancy_lock:
+        _local_occupancy.clear()
+
+
+# ---------------------------------------------------------------------------
+# Display info cache
+# ---------------------------------------------------------------------------
+register_cache('user_display_cache')
+
+
+def _display_cache():
+    cache = current_app.extensions.get('user_display_cache')
+    if cache is None:
+        cache = current_app.extensions.setdefault('user_display_cache', TTLCache(
+            maxsize=int(current_app.config.get('USER_DISPLAY_CACHE_SIZE', 10000)),
+            ttl=int(current_app.config.get('USER_DISPLAY_CACHE_TTL', 300))
+        ))
+    return cache
+
+
+def get_user_display(user_id):
+    """{'name': ...} for broadcast payloads, cached per user."""
+    cache = _display_cache()
+    info = cache.get(user_id) if caches_synced() else None
+    if info is None:
+        from app.models.user import User
+        user = User.query.get(user_id)
+        info = {'name': user.full_name if user else None}
+        cache.set(user_id, info)
+    return info
+
+
+def invalidate_user_display(user_id):
+    """Call after a profile change that affects what viewers see. Reaches every worker."""
+    invalidate('user_display_cache', user_id)
+
+
+# ---------------------------------------------------------------------------
+# Per-room throttling
+# ---------------------------------------------------------------------------
+class _RoomThrottle:
+    """At most one emit per room per interval; later updates replace the pending one."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_sent = TTLCache(maxsize=100000, ttl=300)
+        self._pending = {}
+
+    def submit(self, room, event, payload, min_interval):
+        if min_interval <= 0:
+            return emit_to_room(event, payload, room)
+
+        now = time.monotonic()
+        with self._lock:
+            if room in self._pending:
+                self._pending[room] = (event, payload)
+                metrics.inc_counter('location_broadcasts_total', outcome='merged')
+                return False
+            last = self._last_sent.get(room)
+            if last is None or now - last >= min_interval:
+                self._last_sent.set(room, now)
+                send_now = True
+            else:
+                self._pending[room] = (event, payload)
+                delay = min_interval - (now - last)
+                send_now = False
+
+        if send_now:
+            metrics.inc_counter('location_broadcasts_total', outcome='sent')
+            return emit_to_room(event, payload, room)
+
+        metrics.inc_counter('location_broadcasts_total', outcome='merged')
+        socketio.start_background_task(self._flush_later, room, delay)
+        return False
+
+    def _flush_later(self, room, delay):
+        socketio.sleep(delay)
+        with self._lock:
+            pending = self._pending.pop(room, None)
+            if pending is not None:
+                self._last_sent.set(room, time.monotonic())
+        if pending is not None:
+            metrics.inc_counter('location_broadcasts_total', outcome='sent')
+            emit_to_room(pending[0], pending[1], room)
+
+
+_throttle = _RoomThrottle()
+
+
+def broadcast_location(user_id, lat, lng, accuracy=None):
+    """Send a sharing user's location to their tracking room, if anyone is watching.
+    Returns True if an emit went out immediately."""
+    room = tracking_room(user_id)
+    if room_occupancy(room) <= 0:
+        metrics.inc_counter('location_broadcasts_total', outcome='no_subscribers')
+        return False
+
+    payload = {
+        'user_id': user_id,
+        'name': get_user_display(user_id)['name'],
+        'latitude': lat,
+        'longitude': lng,
+        'accuracy': accuracy,
+        'timestamp': datetime.utcnow().isoformat()
+    }
+    min_interval = float(current_app.config.get('LOCATION_BROADCAST_MIN_INTERVAL', 1.0))
+    return _throttle.submit(room, 'location_update', payload, min_interval)
@@ -1,34 +1,136 @@
-
-from flask_mail import Message
-from app.extensions import mail
-from flask import current_app
+from flask_mail import Message, Connection
+from app.utils.circuit_breaker import get_breaker, CircuitOpenError
+from flask import current_app, render_template
 import logging
+import queue
+import smtplib
 import threading
 
 logger = logging.getLogger(__name__)
 
 
-def _send_email_thread(app, subject, recipient, html_body, sender):
-    """Send email in a background thread."""
-    with app.app_context():
+class _TimeoutConnection(Connection):
+    """Flask-Mail connection with explicit connect/read timeouts.
+    Flask-Mail opens smtplib.SMTP without a timeout, so a hung server would block forever."""
+
+    def configure_host(self):
+        connect_timeout = current_app.config.get('PROVIDER_CONNECT_TIMEOUT', 5)
+        read_timeout = current_app.config.get('PROVIDER_READ_TIMEOUT', 10)
+
+        if self.mail.use_ssl:
+            host = smtplib.SMTP_SSL(self.mail.server, self.mail.port, timeout=connect_timeout)
+        else:
+            host = smtplib.SMTP(self.mail.server, self.mail.port, timeout=connect_timeout)
+        host.sock.settimeout(read_timeout)
+
+        host.set_debuglevel(int(self.mail.debug))
+
+        if self.mail.use_tls:
+            host.starttls()
+
+        if self.mail.username and self.mail.password:
+            host.login(self.mail.username, self.mail.password)
+
+        return host
+
+
+class _PooledMailSender:
+    """
+    Sends queued emails from one background thread over a single SMTP connection.
+
+    The connection (and its TLS handshake + login) is opened on first use, reused
+    for every message after that, closed after MAIL_POOL_IDLE_TIMEOUT seconds
+    without traffic, and reopened automatically if the server drops it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._queue = queue.Queue()
+        self._connection = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, msg):
+        self._queue.put(msg)
+        self._ensure_worker()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        with self.app.app_context():
+            idle_timeout = float(current_app.config.get('MAIL_POOL_IDLE_TIMEOUT', 60))
+            batch_size = int(current_app.config.get('MAIL_POOL_BATCH_SIZE', 20))
+            while True:
+                try:
+                    batch = [self._queue.get(timeout=idle_timeout)]
+                except queue.Empty:
+                    self._close()
+                    continue
+                while len(batch) < batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                for msg in batch:
+                    self._send(msg)
+
+    def _send(self, msg):
+        recipient = ', '.join(msg.recipients)
         try:
-            msg = Message(subject, sender=sender, recipients=[recipient])
-            msg.html = html_body
-            mail.send(msg)
+            get_breaker('email').call(self._send_with_reconnect, msg)
             logger.info(f"Email sent to {recipient}")
+        except CircuitOpenError:
+            logger.warning(f"Email provider circuit open, dropping email to {recipient}")
         except Exception as e:
             logger.error(f"Failed to send email to {recipient}: {str(e)}")
 
+    def _send_with_reconnect(self, msg):
+        # A pooled connection can go stale between batches; retry once on a fresh one
+        for attempt in range(2):
+            if self._connection is None:
+                self._connection = _TimeoutConnection(current_app.extensions['mail']).__enter__()
+            try:
+                msg.send(self._connection)
+                return
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, OSError):
+                self._close()
+                if attempt:
+                    raise
+
+    def _close(self):
+        connection, self._connection = self._connection, None
+        if connection is None or connection.host is None:
+            return
+        try:
+            connection.host.quit()
+        except Exception:
+            connection.host.close()
+
+
+_sender_lock = threading.Lock()
+
+
+def _get_mail_sender(app):
+    sender = app.extensions.get('mail_sender')
+    if sender is None:
+        with _sender_lock:
+            sender = app.extensions.setdefault('mail_sender', _PooledMailSender(app))
+    return sender
+
 
 def _dispatch_email(subject, to_email, html_body):
-    """Dispatch an email in a background thread."""
+    """Queue an email on the pooled background sender."""
     sender = current_app.config.get('MAIL_USERNAME')
     if not sender:
         logger.warning("MAIL_USERNAME not set. Email sending will fail.")
         return False
-    app = current_app._get_current_object()
-    t = threading.Thread(target=_send_email_thread, args=(app, subject, to_email, html_body, sender), daemon=True)
-    t.start()
+    msg = Message(subject, sender=sender, recipients=[to_email])
+    msg.html = html_body
+    _get_mail_sender(current_app._get_current_object()).submit(msg)
     return True
 
 
@@ -36,33 +138,7 @@ def send_otp_email(to_email, otp_code):
     """Sends an OTP to the specified email address."""
     try:
         subject = "Your Verification Code - Asfalis"
-        html_body = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{ font-family: 'Helvetica Neue', Helvetica, Arial, sans-serif; background-color: #f4f4f4; margin: 0; padding: 0; }}
-                .container {{ max-width: 600px; margin: 20px auto; background-color: #ffffff; border-radius: 8px; overflow: hidden; box-shadow: 0 4px 6px rgba(0,0,0,0.1); }}
-                .header {{ background-color: #4CAF50; color: white; padding: 20px; text-align: center; }}
-                .content {{ padding: 30px; color: #333333; line-height: 1.6; text-align: center; }}
-                .otp-code {{ font-size: 32px; font-weight: bold; color: #4CAF50; letter-spacing: 5px; margin: 20px 0; background-color: #f0f8f0; padding: 10px; display: inline-block; border-radius: 4px; }}
-                .footer {{ background-color: #eeeeee; color: #777777; padding: 15px; text-align: center; font-size: 12px; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header"><h1>Verification Code</h1></div>
-                <div class="content">
-                    <p>Hello,</p>
-                    <p>Use the following code to verify your email address for <strong>Asfalis</strong>.</p>
-                    <div class="otp-code">{otp_code}</div>
-                    <p>This code is valid for <strong>5 minutes</strong>.<br>Do not share this code with anyone.</p>
-                </div>
-                <div class="footer"><p>Asfalis - Your Safety, Our Priority.</p></div>
-            </div>
-        </body>
-        </html>
-        """
+        html_body = render_template('email/otp.html', otp_code=otp_code)
         result = _dispatch_email(subject, to_email, html_body)
         if result:
             logger.info(f"OTP email dispatched for {to_email}")
@@ -81,43 +157,14 @@ def send_contact_added_email(to_email, contact_name, user_name, twilio_number, s
         encoded_code = sandbox_code.replace(' ', '%20')
         whatsapp_link = f"https://wa.me/{clean_number}?text={encoded_code}"
 
-        html_body = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{ font-family: 'Helvetica Neue', Helvetica, Arial, sans-serif; background-color: #f4f4f4; margin: 0; padding: 0; }}
-                .container {{ max-width: 600px; margin: 20px auto; background-color: #ffffff; border-radius: 8px; overflow: hidden; box-shadow: 0 4px 6px rgba(0,0,0,0.1); }}
-                .header {{ background-color: #4CAF50; color: white; padding: 20px; text-align: center; }}
-                .content {{ padding: 30px; color: #333333; line-height: 1.6; }}
-                .button {{ display: inline-block; padding: 12px 24px; background-color: #25D366; color: white; text-decoration: none; border-radius: 5px; font-weight: bold; margin-top: 20px; }}
-                .footer {{ background-color: #eeeeee; color: #777777; padding: 15px; text-align: center; font-size: 12px; }}
-                .code-box {{ background-color: #f9f9f9; border: 1px solid #ddd; padding: 10px; font-family: monospace; font-size: 16px; margin: 10px 0; display: inline-block; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header"><h1>You're a Trusted Contact 🛡️</h1></div>
-                <div class="content">
-                    <p>Hello <strong>{contact_name}</strong>,</p>
-                    <p><strong>{user_name}</strong> has added you as a trusted contact in <strong>Asfalis</strong>, their personal safety app.</p>
-                    <p>This means you will receive immediate alerts with their location if they trigger an SOS.</p>
-                    <hr style="border: 0; border-top: 1px solid #eee; margin: 20px 0;">
-                    <h3>⚠️ Important Next Step</h3>
-                    <p>To ensure you receive these emergency alerts on WhatsApp, you <strong>must</strong> join our sandbox environment.</p>
-                    <p>1. Save this number: <strong>{twilio_number}</strong></p>
-                    <p>2. Send the following code to that number on WhatsApp:</p>
-                    <div class="code-box">{sandbox_code}</div>
-                    <p>Or simply click the button below:</p>
-                    <div style="text-align: center;">
-                        <a href="{whatsapp_link}" class="button">Join on WhatsApp</a>
-                    </div>
-                </div>
-                <div class="footer"><p>Asfalis - Your Safety, Our Priority.</p></div>
-            </div>
-        </body>
-        </html>
-        """
+        html_body = render_template(
+            'email/contact_added.html',
+            contact_name=contact_name,
+            user_name=user_name,
+            twilio_number=twilio_number,
+            sandbox_code=sandbox_code,
+            whatsapp_link=whatsapp_link
+        )
         result = _dispatch_email(subject, to_email, html_body)
         if result:
             logger.info(f"Contact notification dispatched for {to_email}")
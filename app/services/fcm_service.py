@@ -1,7 +1,8 @@
 
 import firebase_admin
-from firebase_admin import credentials, messaging
+from firebase_admin import credentials, messaging, exceptions
 from app.config import Config
+from app.utils.circuit_breaker import get_breaker, is_provider_failure, CircuitOpenError
 import os
 import json
 import logging
@@ -9,17 +10,32 @@ import threading
 
 logger = logging.getLogger(__name__)
 
+# FCM accepts at most 500 tokens per multicast request
+MULTICAST_BATCH_SIZE = 500
+
+# Errors meaning the token itself is dead and should be dropped
+_INVALID_TOKEN_ERRORS = (
+    messaging.UnregisteredError,
+    messaging.SenderIdMismatchError,
+)
+
+# Errors about the request rather than FCM's health. InvalidArgumentError can
+# be a bad payload as well as a bad token, so it fails the send but keeps the token.
+_CLIENT_ERRORS = _INVALID_TOKEN_ERRORS + (exceptions.InvalidArgumentError,)
+
 # Initialize Firebase App
 cred_path = Config.FIREBASE_CREDENTIALS_PATH
 cred_json = Config.FIREBASE_CREDENTIALS_JSON
+# firebase_admin takes a single timeout covering connect and read
+firebase_options = {'httpTimeout': Config.PROVIDER_CONNECT_TIMEOUT + Config.PROVIDER_READ_TIMEOUT}
 
 try:
     if cred_path and os.path.exists(cred_path):
         cred = credentials.Certificate(cred_path)
-        firebase_admin.initialize_app(cred)
+        firebase_admin.initialize_app(cred, options=firebase_options)
     elif cred_json:
         cred = credentials.Certificate(json.loads(cred_json))
-        firebase_admin.initialize_app(cred)
+        firebase_admin.initialize_app(cred, options=firebase_options)
     else:
         logger.warning("Firebase credentials not found (PATH or JSON). Push notifications will not work.")
 except ValueError:
@@ -53,17 +69,12 @@ def send_push_notification(fcm_token, title, body, data=None):
                 notification=messaging.Notification(title=title, body=body),
                 data=data or {},
                 token=fcm_token,
-                android=messaging.AndroidConfig(
-                    priority='high',
-                    notification=messaging.AndroidNotification(
-                        channel_id='sos_channel',
-                        priority='max',
-                        sound='alarm'
-                    )
-                )
+                android=_android_config()
             )
-            response = messaging.send(message)
+            response = get_breaker('fcm').call(messaging.send, message, is_failure=_is_fcm_failure)
             logger.info(f"Push notification sent: {response}")
+        except CircuitOpenError:
+            logger.warning("FCM circuit open, dropping push notification.")
         except Exception as e:
             logger.error(f"Error sending push notification: {e}")
 
@@ -71,3 +82,82 @@ def send_push_notification(fcm_token, title, body, data=None):
     t.start()
     logger.info(f"Push notification dispatch started for token: {fcm_token[:20]}...")
     return "dispatched"
+
+
+def _android_config():
+    return messaging.AndroidConfig(
+        priority='high',
+        notification=messaging.AndroidNotification(
+            channel_id='sos_channel',
+            priority='max',
+            sound='alarm'
+        )
+    )
+
+
+def _send_each_for_multicast(message):
+    """FCM transport. Kept separate so tests can swap in a local stub."""
+    return messaging.send_each_for_multicast(message)
+
+
+def send_multicast(tokens, title, body, data=None):
+    """
+    Send one notification to many tokens, synchronously, in chunks of
+    MULTICAST_BATCH_SIZE. Used by the notification outbox worker.
+
+    Returns a dict mapping each token to (message_id, error) — error is None on
+    success — or None if Firebase isn't configured. If a chunk's request fails
+    (CircuitOpenError, transport error), each of its tokens gets that exception
+    as its error and the chunks already sent keep their results, so a retry
+    doesn't push to their tokens twice.
+    """
+    if not _is_firebase_ready():
+        logger.warning("Firebase not configured, skipping multicast push.")
+        return None
+
+    results = {}
+    for start in range(0, len(tokens), MULTICAST_BATCH_SIZE):
+        chunk = tokens[start:start + MULTICAST_BATCH_SIZE]
+        message = messaging.MulticastMessage(
+            tokens=chunk,
+            notification=messaging.Notification(title=title, body=body),
+            data=data or {},
+            android=_android_config()
+        )
+        try:
+            batch = get_breaker('fcm').call(_send_each_for_multicast, message)
+        except Exception as e:
+            logger.error(f"Multicast push of {len(chunk)} token(s) failed: {e}")
+            results.update((token, (None, e)) for token in chunk)
+            continue
+        for token, response in zip(chunk, batch.responses):
+            if response.success:
+                results[token] = (response.message_id, None)
+            else:
+                results[token] = (None, response.exception)
+        logger.info(f"Multicast push: {batch.success_count}/{len(chunk)} delivered")
+    return results
+
+
+def is_invalid_token_error(error):
+    """True if FCM rejected the token itself (uninstalled app, wrong project)."""
+    return isinstance(error, _INVALID_TOKEN_ERRORS)
+
+
+def _is_fcm_failure(error):
+    """Breaker predicate: a rejected token or payload says nothing about FCM's health."""
+    return not isinstance(error, _CLIENT_ERRORS) and is_provider_failure(error)
+
+
+def prune_invalid_tokens(tokens):
+    """Clear FCM tokens that FCM reported as invalid so we stop sending to them."""
+    if not tokens:
+        return 0
+    from app.extensions import db
+    from app.models.user import User
+    pruned = User.query.filter(User.fcm_token.in_(list(tokens))).update(
+        {'fcm_token': None}, synchronize_session=False
+    )
+    db.session.commit()
+    logger.info(f"Pruned {pruned} invalid FCM token(s)")
+    return pruned
@@ -0,0 +1,122 @@
+"""
+Safe-zone (geofence) evaluation on every location update.
+
+Each user's active zones are loaded once into a GridIndex and cached per
+process for GEOFENCE_CACHE_TTL seconds (users with no zones are cached too, so
+the common case costs one dict lookup). Zone edits invalidate the cache on
+every worker through app.utils.cache_invalidation. A location update checks only the
+zones registered in the point's grid cell plus the zones the user is currently
+inside (needed to notice an exit), then computes exact distances for those.
+
+Only transitions do any work. The new side of the boundary is written with a
+conditional UPDATE, so when several workers see the same crossing only one
+of them notifies. The first location after a zone is created sets a baseline
+without notifying. To stop GPS jitter on the boundary from flapping, an exit
+needs the point to be GEOFENCE_HYSTERESIS_M beyond the radius.
+"""
+from app.extensions import db
+from app.models.geofence import Geofence
+from app.utils import metrics
+from app.utils.cache import TTLCache
+from app.utils.cache_invalidation import caches_synced, invalidate, register_cache
+from app.utils.geo import GridIndex, haversine_m
+from flask import current_app
+from sqlalchemy import or_, update
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class _UserGeofences:
+    def __init__(self, zones, cell_deg):
+        self.zones = {zone['id']: zone for zone in zones}
+        self.grid = GridIndex(cell_deg)
+        for zone in zones:
+            self.grid.add(zone['id'], zone['latitude'], zone['longitude'], zone['radius_m'])
+
+
+def _zone_snapshot(zone):
+    return {
+        'id': zone.id, 'name': zone.name, 'latitude': zone.latitude, 'longitude': zone.longitude,
+        'radius_m': zone.radius_m, 'notify_on': zone.notify_on, 'is_inside': zone.is_inside,
+    }
+
+
+register_cache('geofence_index')
+
+
+def _geofence_cache():
+    cache = current_app.extensions.get('geofence_index')
+    if cache is None:
+        cache = current_app.extensions.setdefault('geofence_index', TTLCache(
+            maxsize=int(current_app.config.get('GEOFENCE_CACHE_SIZE', 10000)),
+            ttl=int(current_app.config.get('GEOFENCE_CACHE_TTL', 60))
+        ))
+    return cache
+
+
+def _user_geofences(user_id):
+    cache = _geofence_cache()
+    entry = cache.get(user_id) if caches_synced() else None
+    if entry is None:
+        zones = Geofence.query.filter_by(user_id=user_id, is_active=True).all()
+        entry = _UserGeofences(
+            [_zone_snapshot(zone) for zone in zones],
+            float(current_app.config.get('GEOFENCE_GRID_CELL_DEG', 0.01))
+        )
+        cache.set(user_id, entry)
+    return entry
+
+
+def invalidate_user_geofences(user_id):
+    """Call after creating, editing or deleting a user's zones. Reaches every worker."""
+    invalidate('geofence_index', user_id)
+
+
+def check_geofences(user_id, lat, lng):
+    """Evaluate the user's zones against a new location.
+    Returns a list of (zone, event) for the enter/exit transitions this call recorded."""
+    entry = _user_geofences(user_id)
+    if not entry.zones:
+        return []
+
+    hysteresis_m = float(current_app.config.get('GEOFENCE_HYSTERESIS_M', 20))
+    candidates = set(entry.grid.candidates(lat, lng))
+    candidates.update(zone_id for zone_id, zone in entry.zones.items() if zone['is_inside'] is not False)
+
+    transitions = []
+    for zone_id in candidates:
+        zone = entry.zones[zone_id]
+        distance = haversine_m(lat, lng, zone['latitude'], zone['longitude'])
+        was_inside = zone['is_inside']
+        inside = distance <= zone['radius_m'] + (hysteresis_m if was_inside else 0)
+        if inside == was_inside:
+            continue
+        if _record_transition(zone, inside) and was_inside is not None:
+            event = 'enter' if inside else 'exit'
+            transitions.append((zone, event))
+    for zone, event in transitions:
+        _notify(user_id, zone, event, lat, lng)
+    return transitions
+
+
+def _record_transition(zone, inside):
+    """Persist the new side of the boundary. True if this call made the change."""
+    result = db.session.execute(
+        update(Geofence)
+        .where(Geofence.id == zone['id'], or_(Geofence.is_inside.is_(None), Geofence.is_inside != inside))
+        .values(is_inside=inside)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    zone['is_inside'] = inside
+    return result.rowcount == 1
+
+
+def _notify(user_id, zone, event, lat, lng):
+    metrics.inc_counter('geofence_transitions_total', event=event)
+    if zone['notify_on'] not in (event, 'both'):
+        return
+    from app.services.sos_service import notify_geofence_transition
+    notify_geofence_transition(user_id, zone['name'], event, lat, lng)
+    logger.info(f"Geofence {zone['id']} {event} for user {user_id}")
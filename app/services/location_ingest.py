@@ -0,0 +1,209 @@
+"""
+Write-coalescing buffer for location history.
+
+update_location() used to INSERT and commit every GPS point on its own. Points
+are now appended to an in-process buffer and written by a background thread
+every LOCATION_FLUSH_INTERVAL seconds (or as soon as LOCATION_FLUSH_BATCH_SIZE
+points are waiting) as one multi-row INSERT into location_history plus one
+upsert of each user's latest point into user_last_location.
+
+The latest-point cache and socket broadcasts are updated before buffering, so
+readers never wait for a flush. When a batch write fails, each user's points
+are written on their own, then each point of a failing user, so a bad row
+(e.g. a point for a user deleted meanwhile) is dropped and counted without
+losing the rest. If nothing can be written (database down), the batch keeps
+its points and retries on the next cycle; after LOCATION_FLUSH_MAX_RETRIES
+failures it is dropped and counted. With LOCATION_FLUSH_INTERVAL = 0 every
+point is flushed inline.
+"""
+from app.extensions import db
+from app.models.location import LocationHistory
+from app.utils import metrics
+from flask import current_app
+from sqlalchemy import insert
+import atexit
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class _LocationIngestBuffer:
+    def __init__(self, app):
+        self.app = app
+        self._points = []
+        self._failures = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        atexit.register(self._flush_at_exit)
+
+    @property
+    def depth(self):
+        with self._lock:
+            return len(self._points)
+
+    def submit(self, point):
+        """Buffer one point (a dict of LocationHistory columns)."""
+        interval = float(self.app.config.get('LOCATION_FLUSH_INTERVAL', 1.0))
+        batch_size = int(self.app.config.get('LOCATION_FLUSH_BATCH_SIZE', 500))
+        with self._lock:
+            self._points.append(point)
+            depth = len(self._points)
+        metrics.set_gauge('location_ingest_buffer_depth', depth)
+
+        if interval <= 0:
+            self.flush()
+            return
+        self._ensure_worker()
+        if depth >= batch_size:
+            self._wake.set()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        interval = float(self.app.config.get('LOCATION_FLUSH_INTERVAL', 1.0))
+        while True:
+            self._wake.wait(interval)
+            self._wake.clear()
+            with self.app.app_context():
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.error(f"Location ingest flush crashed: {e}")
+
+    def flush(self):
+        """Write everything buffered so far. Returns the number of points written."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._points = self._points, []
+            if not batch:
+                return 0
+
+            try:
+                _write_points(batch)
+                written = len(batch)
+            except Exception as e:
+                db.session.rollback()
+                written, rejected = self._write_isolated(batch)
+                if not written:
+                    self._requeue(batch, e)
+                    return 0
+                if rejected:
+                    logger.error(f"Dropping {len(rejected)} location point(s) that can't be written: {e}")
+                    metrics.inc_counter('location_ingest_dropped_total', len(rejected))
+
+            self._failures = 0
+            metrics.inc_counter('location_ingest_points_total', written)
+            metrics.inc_counter('location_ingest_flushes_total')
+            metrics.set_gauge('location_ingest_buffer_depth', self.depth)
+            return written
+
+    def _write_isolated(self, batch):
+        """Write `batch` one user at a time, then one point at a time for users whose
+        points fail. Returns (points written, points that failed on their own)."""
+        by_user = {}
+        for point in batch:
+            by_user.setdefault(point['user_id'], []).append(point)
+
+        written, rejected = 0, []
+        for points in by_user.values():
+            try:
+                _write_points(points)
+                written += len(points)
+                continue
+            except Exception:
+                db.session.rollback()
+            for point in points:
+                try:
+                    _write_points([point])
+                    written += 1
+                except Exception:
+                    db.session.rollback()
+                    rejected.append(point)
+        return written, rejected
+
+    def discard_user(self, user_id):
+        """Drop `user_id`'s buffered points, after any flush in progress has finished."""
+        with self._flush_lock:
+            with self._lock:
+                kept = [point for point in self._points if point['user_id'] != user_id]
+                discarded = len(self._points) - len(kept)
+                self._points = kept
+        metrics.set_gauge('location_ingest_buffer_depth', self.depth)
+        return discarded
+
+    def _requeue(self, batch, error):
+        self._failures += 1
+        max_retries = int(self.app.config.get('LOCATION_FLUSH_MAX_RETRIES', 5))
+        metrics.inc_counter('location_ingest_flush_failures_total')
+        if self._failures > max_retries:
+            logger.error(f"Dropping {len(batch)} location point(s) after {self._failures - 1} retries: {error}")
+            metrics.inc_counter('location_ingest_dropped_total', len(batch))
+            self._failures = 0
+        else:
+            logger.warning(f"Location flush failed ({self._failures}/{max_retries}), will retry {len(batch)} point(s): {error}")
+            with self._lock:
+                # Keep arrival order: failed batch goes back in front of newer points
+                self._points = batch + self._points
+        metrics.set_gauge('location_ingest_buffer_depth', self.depth)
+
+    def _flush_at_exit(self):
+        if not self.depth:
+            return
+        try:
+            with self.app.app_context():
+                self.flush()
+        except Exception as e:
+            logger.error(f"Location flush at shutdown failed: {e}")
+
+
+def _write_points(points):
+    from app.services.location_service import _upsert_last_locations, _SNAPSHOT_FIELDS
+
+    # Points the persistence filter skipped only update the latest-point row
+    history = [
+        {key: value for key, value in point.items() if key != 'persist'}
+        for point in points if point.get('persist', True)
+    ]
+    if history:
+        # executemany on one INSERT: SQLAlchemy sends it as multi-row VALUES batches
+        db.session.execute(insert(LocationHistory), history)
+
+    # Coalesce to one latest point per user (a multi-row upsert can't touch a row twice)
+    latest = {}
+    for point in points:
+        current = latest.get(point['user_id'])
+        if current is None or point['recorded_at'] >= current['recorded_at']:
+            latest[point['user_id']] = point
+    _upsert_last_locations([
+        dict({field: point.get(field) for field in _SNAPSHOT_FIELDS}, user_id=user_id)
+        for user_id, point in latest.items()
+    ])
+    db.session.commit()
+
+
+_buffer_lock = threading.Lock()
+
+
+def get_ingest_buffer(app=None):
+    app = app or current_app._get_current_object()
+    buffer = app.extensions.get('location_ingest')
+    if buffer is None:
+        with _buffer_lock:
+            buffer = app.extensions.setdefault('location_ingest', _LocationIngestBuffer(app))
+    return buffer
+
+
+def submit_point(point):
+    get_ingest_buffer().submit(point)
+
+
+def flush_pending():
+    """Flush the buffer now (tests, shutdown hooks)."""
+    return get_ingest_buffer().flush()
@@ -0,0 +1,266 @@
+"""
+Location history lifecycle: monthly partitions, daily rollups and retention.
+
+On PostgreSQL location_history is range-partitioned by month on recorded_at
+(tables named location_history_yYYYYmMM). ensure_future_partitions() keeps
+LOCATION_PARTITION_MONTHS_AHEAD months created ahead of time, and
+apply_retention() removes months older than LOCATION_RETENTION_MONTHS by
+detaching and dropping the partition, after optionally writing it to a gzipped
+CSV in LOCATION_ARCHIVE_DIR. Dropping a partition is a metadata operation, not
+a DELETE. Points for a month without a partition of its own go to the DEFAULT
+partition (location_history_default) rather than failing the insert; creating
+the month's partition moves them in. On other databases (SQLite in dev/tests)
+retention is a range DELETE.
+
+Raw points are summarised into location_daily_rollup first, so history views
+keep per-day counts, bounding boxes and distances after the points are gone.
+"""
+from app.extensions import db
+from app.models.location import LocationHistory, LocationDailyRollup, UserLastLocation
+from app.services.location_ingest import get_ingest_buffer
+from app.utils import metrics
+from app.utils.geo import haversine_m
+from flask import current_app
+from sqlalchemy import delete, func, text
+from datetime import date, datetime, timedelta
+import gzip
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = 'location_history'
+DEFAULT_PARTITION = 'location_history_default'
+_PARTITION_NAME = re.compile(r'^location_history_y(\d{4})m(\d{2})$')
+
+
+def _is_postgres():
+    return db.session.get_bind().dialect.name == 'postgresql'
+
+
+def _month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"{PARENT_TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+# ---------------------------------------------------------------------------
+# Partitions (PostgreSQL)
+# ---------------------------------------------------------------------------
+def list_partitions():
+    """Months that currently have a partition, oldest first."""
+    if not _is_postgres():
+        return []
+    names = db.session.execute(text("""
+        SELECT child.relname FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = :parent
+    """), {'parent': PARENT_TABLE}).scalars()
+    months = []
+    for name in names:
+        match = _PARTITION_NAME.match(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+def _create_partition(month):
+    """Create `month`'s partition, moving in any of its rows already in the default
+    partition (attaching a range the default still holds rows for would fail)."""
+    name = partition_name(month)
+    start, end = month.isoformat(), _add_months(month, 1).isoformat()
+    # Hold off inserts routed to the default until the new range is attached
+    db.session.execute(text(f"LOCK TABLE {DEFAULT_PARTITION} IN EXCLUSIVE MODE"))
+    db.session.execute(text(f"CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS)"))
+    db.session.execute(text(f"""
+        WITH moved AS (
+            DELETE FROM {DEFAULT_PARTITION} WHERE recorded_at >= :start AND recorded_at < :end RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved
+    """), {'start': start, 'end': end})
+    # Builds the partition's primary key and indexes to match the parent's
+    db.session.execute(text(
+        f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} FOR VALUES FROM ('{start}') TO ('{end}')"
+    ))
+    return name
+
+
+def ensure_future_partitions(months_ahead=None):
+    """Create partitions from the current month through `months_ahead` months ahead.
+    Returns the names of partitions created."""
+    if not _is_postgres():
+        return []
+    months_ahead = int(current_app.config.get('LOCATION_PARTITION_MONTHS_AHEAD', 3) if months_ahead is None else months_ahead)
+    existing = set(list_partitions())
+    current = _month_start(datetime.utcnow().date())
+
+    created = []
+    for offset in range(months_ahead + 1):
+        month = _add_months(current, offset)
+        if month not in existing:
+            created.append(_create_partition(month))
+    db.session.commit()
+    if created:
+        logger.info(f"Created location_history partitions: {', '.join(created)}")
+    return created
+
+
+# ---------------------------------------------------------------------------
+# Daily rollups
+# ---------------------------------------------------------------------------
+def rollup_day(day):
+    """(Re)build location_daily_rollup rows for every user with points on `day`.
+    Returns the number of users rolled up."""
+    start = datetime.combine(day, datetime.min.time())
+    end = start + timedelta(days=1)
+
+    rows = db.session.query(
+        LocationHistory.user_id, LocationHistory.latitude, LocationHistory.longitude, LocationHistory.recorded_at
+    ).filter(
+        LocationHistory.recorded_at >= start, LocationHistory.recorded_at < end
+    ).order_by(LocationHistory.user_id, LocationHistory.recorded_at).yield_per(5000)
+
+    rollups = []
+    current = None
+    previous = None
+    for user_id, lat, lng, recorded_at in rows:
+        if current is None or current['user_id'] != user_id:
+            current = {
+                'user_id': user_id, 'day': day, 'point_count': 0,
+                'min_latitude': lat, 'max_latitude': lat, 'min_longitude': lng, 'max_longitude': lng,
+                'distance_m': 0.0, 'first_recorded_at': recorded_at, 'last_recorded_at': recorded_at,
+            }
+            rollups.append(current)
+            previous = None
+        current['point_count'] += 1
+        current['min_latitude'] = min(current['min_latitude'], lat)
+        current['max_latitude'] = max(current['max_latitude'], lat)
+        current['min_longitude'] = min(current['min_longitude'], lng)
+        current['max_longitude'] = max(current['max_longitude'], lng)
+        current['last_recorded_at'] = recorded_at
+        if previous is not None:
+            current['distance_m'] += haversine_m(previous[0], previous[1], lat, lng)
+        previous = (lat, lng)
+
+    db.session.execute(delete(LocationDailyRollup).where(LocationDailyRollup.day == day))
+    if rollups:
+        db.session.execute(LocationDailyRollup.__table__.insert(), rollups)
+    db.session.commit()
+    return len(rollups)
+
+
+def rollup_range(start_day, end_day, skip_existing=True):
+    """Roll up each day in [start_day, end_day) that has points.
+    Days already rolled up are skipped so nightly rollups (built from the raw,
+    uncompacted points) aren't overwritten. Returns days processed."""
+    start = datetime.combine(start_day, datetime.min.time())
+    end = datetime.combine(end_day, datetime.min.time())
+    bounds = db.session.query(func.min(LocationHistory.recorded_at), func.max(LocationHistory.recorded_at)).filter(
+        LocationHistory.recorded_at >= start, LocationHistory.recorded_at < end
+    ).one()
+    if bounds[0] is None:
+        return 0
+
+    done = set()
+    if skip_existing:
+        done = {day for (day,) in db.session.query(LocationDailyRollup.day).filter(
+            LocationDailyRollup.day >= start_day, LocationDailyRollup.day < end_day
+        ).distinct()}
+
+    day, last = bounds[0].date(), bounds[1].date()
+    processed = 0
+    while day <= last:
+        if day not in done:
+            rollup_day(day)
+            processed += 1
+        day += timedelta(days=1)
+    return processed
+
+
+# ---------------------------------------------------------------------------
+# Retention
+# ---------------------------------------------------------------------------
+def _archive_partition(name, archive_dir):
+    """Stream a partition to <archive_dir>/<name>.csv.gz with COPY."""
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{name}.csv.gz")
+    raw = db.session.connection().connection.driver_connection
+    with raw.cursor() as cursor, gzip.open(path, 'wt', encoding='utf-8') as fh:
+        cursor.copy_expert(f"COPY {name} TO STDOUT WITH CSV HEADER", fh)
+    return path
+
+
+def retention_cutoff(retention_months=None):
+    """First day still kept: history before it is (or is about to be) removed, and on
+    PostgreSQL its partition may no longer exist."""
+    if retention_months is None:
+        retention_months = current_app.config.get('LOCATION_RETENTION_MONTHS', 12)
+    return _add_months(_month_start(datetime.utcnow().date()), -int(retention_months))
+
+
+def apply_retention(retention_months=None, archive_dir=None):
+    """Remove history older than `retention_months` whole months, rolling it up first.
+    Returns the list of partitions dropped (or, off PostgreSQL, the rows deleted)."""
+    config = current_app.config
+    archive_dir = archive_dir if archive_dir is not None else config.get('LOCATION_ARCHIVE_DIR')
+    cutoff = retention_cutoff(retention_months)
+
+    if not _is_postgres():
+        oldest = db.session.query(func.min(LocationHistory.recorded_at)).scalar()
+        if oldest is not None and oldest.date() < cutoff:
+            rollup_range(oldest.date(), cutoff)
+        result = db.session.execute(
+            delete(LocationHistory)
+            .where(LocationHistory.recorded_at < datetime.combine(cutoff, datetime.min.time()))
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        metrics.inc_counter('location_retention_rows_deleted_total', result.rowcount or 0)
+        return result.rowcount or 0
+
+    dropped = []
+    for month in list_partitions():
+        if month >= cutoff:
+            break
+        name = partition_name(month)
+        rollup_range(month, _add_months(month, 1))
+        if archive_dir:
+            path = _archive_partition(name, archive_dir)
+            logger.info(f"Archived {name} to {path}")
+        db.session.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+        db.session.execute(text(f"DROP TABLE {name}"))
+        db.session.commit()
+        dropped.append(name)
+        metrics.inc_counter('location_partitions_dropped_total')
+        logger.info(f"Dropped location history partition {name}")
+
+    # Points that landed in the default partition for want of a monthly one
+    cutoff_at = datetime.combine(cutoff, datetime.min.time())
+    oldest = db.session.execute(text(f"SELECT MIN(recorded_at) FROM {DEFAULT_PARTITION}")).scalar()
+    if oldest is not None and oldest < cutoff_at:
+        rollup_range(oldest.date(), cutoff)
+        result = db.session.execute(
+            text(f"DELETE FROM {DEFAULT_PARTITION} WHERE recorded_at < :cutoff"), {'cutoff': cutoff_at}
+        )
+        db.session.commit()
+        metrics.inc_counter('location_retention_rows_deleted_total', result.rowcount or 0)
+    return dropped
+
+
+def purge_user_locations(user_id):
+    """Bulk-delete a user's location data (before deleting the user). Does not commit."""
+    # Buffered points would otherwise be inserted after the delete (or fail the user's FK)
+    get_ingest_buffer().discard_user(user_id)
+    for model in (LocationHistory, UserLastLocation, LocationDailyRollup):
+        db.session.execute(
+            delete(model).where(model.user_id == user_id).execution_options(synchronize_session=False)
+        )
@@ -1,59 +1,379 @@
-
 from app.extensions import db
-from app.models.location import LocationHistory
-from app.models.user import User
+from app.models.location import LocationHistory, UserLastLocation
 from app.models.trusted_contact import TrustedContact
-from datetime import datetime
-from app.extensions import socketio
+from app.services.location_ingest import submit_point, flush_pending
+from app.utils import metrics
+from app.utils.cache import TTLCache
+from app.utils.geo import haversine_m, douglas_peucker
+from app.utils.redis_client import get_redis
+from flask import current_app
+from sqlalchemy import and_, delete, insert, or_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from datetime import datetime, timedelta
+from app.services.broadcast_service import broadcast_location
+from app.services.geofence_service import check_geofences
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+_SNAPSHOT_FIELDS = ('latitude', 'longitude', 'address', 'accuracy', 'is_sharing', 'recorded_at')
 
 def update_location(user_id, lat, lng, is_sharing=False, accuracy=None):
-    # Save to history
-    # In production, we might want to sample this instead of saving every single point
+    # Save to history (downsampled: see _should_persist)
     new_location = LocationHistory(
+        id=str(uuid.uuid4()),
         user_id=user_id,
         latitude=lat,
         longitude=lng,
         is_sharing=is_sharing,
-        accuracy=accuracy
+        accuracy=accuracy,
+        recorded_at=datetime.utcnow()
     )
-    db.session.add(new_location)
-    db.session.commit()
 
-    # If sharing, broadcast via WebSocket
+    # Latest point is visible immediately; history and the durable latest-point
+    # row are written by the ingest buffer in batches
+    snapshot = _snapshot(new_location)
+    _remember_last_location(user_id, snapshot)
+    persist = _should_persist(user_id, snapshot)
+    submit_point(dict(snapshot, id=new_location.id, user_id=user_id, persist=persist))
+
+    # If sharing, broadcast to viewers (skipped when nobody is watching, throttled per room)
     if is_sharing:
-        user = User.query.get(user_id)
-        # Emit to a room specific to this user's trusted contacts
-        # For now, just broadcasting to a user-specific room
-        socketio.emit('location_update', {
-            'user_id': user_id,
-            'name': user.full_name,
-            'latitude': lat,
-            'longitude': lng,
-            'accuracy': accuracy,
-            'timestamp': datetime.utcnow().isoformat()
-        }, room=f"tracking_{user_id}")
-    
+        broadcast_location(user_id, lat, lng, accuracy)
+
+    _check_geofences(user_id, lat, lng)
     return new_location
 
+def _check_geofences(user_id, lat, lng):
+    # Safe-zone transitions must never fail the location update itself
+    try:
+        check_geofences(user_id, lat, lng)
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Geofence check failed for {user_id}: {e}")
+
+def ingest_location_batch(user_id, points):
+    """Store points a client buffered while offline, keeping their recorded_at.
+
+    `points` are dicts with latitude, longitude, recorded_at (naive UTC) and
+    optionally accuracy and is_sharing. All of them go into location_history in
+    one INSERT (the persistence filter is not applied: this is the only copy of
+    the offline track). Only the newest point updates the latest location and
+    is broadcast, and only if nothing newer has arrived live in the meantime.
+    Returns the newest point's snapshot.
+    """
+    rows = []
+    for point in sorted(points, key=lambda p: p['recorded_at']):
+        rows.append({
+            'id': str(uuid.uuid4()),
+            'user_id': user_id,
+            'latitude': point['latitude'],
+            'longitude': point['longitude'],
+            'address': None,
+            'accuracy': point.get('accuracy'),
+            'is_sharing': point.get('is_sharing', False),
+            'recorded_at': point['recorded_at'],
+        })
+
+    newest = _snapshot_from_row(rows[-1])
+    current = get_last_location(user_id)
+    is_newest = current is None or current.recorded_at <= newest['recorded_at']
+
+    db.session.execute(insert(LocationHistory), rows)
+    if is_newest:
+        _upsert_last_locations([dict(newest, user_id=user_id)])
+    db.session.commit()
+    metrics.inc_counter('location_batch_points_total', len(rows))
+
+    if is_newest:
+        _remember_last_location(user_id, newest)
+        _persist_state().set(user_id, newest)
+        if newest['is_sharing']:
+            broadcast_location(user_id, newest['latitude'], newest['longitude'], newest['accuracy'])
+        _check_geofences(user_id, newest['latitude'], newest['longitude'])
+    return newest
+
 def get_last_location(user_id):
-    return LocationHistory.query.filter_by(user_id=user_id).order_by(LocationHistory.recorded_at.desc()).first()
+    """Latest known location of `user_id`, or None.
+
+    Reads the in-process LRU first, then the Redis hash (if configured), then the
+    user_last_location row. Never touches location_history, so the cost doesn't
+    grow with how much history the user has. The result is a detached
+    UserLastLocation: read it, don't modify it (use set_sharing()).
+    """
+    cache = _last_location_cache()
+    snapshot = cache.get(user_id)
+    if snapshot is None:
+        snapshot = _redis_load(user_id)
+        if snapshot is None:
+            row = db.session.get(UserLastLocation, user_id)
+            if row is None:
+                return None
+            snapshot = _snapshot(row)
+            _redis_store(user_id, snapshot)
+        cache.set(user_id, snapshot)
+    return UserLastLocation(user_id=user_id, **snapshot)
+
+def get_live_location(user_id):
+    """Latest location for live viewers (public tracking links), as a snapshot dict.
+
+    With Redis configured it's read first: every worker writes there on each
+    update, so polling viewers never see a position older than the last update,
+    whichever worker handled it. Otherwise (single worker) get_last_location().
+    """
+    snapshot = _redis_load(user_id)
+    if snapshot is None:
+        location = get_last_location(user_id)
+        snapshot = _snapshot(location) if location else None
+    return snapshot
+
+def set_sharing(user_id, is_sharing):
+    """Flip the sharing flag on the user's latest location."""
+    flush_pending() # The latest point may still be buffered
+    db.session.execute(
+        update(UserLastLocation)
+        .where(UserLastLocation.user_id == user_id)
+        .values(is_sharing=is_sharing, updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    _forget_last_location(user_id)
 
 def start_sharing(user_id):
     # Logic to notify contacts that sharing started
-    user = User.query.get(user_id)
     # Update latest location to sharing=True
-    last_loc = get_last_location(user_id)
-    if last_loc:
-        last_loc.is_sharing = True
-        db.session.commit()
-    
+    set_sharing(user_id, True)
+
     # Return contacts being shared with
     contacts = TrustedContact.query.filter_by(user_id=user_id).all()
     return contacts
 
 def stop_sharing(user_id):
-    last_loc = get_last_location(user_id)
-    if last_loc:
-        last_loc.is_sharing = False
-        db.session.commit()
+    set_sharing(user_id, False)
     return True
+
+# ---------------------------------------------------------------------------
+# Persistence filter: broadcasts and the latest point see every ping, history
+# only keeps points that add information
+# ---------------------------------------------------------------------------
+def _persist_state():
+    state = current_app.extensions.get('location_persist_state')
+    if state is None:
+        state = current_app.extensions.setdefault('location_persist_state', TTLCache(
+            maxsize=int(current_app.config.get('LAST_LOCATION_CACHE_SIZE', 10000))
+        ))
+    return state
+
+def _should_persist(user_id, snapshot):
+    """Keep a point if the user moved far enough, enough time passed since the last
+    stored point, or the sharing flag/accuracy changed. Unknown users always keep it."""
+    config = current_app.config
+    state = _persist_state()
+    last = state.get(user_id)
+
+    keep = (
+        last is None
+        or snapshot['is_sharing'] != last['is_sharing']
+        or (snapshot['recorded_at'] - last['recorded_at']).total_seconds() >= float(config.get('LOCATION_PERSIST_MIN_SECONDS', 60))
+        or haversine_m(last['latitude'], last['longitude'], snapshot['latitude'], snapshot['longitude']) >= float(config.get('LOCATION_PERSIST_MIN_DISTANCE_M', 25))
+        or _accuracy_changed(last['accuracy'], snapshot['accuracy'], float(config.get('LOCATION_PERSIST_ACCURACY_DELTA_M', 20)))
+    )
+    if keep:
+        state.set(user_id, snapshot)
+        metrics.inc_counter('location_points_total', outcome='persisted')
+    else:
+        metrics.inc_counter('location_points_total', outcome='skipped')
+    return keep
+
+def _accuracy_changed(before, after, delta_m):
+    if before is None or after is None:
+        return (before is None) != (after is None)
+    return abs(after - before) >= delta_m
+
+def location_history_query(user_id, start=None, end=None, after=None):
+    """Ascending (recorded_at, id) query over one user's history.
+
+    `after` is a (recorded_at, id) keyset position: rows strictly after it are
+    returned, so paging is an index range scan on (user_id, recorded_at) no
+    matter how deep the client pages.
+    """
+    query = LocationHistory.query.filter(LocationHistory.user_id == user_id)
+    if start is not None:
+        query = query.filter(LocationHistory.recorded_at >= start)
+    if end is not None:
+        query = query.filter(LocationHistory.recorded_at < end)
+    if after is not None:
+        after_at, after_id = after
+        query = query.filter(or_(
+            LocationHistory.recorded_at > after_at,
+            and_(LocationHistory.recorded_at == after_at, LocationHistory.id > after_id)
+        ))
+    return query.order_by(LocationHistory.recorded_at, LocationHistory.id)
+
+def get_location_history_page(user_id, start=None, end=None, after=None, limit=500):
+    """One page of history plus the keyset position to continue from (None on the last page)."""
+    rows = location_history_query(user_id, start, end, after).limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, (rows[-1].recorded_at, rows[-1].id)
+    return rows, None
+
+def stream_location_history(user_id, start=None, end=None, after=None, batch_size=1000):
+    """Yield history rows from a server-side cursor, `batch_size` rows at a time."""
+    query = location_history_query(user_id, start, end, after)
+    yield from query.execution_options(stream_results=True).yield_per(batch_size)
+
+def compact_location_history(day=None, epsilon_m=None):
+    """Douglas-Peucker simplify every user's stored track for one UTC day.
+
+    Defaults to the day LOCATION_COMPACT_AFTER_DAYS ago. Tracks are split where
+    is_sharing changes so those transitions survive. Safe to re-run: an already
+    simplified track loses (almost) nothing. Returns the number of points deleted.
+    """
+    config = current_app.config
+    if day is None:
+        day = (datetime.utcnow() - timedelta(days=int(config.get('LOCATION_COMPACT_AFTER_DAYS', 7)))).date()
+    epsilon_m = float(config.get('LOCATION_COMPACT_EPSILON_M', 10) if epsilon_m is None else epsilon_m)
+    start = datetime.combine(day, datetime.min.time())
+    end = start + timedelta(days=1)
+    in_day = (LocationHistory.recorded_at >= start, LocationHistory.recorded_at < end)
+
+    user_ids = [user_id for (user_id,) in db.session.query(LocationHistory.user_id).filter(*in_day).distinct()]
+    removed = 0
+    for user_id in user_ids:
+        rows = db.session.query(
+            LocationHistory.id, LocationHistory.latitude, LocationHistory.longitude, LocationHistory.is_sharing
+        ).filter(LocationHistory.user_id == user_id, *in_day).order_by(LocationHistory.recorded_at).all()
+
+        drop = []
+        segment = []
+        for row in rows + [None]:
+            if segment and (row is None or row.is_sharing != segment[-1].is_sharing):
+                kept = set(douglas_peucker([(r.latitude, r.longitude) for r in segment], epsilon_m))
+                drop.extend(r.id for i, r in enumerate(segment) if i not in kept)
+                segment = []
+            if row is not None:
+                segment.append(row)
+
+        for i in range(0, len(drop), 500):
+            db.session.execute(
+                delete(LocationHistory)
+                .where(LocationHistory.id.in_(drop[i:i + 500]))
+                .execution_options(synchronize_session=False)
+            )
+        db.session.commit()
+        removed += len(drop)
+
+    metrics.inc_counter('location_points_compacted_total', removed)
+    logger.info(f"Compacted location history for {day}: {removed} point(s) removed across {len(user_ids)} user(s)")
+    return removed
+
+# ---------------------------------------------------------------------------
+# Last-location cache: LRU -> Redis hash -> user_last_location table
+# ---------------------------------------------------------------------------
+def _snapshot(location):
+    return {field: getattr(location, field) for field in _SNAPSHOT_FIELDS}
+
+def _snapshot_from_row(row):
+    return {field: row.get(field) for field in _SNAPSHOT_FIELDS}
+
+def _last_location_cache():
+    cache = current_app.extensions.get('last_location_cache')
+    if cache is None:
+        cache = current_app.extensions.setdefault('last_location_cache', TTLCache(
+            maxsize=int(current_app.config.get('LAST_LOCATION_CACHE_SIZE', 10000)),
+            ttl=int(current_app.config.get('LAST_LOCATION_CACHE_TTL', 30))
+        ))
+    return cache
+
+def _upsert_last_locations(rows):
+    """Upsert user_last_location from point dicts (user_id + snapshot fields).
+    A row is only overwritten by a point at least as recent. Does not commit."""
+    if not rows:
+        return
+    now = datetime.utcnow()
+    rows = [dict(row, updated_at=now) for row in rows]
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect in ('postgresql', 'sqlite'):
+        insert = pg_insert if dialect == 'postgresql' else sqlite_insert
+        stmt = insert(UserLastLocation)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id'],
+            set_={field: stmt.excluded[field] for field in _SNAPSHOT_FIELDS + ('updated_at',)},
+            where=UserLastLocation.recorded_at <= stmt.excluded.recorded_at
+        )
+        db.session.execute(stmt, rows)
+        return
+
+    for row in rows:
+        existing = db.session.get(UserLastLocation, row['user_id'])
+        if existing is None:
+            db.session.add(UserLastLocation(**row))
+        elif existing.recorded_at <= row['recorded_at']:
+            for field, value in row.items():
+                setattr(existing, field, value)
+
+def _remember_last_location(user_id, snapshot):
+    """Update the LRU and Redis; the durable row follows with the next ingest flush."""
+    cache = _last_location_cache()
+    cached = cache.get(user_id)
+    if cached is not None and cached['recorded_at'] > snapshot['recorded_at']:
+        return # Out-of-order point; keep the newer one
+    cache.set(user_id, snapshot)
+    _redis_store(user_id, snapshot)
+
+def _forget_last_location(user_id):
+    _last_location_cache().delete(user_id)
+    client = get_redis()
+    if client is None:
+        return
+    try:
+        client.delete(_redis_key(user_id))
+    except Exception as e:
+        logger.warning(f"Redis last-location invalidate failed for {user_id}: {e}")
+
+def _redis_key(user_id):
+    return f"last_location:{user_id}"
+
+def _redis_store(user_id, snapshot):
+    client = get_redis()
+    if client is None:
+        return
+    mapping = {
+        'latitude': repr(snapshot['latitude']),
+        'longitude': repr(snapshot['longitude']),
+        'address': snapshot['address'] or '',
+        'accuracy': '' if snapshot['accuracy'] is None else repr(snapshot['accuracy']),
+        'is_sharing': '1' if snapshot['is_sharing'] else '0',
+        'recorded_at': snapshot['recorded_at'].isoformat(),
+    }
+    try:
+        pipe = client.pipeline()
+        pipe.hset(_redis_key(user_id), mapping=mapping)
+        pipe.expire(_redis_key(user_id), int(current_app.config.get('LAST_LOCATION_REDIS_TTL', 86400)))
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Redis last-location write failed for {user_id}: {e}")
+
+def _redis_load(user_id):
+    client = get_redis()
+    if client is None:
+        return None
+    try:
+        data = client.hgetall(_redis_key(user_id))
+    except Exception as e:
+        logger.warning(f"Redis last-location read failed for {user_id}: {e}")
+        return None
+    if not data:
+        return None
+    return {
+        'latitude': float(data['latitude']),
+        'longitude': float(data['longitude']),
+        'address': data.get('address') or None,
+        'accuracy': float(data['accuracy']) if data.get('accuracy') else None,
+        'is_sharing': data.get('is_sharing') == '1',
+        'recorded_at': datetime.fromisoformat(data['recorded_at']),
+    }
@@ -0,0 +1,408 @@
+from app.extensions import db
+from app.models.notification import NotificationOutbox
+from app.utils.circuit_breaker import CircuitOpenError, OPEN, get_breaker
+from flask import current_app
+from sqlalchemy import and_, func, or_, update
+from datetime import datetime, timedelta
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MAX_BACKOFF_SECONDS = 300
+
+# Where a message goes when its own channel's provider breaker is open, in order
+# of preference (see _reroute)
+CHANNEL_FALLBACKS = {
+    'whatsapp': ('sms',),
+    'sms': ('whatsapp',),
+    'push': ('sms', 'whatsapp'),
+}
+
+# Breaker guarding each channel's provider
+CHANNEL_BREAKERS = {'sms': 'sms', 'whatsapp': 'whatsapp', 'push': 'fcm'}
+
+
+# ---------------------------------------------------------------------------
+# Enqueueing (runs inside the caller's transaction, never commits)
+# ---------------------------------------------------------------------------
+def enqueue_notification(alert, channel, recipient, body):
+    """Add an outbox row for `alert`. The caller commits it together with the alert.
+
+    Idempotent on (alert, recipient, channel): if the alert already has a row for
+    that key, it is returned unchanged instead of queueing a second message.
+    """
+    for existing in alert.notifications:
+        if existing.channel == channel and existing.recipient == recipient:
+            return existing
+
+    row = NotificationOutbox(
+        channel=channel,
+        recipient=recipient,
+        body=body,
+        status='pending',
+        attempts=0
+    )
+    alert.notifications.append(row)
+    return row
+
+
+def schedule_delivery(alert_id):
+    """Kick delivery for a freshly committed alert.
+
+    NOTIFICATION_DELIVERY_MODE:
+      - 'thread' (default): deliver in a background thread, no Celery/Redis required
+      - 'celery': hand off to the delivery worker queue
+      - 'inline': deliver before returning (tests)
+    Rows that are not delivered here are picked up by the periodic sweep.
+    """
+    mode = current_app.config.get('NOTIFICATION_DELIVERY_MODE', 'thread')
+
+    if mode == 'inline':
+        deliver_pending(alert_id=alert_id)
+        return
+
+    if mode == 'celery':
+        try:
+            from app.tasks.notification_tasks import deliver_notifications
+            deliver_notifications.delay(alert_id)
+            return
+        except Exception as e:
+            logger.error(f"Failed to queue delivery for alert {alert_id}, falling back to thread: {e}")
+
+    app = current_app._get_current_object()
+
+    def _deliver():
+        with app.app_context():
+            try:
+                deliver_pending(alert_id=alert_id)
+            except Exception as e:
+                logger.error(f"Background delivery for alert {alert_id} failed: {e}")
+
+    t = threading.Thread(target=_deliver, daemon=True)
+    t.start()
+
+
+# ---------------------------------------------------------------------------
+# Delivery worker
+# ---------------------------------------------------------------------------
+def _claimable_filter(now):
+    claim_timeout = int(current_app.config.get('NOTIFICATION_CLAIM_TIMEOUT_SECONDS', 120))
+    # Rows stuck in 'processing' belong to a worker that died mid-batch; take them back
+    stale_claim = now - timedelta(seconds=claim_timeout)
+    return or_(
+        and_(
+            NotificationOutbox.status == 'pending',
+            or_(NotificationOutbox.next_attempt_at.is_(None), NotificationOutbox.next_attempt_at <= now)
+        ),
+        and_(
+            NotificationOutbox.status == 'processing',
+            NotificationOutbox.claimed_at < stale_claim
+        )
+    )
+
+
+def _snapshot(row):
+    return {
+        'id': row.id,
+        'alert_id': row.alert_id,
+        'channel': row.channel,
+        'recipient': row.recipient,
+        'body': row.body,
+        'attempts': row.attempts,
+    }
+
+
+def claimable_query(now, limit, alert_id=None):
+    """Deliverable rows, oldest first (optionally only `alert_id`'s)."""
+    query = NotificationOutbox.query.filter(_claimable_filter(now))
+    if alert_id:
+        query = query.filter(NotificationOutbox.alert_id == alert_id)
+    return query.order_by(NotificationOutbox.created_at).limit(limit)
+
+
+def delivery_counts_query(alert_id):
+    """(status, count) rows for `alert_id`'s outbox."""
+    return (
+        db.session.query(NotificationOutbox.status, func.count())
+        .filter(NotificationOutbox.alert_id == alert_id)
+        .group_by(NotificationOutbox.status)
+    )
+
+
+def claim_batch(limit=None, alert_id=None):
+    """Claim up to `limit` deliverable rows for this worker.
+
+    On PostgreSQL this is SELECT ... FOR UPDATE SKIP LOCKED, so concurrent workers
+    never block on or double-claim each other's rows. SQLite has no row locks, so
+    each candidate is claimed with a conditional UPDATE and kept only if it won.
+    Returns plain dicts so the caller doesn't reload expired rows one by one.
+    """
+    limit = limit or int(current_app.config.get('NOTIFICATION_BATCH_SIZE', 50))
+    now = datetime.utcnow()
+    claimable = _claimable_filter(now)
+    query = claimable_query(now, limit, alert_id)
+
+    if db.session.get_bind().dialect.name == 'postgresql':
+        rows = query.with_for_update(skip_locked=True).all()
+        for row in rows:
+            row.status = 'processing'
+            row.claimed_at = now
+            row.attempts = (row.attempts or 0) + 1
+        claimed = [_snapshot(row) for row in rows]
+        db.session.commit()
+        return claimed
+
+    # SQLite fallback
+    candidate_ids = [row_id for (row_id,) in query.with_entities(NotificationOutbox.id).all()]
+    claimed_ids = []
+    for row_id in candidate_ids:
+        result = db.session.execute(
+            update(NotificationOutbox)
+            .where(NotificationOutbox.id == row_id, claimable)
+            .values(status='processing', claimed_at=now, attempts=NotificationOutbox.attempts + 1)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount:
+            claimed_ids.append(row_id)
+    db.session.commit()
+
+    if not claimed_ids:
+        return []
+    rows = NotificationOutbox.query.filter(NotificationOutbox.id.in_(claimed_ids)).order_by(NotificationOutbox.created_at).all()
+    return [_snapshot(row) for row in rows]
+
+
+def _send(channel, recipient, body):
+    """Send one message synchronously and return the provider message id."""
+    if channel == 'sms':
+        from app.services.sms_service import _send_sms_direct
+        return _send_sms_direct(recipient, body)
+    if channel == 'whatsapp':
+        from app.services.whatsapp_service import _send_whatsapp_direct
+        return _send_whatsapp_direct(recipient, body)
+    raise ValueError(f"Unsupported notification channel: {channel}")
+
+
+def _sent_result(row, message_id, latency_ms):
+    return {
+        'id': row['id'],
+        'status': 'sent',
+        'provider_message_id': str(message_id)[:100] if message_id else None,
+        'latency_ms': latency_ms,
+        'last_error': None,
+        'sent_at': datetime.utcnow(),
+    }
+
+
+def _failed_result(row, error, latency_ms, retry=True):
+    max_attempts = int(current_app.config.get('NOTIFICATION_MAX_ATTEMPTS', 5))
+    logger.error(f"Failed to deliver {row['channel']} to {row['recipient']}: {error}")
+    if not retry or row['attempts'] >= max_attempts:
+        status, next_attempt_at = 'failed', None
+    else:
+        backoff = min(2 ** row['attempts'], MAX_BACKOFF_SECONDS)
+        status, next_attempt_at = 'pending', datetime.utcnow() + timedelta(seconds=backoff)
+    return {
+        'id': row['id'],
+        'status': status,
+        'latency_ms': latency_ms,
+        'last_error': str(error)[:500],
+        'next_attempt_at': next_attempt_at,
+    }
+
+
+def _deferred_result(row, error):
+    # Not the message's fault: don't burn an attempt, retry once the breaker probes again
+    return {
+        'id': row['id'],
+        'status': 'pending',
+        'attempts': max(row['attempts'] - 1, 0),
+        'last_error': str(error)[:500],
+        'next_attempt_at': error.retry_at,
+    }
+
+
+def _reroute(rows):
+    """Get each row's message to its recipient on a fallback channel now.
+
+    Fallbacks are tried in CHANNEL_FALLBACKS order, skipping channels whose
+    breaker is open. A fallback row that is sent or being sent already covers
+    the recipient. One waiting out a retry backoff is made due now, so the next
+    claim picks it up (rows are claimed oldest first, and it is as old as its
+    alert). One that failed for good is skipped. If the recipient has no row
+    on a fallback channel, one is queued. Returns how many rows were expedited
+    or queued.
+    """
+    from app.models.sos_alert import SOSAlert
+    from app.models.user import User
+
+    now = datetime.utcnow()
+    rerouted = 0
+    for row in rows:
+        recipient = row['recipient']
+        if row['channel'] == 'push':
+            # Push rows are addressed to a user id; SMS and WhatsApp need that user's phone
+            app_user = User.query.get(recipient)
+            recipient = app_user.phone if app_user else None
+        alert = SOSAlert.query.get(row['alert_id'])
+        if not alert or not recipient:
+            continue
+
+        queued = {existing.channel: existing for existing in alert.notifications if existing.recipient == recipient}
+        for fallback in CHANNEL_FALLBACKS.get(row['channel'], ()):
+            if get_breaker(CHANNEL_BREAKERS[fallback]).state == OPEN:
+                continue
+            existing = queued.get(fallback)
+            if existing is None:
+                enqueue_notification(alert, fallback, recipient, row['body'])
+            elif existing.status == 'failed':
+                continue
+            elif existing.status == 'pending' and existing.next_attempt_at and existing.next_attempt_at > now:
+                existing.next_attempt_at = now
+            else:
+                break # Due, being sent or sent already
+            rerouted += 1
+            logger.warning(f"{row['channel']} circuit open, rerouted message for {recipient} to {fallback}")
+            break
+    if rerouted:
+        db.session.commit()
+    return rerouted
+
+
+def _deliver_push(rows):
+    """Deliver push rows as FCM multicasts, one call per alert and body.
+
+    Push rows carry the recipient's user id; tokens are resolved at send time
+    so a token refreshed after the alert was queued is still used.
+    """
+    from app.models.user import User
+    from app.models.sos_alert import SOSAlert
+    from app.services import fcm_service
+
+    results = []
+    user_ids = {row['recipient'] for row in rows}
+    tokens_by_user = dict(
+        User.query.filter(User.id.in_(user_ids)).with_entities(User.id, User.fcm_token).all()
+    )
+
+    groups = {}
+    for row in rows:
+        token = tokens_by_user.get(row['recipient'])
+        if not token:
+            results.append(_failed_result(row, "Recipient has no FCM token", 0.0, retry=False))
+            continue
+        groups.setdefault((row['alert_id'], row['body']), []).append((row, token))
+
+    invalid_tokens = set()
+    tripped = []
+    for (alert_id, body), members in groups.items():
+        alert = SOSAlert.query.get(alert_id)
+        title = f"🚨 SOS from {alert.user.full_name}" if alert else "🚨 SOS Alert"
+        data = {'type': 'sos', 'alert_id': alert_id}
+        if alert:
+            data.update({'latitude': str(alert.latitude), 'longitude': str(alert.longitude)})
+
+        tokens = list(dict.fromkeys(token for _, token in members))
+        started = time.perf_counter()
+        try:
+            token_results = fcm_service.send_multicast(tokens, title, body, data)
+        except Exception as e:
+            latency_ms = (time.perf_counter() - started) * 1000
+            results.extend(_failed_result(row, e, latency_ms) for row, _ in members)
+            continue
+        latency_ms = (time.perf_counter() - started) * 1000
+
+        if token_results is None:
+            results.extend(_failed_result(row, "Firebase not configured", latency_ms, retry=False) for row, _ in members)
+            continue
+
+        for row, token in members:
+            message_id, error = token_results.get(token, (None, "No response for token"))
+            if error is None:
+                results.append(_sent_result(row, message_id, latency_ms))
+            elif isinstance(error, CircuitOpenError):
+                results.append(_deferred_result(row, error))
+                tripped.append(row)
+            elif fcm_service.is_invalid_token_error(error):
+                invalid_tokens.add(token)
+                results.append(_failed_result(row, error, latency_ms, retry=False))
+            else:
+                results.append(_failed_result(row, error, latency_ms))
+
+    if invalid_tokens:
+        fcm_service.prune_invalid_tokens(invalid_tokens)
+    return results, tripped
+
+
+def deliver_batch(rows):
+    """Deliver claimed rows and record status and provider latency for each.
+
+    If a channel's provider breaker is open, its rows are deferred until the
+    breaker probes again and the message is routed to the next channel now
+    (see _reroute).
+    """
+    results = []
+    tripped = []
+
+    for row in rows:
+        if row['channel'] == 'push':
+            continue
+        started = time.perf_counter()
+        try:
+            message_id = _send(row['channel'], row['recipient'], row['body'])
+            results.append(_sent_result(row, message_id, (time.perf_counter() - started) * 1000))
+        except CircuitOpenError as e:
+            results.append(_deferred_result(row, e))
+            tripped.append(row)
+        except Exception as e:
+            results.append(_failed_result(row, e, (time.perf_counter() - started) * 1000))
+
+    push_rows = [row for row in rows if row['channel'] == 'push']
+    if push_rows:
+        push_results, push_tripped = _deliver_push(push_rows)
+        results.extend(push_results)
+        tripped.extend(push_tripped)
+
+    if results:
+        # Bulk UPDATE by primary key: one executemany per batch
+        db.session.execute(update(NotificationOutbox), results)
+        db.session.commit()
+
+    # After the update, so fallback rows in this batch show their new status
+    if tripped:
+        _reroute(tripped)
+    return results
+
+
+def deliver_pending(alert_id=None, max_batches=20):
+    """Claim and deliver pending rows until none are left (or `max_batches` is hit)."""
+    delivered = 0
+    for _ in range(max_batches):
+        rows = claim_batch(alert_id=alert_id)
+        if not rows:
+            break
+        results = deliver_batch(rows)
+        delivered += sum(1 for r in results if r['status'] == 'sent')
+    if alert_id and delivered:
+        _publish_delivery_status(alert_id)
+    return delivered
+
+
+def _publish_delivery_status(alert_id):
+    """Tell the alert owner's connected devices how delivery is going.
+    Works from Celery workers too: emits travel through the Socket.IO message queue."""
+    from app.models.sos_alert import SOSAlert
+    from app.services.broadcast_service import emit_to_room, user_room
+
+    alert = SOSAlert.query.get(alert_id)
+    if not alert:
+        return
+    counts = dict(delivery_counts_query(alert_id).all())
+    emit_to_room('sos_delivery', {
+        'alert_id': alert_id,
+        'sent': counts.get('sent', 0),
+        'pending': counts.get('pending', 0) + counts.get('processing', 0),
+        'failed': counts.get('failed', 0)
+    }, user_room(alert.user_id))
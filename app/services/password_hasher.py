@@ -0,0 +1,85 @@
+"""
+bcrypt hashing and verification off the request's event loop.
+
+A bcrypt round takes 100-250 ms of pure CPU. Run inline under the eventlet
+worker, it freezes every other greenlet for that long: Socket.IO connections,
+SOS requests, everything. Here the work runs on real OS threads instead (bcrypt
+releases the GIL while hashing):
+  - under eventlet (monkey-patched threads): eventlet.tpool, sized by the
+    EVENTLET_THREADPOOL_SIZE environment variable
+  - otherwise: a ThreadPoolExecutor of PASSWORD_HASH_WORKERS threads
+The hub keeps serving other requests while a hash is computed.
+
+The cost factor is BCRYPT_ROUNDS. Hashes made with a different cost are
+re-hashed on the next successful login (see needs_rehash()).
+"""
+from app.utils import metrics
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+import bcrypt
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _eventlet_active():
+    try:
+        from eventlet import patcher
+    except ImportError:
+        return False
+    return patcher.is_monkey_patched('thread')
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=int(current_app.config.get('PASSWORD_HASH_WORKERS', 4)),
+                    thread_name_prefix='password-hasher'
+                )
+    return _executor
+
+
+def _offload(op, fn, *args):
+    started = time.perf_counter()
+    if _eventlet_active():
+        from eventlet import tpool
+        result = tpool.execute(fn, *args)
+    else:
+        result = _get_executor().submit(fn, *args).result()
+    metrics.observe('password_hash_seconds', time.perf_counter() - started, op=op)
+    return result
+
+
+def _rounds():
+    return int(current_app.config.get('BCRYPT_ROUNDS', 12))
+
+
+def hash_password(password):
+    """bcrypt hash of `password` at the configured cost, as a str."""
+    salt = bcrypt.gensalt(_rounds())
+    return _offload('hash', bcrypt.hashpw, password.encode('utf-8'), salt).decode('utf-8')
+
+
+def verify_password(password, password_hash):
+    """True if `password` matches `password_hash`. Malformed hashes never match."""
+    try:
+        return _offload('verify', bcrypt.checkpw, password.encode('utf-8'), password_hash.encode('utf-8'))
+    except ValueError as e:
+        logger.warning(f"Unverifiable password hash: {e}")
+        return False
+
+
+def needs_rehash(password_hash):
+    """True if `password_hash` wasn't made with the configured BCRYPT_ROUNDS."""
+    try:
+        return int(password_hash.split('$')[2]) != _rounds()
+    except (IndexError, ValueError):
+        return True
@@ -223,21 +223,10 @@ def analyze_sensor_data(user_id, sensor_type, readings, sensitivity):
         lat = last_loc.latitude if last_loc else 0.0
         lng = last_loc.longitude if last_loc else 0.0
 
-        alert, msg = trigger_sos(user_id, lat, lng, trigger_type=f"auto_{sensor_type}")
+        context = f"⚠ Danger detected via {sensor_type}! Confidence: {int(confidence_danger*100)}%"
+        alert, msg = trigger_sos(user_id, lat, lng, trigger_type=f"auto_{sensor_type}", context=context)
         _mark_sos_triggered(user_id)
 
-        # Send WhatsApp alert
-        try:
-            from app.services.whatsapp_service import send_whatsapp_alert
-            from app.models.trusted_contact import TrustedContact
-            contacts = TrustedContact.query.filter_by(user_id=user_id).all()
-            maps_link = f"https://maps.google.com/?q={lat},{lng}"
-            whatsapp_msg = f"⚠ SOS ALERT!\nDanger detected via {sensor_type}!\nConfidence: {int(confidence_danger*100)}%\n📍 Location: {maps_link}"
-            for contact in contacts:
-                send_whatsapp_alert(contact.phone, whatsapp_msg)
-        except Exception as e:
-            current_app.logger.error(f"WhatsApp alert failed: {e}")
-
         return {
             "alert_triggered": True,
             "alert_id": alert.id if alert else None,
@@ -275,21 +264,10 @@ def predict_from_window(user_id, window_data, location="Unknown"):
         lat = last_loc.latitude if last_loc else 0.0
         lng = last_loc.longitude if last_loc else 0.0
 
-        alert, msg = trigger_sos(user_id, lat, lng, trigger_type="auto_sensor_window")
+        context = f"⚠ Danger detected!\n📍 Reported location: {location}"
+        alert, msg = trigger_sos(user_id, lat, lng, trigger_type="auto_sensor_window", context=context)
         _mark_sos_triggered(user_id)
 
-        # Send WhatsApp alert
-        try:
-            from app.services.whatsapp_service import send_whatsapp_alert
-            from app.models.trusted_contact import TrustedContact
-            contacts = TrustedContact.query.filter_by(user_id=user_id).all()
-            maps_link = f"https://maps.google.com/?q={lat},{lng}"
-            whatsapp_msg = f"⚠ SOS ALERT!\nDanger detected!\n📍 Location: {location}\n🗺 Map: {maps_link}"
-            for contact in contacts:
-                send_whatsapp_alert(contact.phone, whatsapp_msg)
-        except Exception as e:
-            current_app.logger.error(f"WhatsApp alert failed: {e}")
-
         response["sos_sent"] = True
         response["alert_id"] = alert.id if alert else None
 
@@ -1,6 +1,7 @@
 
-from twilio.rest import Client
 from flask import current_app
+from app.services.twilio_client import get_twilio_client
+from app.utils.circuit_breaker import get_breaker, CircuitOpenError
 import logging
 import threading
 
@@ -13,25 +14,29 @@ def _get_twilio_client():
     auth_token = current_app.config.get('TWILIO_AUTH_TOKEN')
     if not account_sid or not auth_token:
         return None, None, None
-    return Client(account_sid, auth_token), account_sid, auth_token
+    return get_twilio_client(account_sid, auth_token), account_sid, auth_token
 
 
-def _send_sms_direct(to, body, from_):
-    """Send SMS directly via Twilio (no Celery)."""
-    try:
-        account_sid = current_app.config.get('TWILIO_ACCOUNT_SID')
-        auth_token = current_app.config.get('TWILIO_AUTH_TOKEN')
-        twilio_phone = current_app.config.get('TWILIO_PHONE_NUMBER')
+def _send_sms_direct(to, body, from_=None):
+    """
+    Send SMS directly via Twilio (no thread, no Celery).
+    Used by the notification outbox worker, which needs the provider result.
+    Returns the message SID; raises if Twilio rejects the message or
+    CircuitOpenError if Twilio SMS is currently tripped.
+    """
+    account_sid = current_app.config.get('TWILIO_ACCOUNT_SID')
+    auth_token = current_app.config.get('TWILIO_AUTH_TOKEN')
+    twilio_phone = current_app.config.get('TWILIO_PHONE_NUMBER')
 
-        if not all([account_sid, auth_token, twilio_phone]):
-            logger.warning("Twilio credentials not configured, skipping SMS.")
-            return
+    if not all([account_sid, auth_token, twilio_phone]):
+        logger.warning("Twilio credentials not configured, skipping SMS.")
+        print(f"--- MOCK SMS TO {to}: {body}")
+        return "mock-sid"
 
-        client = Client(account_sid, auth_token)
-        message = client.messages.create(body=body, from_=from_ or twilio_phone, to=to)
-        logger.info(f"SMS sent to {to}: {message.sid}")
-    except Exception as e:
-        logger.error(f"Failed to send SMS to {to}: {e}")
+    client = get_twilio_client(account_sid, auth_token)
+    message = get_breaker('sms').call(client.messages.create, body=body, from_=from_ or twilio_phone, to=to)
+    logger.info(f"SMS sent to {to}: {message.sid}")
+    return message.sid
 
 
 def send_sms(to, body):
@@ -56,9 +61,11 @@ def send_sms(to, body):
         def _send():
             with app.app_context():
                 try:
-                    client = Client(account_sid, auth_token)
-                    message = client.messages.create(body=body, from_=twilio_phone, to=to)
+                    client = get_twilio_client(account_sid, auth_token)
+                    message = get_breaker('sms').call(client.messages.create, body=body, from_=twilio_phone, to=to)
                     logger.info(f"SMS sent to {to}: {message.sid}")
+                except CircuitOpenError:
+                    logger.warning(f"SMS provider circuit open, dropping SMS to {to}")
                 except Exception as e:
                     logger.error(f"Failed to send SMS to {to}: {e}")
 
@@ -1,48 +1,103 @@
 
 from app.extensions import db
 from app.models.sos_alert import SOSAlert
-from app.models.trusted_contact import TrustedContact
 from app.models.user import User
-from app.services.sms_service import send_sms
-from app.services.fcm_service import send_push_notification 
+from app.services.notification_service import enqueue_notification, schedule_delivery
+from app.services.user_context import load_user_context
+from app.utils import metrics
+from sqlalchemy import literal, select, update
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime, timedelta
+import logging
+
+logger = logging.getLogger(__name__)
 
 COUNTDOWN_EXPIRY_SECONDS = 60  # Auto-expire stale countdown alerts after 60s
 
-def trigger_sos(user_id, lat, lng, trigger_type='manual'):
+# Geofence transitions go out through the alert + outbox path too, but they
+# aren't SOS alerts: keep them out of the user's SOS history and countdown checks
+NON_SOS_TRIGGERS = ('geofence',)
+
+def _is_sos():
+    return SOSAlert.trigger_type.not_in(NON_SOS_TRIGGERS)
+
+def _is_countdown():
+    # Rendered inline rather than bound, so the planner can match the partial
+    # countdown indexes on any driver (SQLite never matches a bound parameter)
+    return SOSAlert.status == literal('countdown', literal_execute=True)
+
+def sos_history_query(user_id):
+    """Select of `user_id`'s SOS alerts, newest first."""
+    return (
+        select(SOSAlert)
+        .where(SOSAlert.user_id == user_id, _is_sos())
+        .order_by(SOSAlert.triggered_at.desc())
+    )
+
+def active_countdown_query(user_id, now):
+    """Select of the user's live countdown alert. Stale ones are left to the sweeper."""
+    cutoff = now - timedelta(seconds=COUNTDOWN_EXPIRY_SECONDS)
+    return select(SOSAlert).where(
+        SOSAlert.user_id == user_id,
+        _is_countdown(),
+        SOSAlert.triggered_at >= cutoff,
+        _is_sos()
+    ).limit(1)
+
+def _active_countdown(user_id):
+    return db.session.scalars(active_countdown_query(user_id, datetime.utcnow())).first()
+
+def stale_countdowns_update(now):
+    """UPDATE cancelling every countdown older than COUNTDOWN_EXPIRY_SECONDS."""
+    cutoff = now - timedelta(seconds=COUNTDOWN_EXPIRY_SECONDS)
+    return (
+        update(SOSAlert)
+        .where(_is_countdown(), SOSAlert.triggered_at < cutoff)
+        .values(status='cancelled', resolved_at=now)
+        .execution_options(synchronize_session=False)
+    )
+
+def expire_stale_countdowns():
+    """Cancel every countdown older than COUNTDOWN_EXPIRY_SECONDS in one UPDATE.
+    Returns the number of alerts swept."""
+    now = datetime.utcnow()
+    result = db.session.execute(stale_countdowns_update(now))
+    db.session.commit()
+    swept = result.rowcount or 0
+    metrics.inc_counter('sos_countdowns_expired_total', swept)
+    if swept:
+        logger.info(f"Expired {swept} stale SOS countdown(s)")
+    return swept
+
+def trigger_sos(user_id, lat, lng, trigger_type='manual', context=None):
+    """Create an SOS alert and queue one message per contact and channel.
+    `context` is extra detail (e.g. what the sensor detected) folded into that message."""
     # Enforce 20-second cooldown across all SOS triggers (manual + sensor)
     from app.services.protection_service import _is_on_cooldown, _mark_sos_triggered
     if _is_on_cooldown(user_id):
-        existing = SOSAlert.query.filter_by(user_id=user_id, status='countdown').first()
+        existing = _active_countdown(user_id)
         if existing:
             return existing, "SOS on cooldown — please wait 20 seconds between triggers."
         return None, "SOS on cooldown — please wait 20 seconds between triggers."
 
-    user = User.query.get(user_id)
-    if not user:
+    # User, settings and contacts in one load, straight from the database: the
+    # recipients must not come from a cache another worker hasn't invalidated yet
+    user_context = load_user_context(user_id, fresh=True)
+    if not user_context:
         return None, "User not found"
+    user = user_context.user
 
-    # Check for existing countdown alert
-    existing_alert = SOSAlert.query.filter_by(
-        user_id=user_id, status='countdown'
-    ).first()
-    
+    # Stale countdowns are expired by the periodic sweeper, not here
+    existing_alert = _active_countdown(user_id)
     if existing_alert:
-        # Auto-cancel stale countdowns (older than 60s)
-        if existing_alert.triggered_at and \
-           (datetime.utcnow() - existing_alert.triggered_at).total_seconds() > COUNTDOWN_EXPIRY_SECONDS:
-            existing_alert.status = 'cancelled'
-            existing_alert.resolved_at = datetime.utcnow()
-            db.session.commit()
-        else:
-            return existing_alert, "Alert already in countdown"
+        return existing_alert, "Alert already in countdown"
 
     # Prioritize the new sos_message on User model, fallback to Settings or Default
     start_message = "Emergency!"
     if user.sos_message:
         start_message = user.sos_message
-    elif user.settings and user.settings.sos_message:
-        start_message = user.settings.sos_message
+    elif user_context.settings and user_context.settings.sos_message:
+        start_message = user_context.settings.sos_message
     
     sos_message = start_message
 
@@ -56,50 +111,105 @@ def trigger_sos(user_id, lat, lng, trigger_type='manual'):
         contacted_numbers=[]
     )
     db.session.add(new_alert)
+
+    # Alert and its outbox rows go out in a single commit
+    _queue_sos_notifications(new_alert, user, user_context.contacts, context)
     db.session.commit()
 
     # Mark cooldown for this user
     _mark_sos_triggered(user_id)
 
     # Auto-dispatch: immediately send SMS + WhatsApp to all contacts
-    dispatch_sos(new_alert.id)
+    schedule_delivery(new_alert.id)
     
     return new_alert, "SOS triggered and messages sent"
 
-def dispatch_sos(alert_id):
-    alert = SOSAlert.query.get(alert_id)
-    if not alert:
-        return False, "Alert not found"
-    
-    if alert.status == 'resolved' or alert.status == 'cancelled':
-        return False, "Alert already resolved/cancelled"
+def notify_geofence_transition(user_id, zone_name, event, lat, lng):
+    """Tell the user's contacts they left (event='exit') or entered a safe zone.
+    Goes through the same alert + outbox path as an SOS, without the countdown
+    or cooldown. Returns the alert, or None if there is nobody to tell."""
+    context = load_user_context(user_id, fresh=True)
+    if not context or not context.contacts:
+        return None
+    user, contacts = context.user, context.contacts
+
+    verb = 'left' if event == 'exit' else 'entered'
+    alert = SOSAlert(
+        user_id=user_id,
+        trigger_type='geofence',
+        latitude=lat,
+        longitude=lng,
+        status='sent',
+        sos_message=f"{user.full_name} has {verb} the safe zone \"{zone_name}\".",
+        contacted_numbers=[]
+    )
+    db.session.add(alert)
+    _queue_sos_notifications(alert, user, contacts)
+    db.session.commit()
 
-    user = User.query.get(alert.user_id)
-    contacts = TrustedContact.query.filter_by(user_id=user.id).all()
+    schedule_delivery(alert.id)
+    return alert
 
-    alert.status = 'sent'
-    alert.sent_at = datetime.utcnow()
-    
-    contacted = []
-    
+def _build_sos_message(alert, user, context=None):
     # Generate Google Maps Link
     maps_link = f"https://maps.google.com/?q={alert.latitude},{alert.longitude}"
-    full_message = f"{alert.sos_message}\n\n📍 Location: {maps_link}\nSent by Asfalis for {user.full_name}"
-
+    message = alert.sos_message
+    if context:
+        message = f"{message}\n{context}"
+    return f"{message}\n\n📍 Location: {maps_link}\nSent by Asfalis for {user.full_name}"
+
+def _queue_sos_notifications(alert, user, contacts, context=None):
+    """Mark the alert as sent and write one outbox row per contact and channel.
+    Does not commit; delivery happens after the caller's commit. Safe to call again
+    for an already dispatched alert: existing (recipient, channel) rows are kept."""
+    if alert.status != 'sent':
+        alert.status = 'sent'
+        alert.sent_at = datetime.utcnow()
+
+    full_message = _build_sos_message(alert, user, context)
+    contacted = []
     for contact in contacts:
-        # Send SMS
-        send_sms(contact.phone, full_message)
+        enqueue_notification(alert, 'sms', contact.phone, full_message)
+        enqueue_notification(alert, 'whatsapp', contact.phone, full_message)
         contacted.append(contact.phone)
 
-        # Send WhatsApp alert
-        try:
-            from app.services.whatsapp_service import send_whatsapp_alert
-            send_whatsapp_alert(contact.phone, full_message)
-        except Exception as e:
-            print(f"WhatsApp alert to {contact.phone} failed: {e}")
-    
+    # Contacts who use the app also get a push; delivery batches them into FCM multicasts
+    for app_user in _contacts_with_app(user, contacts):
+        enqueue_notification(alert, 'push', app_user.id, full_message)
+
     alert.contacted_numbers = contacted
-    db.session.commit()
+
+def _contacts_with_app(user, contacts):
+    """Registered users (with a push token) whose phone is one of `contacts`."""
+    phones = {contact.phone for contact in contacts if contact.phone}
+    if not phones:
+        return []
+    return User.query.filter(
+        User.phone.in_(phones),
+        User.fcm_token.isnot(None),
+        User.id != user.id
+    ).all()
+
+def dispatch_sos(alert_id):
+    alert = SOSAlert.query.get(alert_id)
+    if not alert:
+        return False, "Alert not found"
+    
+    if alert.status == 'resolved' or alert.status == 'cancelled':
+        return False, "Alert already resolved/cancelled"
+
+    context = load_user_context(alert.user_id, fresh=True)
+    if not context:
+        return False, "User not found"
+    _queue_sos_notifications(alert, context.user, context.contacts)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent dispatch already queued these messages
+        db.session.rollback()
+        return True, "SOS already dispatched"
+
+    schedule_delivery(alert.id)
     
     return True, "SOS Dispatched"
 
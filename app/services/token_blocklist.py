@@ -0,0 +1,167 @@
+"""
+Revoked JWTs, checked on every authenticated request without a network call.
+
+Revoking a token stores its jti until the token would have expired anyway:
+  - in Redis (when CACHE_REDIS_URL is set): the sorted set `revoked_jtis`,
+    scored by expiry, shared by all workers. Every revocation is also
+    published on the `token_blocklist` channel.
+  - otherwise in a per-process dict (tests, single-process dev).
+
+Each worker keeps a Bloom filter of revoked jtis in front of that store. The
+filter is loaded from Redis when the worker subscribes to the channel, and
+then kept current by the published revocations. A token whose jti isn't in
+the filter, which covers nearly every request, is accepted after a few hash
+computations. Only filter hits (real revocations, plus about
+TOKEN_BLOCKLIST_BLOOM_ERROR_RATE of the rest) are confirmed against the
+store.
+
+If the subscription is down, the filter may be missing other workers'
+revocations, so every check goes to Redis until it is back. If Redis itself
+is unreachable, tokens are accepted and a warning is logged.
+"""
+from app.extensions import jwt
+from app.utils import metrics
+from app.utils.bloom import BloomFilter
+from app.utils.redis_client import get_redis
+from flask import current_app, jsonify
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+REVOKED_KEY = 'revoked_jtis'
+CHANNEL = 'token_blocklist'
+
+
+class _Blocklist:
+    def __init__(self, client, capacity, error_rate):
+        self.client = client
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bloom = BloomFilter(capacity, error_rate)
+        self.synced = client is None # Without Redis the filter sees every revocation
+        self._local = {} # jti -> exp, used when there is no Redis
+        self._lock = threading.Lock()
+        if client is not None:
+            threading.Thread(target=self._listen, name='token-blocklist', daemon=True).start()
+
+    # -- store --------------------------------------------------------------
+    def _load_all(self):
+        """Live revoked jtis from the store, dropping expired ones first."""
+        now = time.time()
+        if self.client is None:
+            with self._lock:
+                self._local = {jti: exp for jti, exp in self._local.items() if exp > now}
+                return list(self._local)
+        self.client.zremrangebyscore(REVOKED_KEY, '-inf', now)
+        return self.client.zrangebyscore(REVOKED_KEY, now, '+inf')
+
+    def _rebuild(self):
+        """Replace the filter with one built from the store (frees expired jtis)."""
+        jtis = self._load_all()
+        bloom = BloomFilter(max(self.capacity, len(jtis) * 2), self.error_rate)
+        for jti in jtis:
+            bloom.add(jti)
+        self.bloom = bloom
+
+    def _add_to_filter(self, jti):
+        self.bloom.add(jti)
+        if len(self.bloom) > self.bloom.capacity:
+            try:
+                self._rebuild()
+            except Exception as e:
+                logger.warning(f"Token blocklist filter rebuild failed: {e}")
+
+    def revoke(self, jti, exp):
+        if self.client is None:
+            with self._lock:
+                self._local[jti] = exp
+        else:
+            pipe = self.client.pipeline(transaction=True)
+            pipe.zadd(REVOKED_KEY, {jti: exp})
+            pipe.publish(CHANNEL, jti)
+            pipe.execute()
+        self._add_to_filter(jti)
+
+    def is_revoked(self, jti):
+        if self.synced and jti not in self.bloom:
+            metrics.inc_counter('token_blocklist_checks_total', result='clear')
+            return False
+
+        if self.client is None:
+            revoked = self._local.get(jti, 0) > time.time()
+        else:
+            try:
+                score = self.client.zscore(REVOKED_KEY, jti)
+            except Exception as e:
+                logger.warning(f"Token blocklist lookup failed for {jti}: {e}")
+                metrics.inc_counter('token_blocklist_checks_total', result='error')
+                return False
+            revoked = score is not None and score > time.time()
+        metrics.inc_counter('token_blocklist_checks_total', result='revoked' if revoked else 'false_positive')
+        return revoked
+
+    # -- pub/sub ------------------------------------------------------------
+    def _listen(self):
+        backoff = 1
+        while True:
+            pubsub = None
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CHANNEL)
+                # Subscribed before loading, so nothing revoked in between is missed
+                self._rebuild()
+                self.synced = True
+                backoff = 1
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message.get('type') == 'message':
+                        self._add_to_filter(message['data'])
+            except Exception as e:
+                self.synced = False
+                logger.warning(f"Token blocklist subscription lost, retrying in {backoff}s: {e}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+
+_init_lock = threading.Lock()
+
+def _blocklist():
+    blocklist = current_app.extensions.get('token_blocklist')
+    if blocklist is None:
+        with _init_lock:
+            blocklist = current_app.extensions.get('token_blocklist')
+            if blocklist is None:
+                blocklist = _Blocklist(
+                    get_redis(),
+                    int(current_app.config.get('TOKEN_BLOCKLIST_BLOOM_CAPACITY', 100000)),
+                    float(current_app.config.get('TOKEN_BLOCKLIST_BLOOM_ERROR_RATE', 0.001))
+                )
+                current_app.extensions['token_blocklist'] = blocklist
+    return blocklist
+
+
+def revoke_token(jwt_payload):
+    """Revoke a decoded token until its own expiry."""
+    _blocklist().revoke(jwt_payload['jti'], int(jwt_payload.get('exp') or time.time() + 86400))
+
+
+def is_token_revoked(jwt_payload):
+    return _blocklist().is_revoked(jwt_payload['jti'])
+
+
+@jwt.token_in_blocklist_loader
+def _check_if_token_revoked(jwt_header, jwt_payload):
+    return is_token_revoked(jwt_payload)
+
+
+@jwt.revoked_token_loader
+def _revoked_token_response(jwt_header, jwt_payload):
+    return jsonify(success=False, error={"code": "TOKEN_REVOKED", "message": "Token has been revoked"}), 401
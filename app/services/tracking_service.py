@@ -0,0 +1,180 @@
+"""
+Who may watch whose live location: trusted contacts over Socket.IO, and anyone
+holding a public tracking link.
+
+A user may join their own tracking room, or the room of anyone who lists the
+user's phone number as a trusted contact. Answers are cached per
+(requester, target) for TRACKING_AUTHZ_CACHE_TTL seconds so guardian apps
+reconnecting in a loop don't each cost a database round trip. Editing
+contacts, or changing a phone number, drops the affected entries on every
+worker (app/utils/cache_invalidation.py).
+
+Tracking links are TrackingSession rows. A session id resolves to its user
+through an in-process cache, then Redis (when CACHE_REDIS_URL is set), then
+the database, so a link polled by many viewers costs one lookup per worker.
+Ending a session deletes it from Redis and from every worker's cache.
+"""
+from app.extensions import db
+from app.models.tracking_session import TrackingSession
+from app.models.trusted_contact import TrustedContact
+from app.models.user import User
+from app.utils import metrics
+from app.utils.cache import TTLCache
+from app.utils.cache_invalidation import caches_synced, invalidate, register_cache
+from app.utils.redis_client import get_redis
+from flask import current_app
+from sqlalchemy import update
+from datetime import datetime, timedelta
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _discard_authz(cache, target_user_id=None, requester_id=None):
+    cache.discard_where(lambda key: key[1] == target_user_id or key[0] == requester_id)
+
+register_cache('tracking_authz_cache', _discard_authz)
+register_cache('tracking_session_cache')
+
+
+def _authz_cache():
+    cache = current_app.extensions.get('tracking_authz_cache')
+    if cache is None:
+        cache = current_app.extensions.setdefault('tracking_authz_cache', TTLCache(
+            maxsize=int(current_app.config.get('TRACKING_AUTHZ_CACHE_SIZE', 10000)),
+            ttl=int(current_app.config.get('TRACKING_AUTHZ_CACHE_TTL', 30))
+        ))
+    return cache
+
+
+def can_track(requester_id, target_user_id):
+    """True if `requester_id` may join `target_user_id`'s tracking room."""
+    if requester_id == target_user_id:
+        return True
+
+    cache = _authz_cache()
+    key = (requester_id, target_user_id)
+    allowed = cache.get(key) if caches_synced() else None
+    if allowed is not None:
+        metrics.inc_counter('tracking_authz_lookups_total', result='hit')
+        return allowed
+
+    metrics.inc_counter('tracking_authz_lookups_total', result='miss')
+    allowed = can_track_query(requester_id, target_user_id).scalar()
+    cache.set(key, bool(allowed))
+    return bool(allowed)
+
+
+def can_track_query(requester_id, target_user_id):
+    """EXISTS probe: does `target_user_id` list `requester_id`'s phone as a contact?"""
+    # One indexed probe on trusted_contacts (user_id, phone) joined to the requester's phone
+    return db.session.query(
+        db.session.query(TrustedContact.id)
+        .join(User, User.phone == TrustedContact.phone)
+        .filter(User.id == requester_id, TrustedContact.user_id == target_user_id)
+        .exists()
+    )
+
+
+def invalidate_tracking_authz(target_user_id=None, requester_id=None):
+    """Forget cached answers about watching `target_user_id` and/or by `requester_id`, on every worker."""
+    invalidate('tracking_authz_cache', target_user_id, requester_id)
+
+
+# ---------------------------------------------------------------------------
+# Public tracking sessions
+# ---------------------------------------------------------------------------
+def _session_cache():
+    cache = current_app.extensions.get('tracking_session_cache')
+    if cache is None:
+        cache = current_app.extensions.setdefault('tracking_session_cache', TTLCache(
+            maxsize=int(current_app.config.get('TRACKING_SESSION_CACHE_SIZE', 10000)),
+            ttl=int(current_app.config.get('TRACKING_SESSION_CACHE_TTL', 60))
+        ))
+    return cache
+
+
+def _session_key(session_id):
+    return f"tracking_session:{session_id}"
+
+
+def create_tracking_session(user_id):
+    """Start a public tracking link for `user_id`, valid for TRACKING_SESSION_TTL_MINUTES."""
+    ttl = timedelta(minutes=int(current_app.config.get('TRACKING_SESSION_TTL_MINUTES', 240)))
+    session = TrackingSession(user_id=user_id, expires_at=datetime.utcnow() + ttl)
+    db.session.add(session)
+    db.session.commit()
+    return session
+
+
+def end_tracking_sessions(user_id):
+    """End every live tracking link of `user_id`. Returns how many were ended."""
+    now = datetime.utcnow()
+    ids = [session_id for (session_id,) in db.session.query(TrackingSession.id).filter(
+        TrackingSession.user_id == user_id, TrackingSession.ended_at.is_(None), TrackingSession.expires_at > now
+    )]
+    if not ids:
+        return 0
+    db.session.execute(
+        update(TrackingSession)
+        .where(TrackingSession.id.in_(ids))
+        .values(ended_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+    client = get_redis()
+    if client is not None:
+        try:
+            client.delete(*[_session_key(session_id) for session_id in ids])
+        except Exception as e:
+            logger.warning(f"Redis tracking session invalidate failed for {user_id}: {e}")
+    # After Redis, so no worker reloads an ended session from there
+    for session_id in ids:
+        invalidate('tracking_session_cache', session_id)
+    return len(ids)
+
+
+def resolve_tracking_session(session_id):
+    """(user_id, expires_at) for a live session id, or None if unknown, ended or expired."""
+    cache = _session_cache()
+    entry = cache.get(session_id) if caches_synced() else None
+    if entry is None:
+        entry = _redis_load_session(session_id)
+        if entry is None:
+            session = db.session.get(TrackingSession, session_id)
+            entry = (session.user_id, session.expires_at) if session and session.is_active else False
+            if entry:
+                _redis_store_session(session_id, entry)
+        cache.set(session_id, entry)
+
+    if not entry or entry[1] <= datetime.utcnow():
+        return None
+    return entry
+
+
+def _redis_store_session(session_id, entry):
+    client = get_redis()
+    if client is None:
+        return
+    user_id, expires_at = entry
+    try:
+        ttl = max(int((expires_at - datetime.utcnow()).total_seconds()), 1)
+        client.set(_session_key(session_id), f"{user_id}|{expires_at.isoformat()}", ex=ttl)
+    except Exception as e:
+        logger.warning(f"Redis tracking session write failed for {session_id}: {e}")
+
+
+def _redis_load_session(session_id):
+    client = get_redis()
+    if client is None:
+        return None
+    try:
+        value = client.get(_session_key(session_id))
+    except Exception as e:
+        logger.warning(f"Redis tracking session read failed for {session_id}: {e}")
+        return None
+    if not value:
+        return None
+    user_id, expires_at = value.split('|', 1)
+    return user_id, datetime.fromisoformat(expires_at)
@@ -0,0 +1,28 @@
+from twilio.rest import Client
+from twilio.http.http_client import TwilioHttpClient
+from flask import current_app
+import threading
+
+# One client per account so the underlying requests session (and its TLS
+# connections) is reused across messages
+_clients = {}
+_lock = threading.Lock()
+
+
+def get_twilio_client(account_sid, auth_token):
+    """Shared Twilio client with explicit connect/read timeouts."""
+    key = (account_sid, auth_token)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    with _lock:
+        if key not in _clients:
+            connect_timeout = current_app.config.get('PROVIDER_CONNECT_TIMEOUT', 5)
+            read_timeout = current_app.config.get('PROVIDER_READ_TIMEOUT', 10)
+            http_client = TwilioHttpClient(timeout=read_timeout)
+            # TwilioHttpClient only validates a single number, but hands the value
+            # straight to requests, which also accepts a (connect, read) tuple
+            http_client.timeout = (connect_timeout, read_timeout)
+            _clients[key] = Client(account_sid, auth_token, http_client=http_client)
+        return _clients[key]
@@ -0,0 +1,101 @@
+"""
+The signed-in user's profile, settings and trusted contacts, loaded together.
+
+Most authenticated routes need the same three things. load_user_context()
+fetches them in one query (settings and contacts are joined eagerly) and keeps
+the result:
+  - for the rest of the request/task, in flask.g
+  - across requests, in a per-worker cache for USER_CONTEXT_CACHE_TTL seconds
+The cached values are read-only snapshots (named tuples), not ORM objects, so
+they outlive the session that loaded them. Load the model when you need to
+write.
+
+Routes that change the profile, settings or contacts call
+invalidate_user_context(), which reaches every worker (see
+app/utils/cache_invalidation.py). Paths that must not act on a stale list,
+such as choosing SOS recipients or enforcing the contact limit, pass
+fresh=True to skip the worker cache.
+"""
+from app.extensions import db
+from app.models.user import User
+from app.utils import metrics
+from app.utils.cache import TTLCache
+from app.utils.cache_invalidation import caches_synced, invalidate, register_cache
+from flask import current_app, g
+from sqlalchemy.orm import joinedload
+from collections import namedtuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+UserSnapshot = namedtuple('UserSnapshot', [
+    'id', 'full_name', 'email', 'phone', 'country', 'auth_provider',
+    'profile_image_url', 'is_active', 'is_verified', 'sos_message', 'created_at'
+])
+SettingsSnapshot = namedtuple('SettingsSnapshot', [
+    'emergency_number', 'sos_message', 'shake_sensitivity', 'battery_optimization', 'haptic_feedback'
+])
+# Same fields as TrustedContact.to_dict(), so contact._asdict() is the API shape
+ContactSnapshot = namedtuple('ContactSnapshot', ['id', 'name', 'phone', 'email', 'relationship', 'is_primary'])
+UserContext = namedtuple('UserContext', ['user', 'settings', 'contacts'])
+
+register_cache('user_context_cache')
+
+
+def _cache():
+    cache = current_app.extensions.get('user_context_cache')
+    if cache is None:
+        cache = current_app.extensions.setdefault('user_context_cache', TTLCache(
+            maxsize=int(current_app.config.get('USER_CONTEXT_CACHE_SIZE', 10000)),
+            ttl=int(current_app.config.get('USER_CONTEXT_CACHE_TTL', 15))
+        ))
+    return cache
+
+
+def _snapshot(user):
+    settings = user.settings
+    return UserContext(
+        user=UserSnapshot(**{field: getattr(user, field) for field in UserSnapshot._fields}),
+        settings=SettingsSnapshot(**settings.to_dict()) if settings else None,
+        contacts=tuple(ContactSnapshot(**contact.to_dict()) for contact in user.trusted_contacts)
+    )
+
+
+def user_context_query(user_id):
+    """The user with settings and contacts joined eagerly."""
+    return (
+        db.session.query(User)
+        .options(joinedload(User.settings), joinedload(User.trusted_contacts))
+        .filter(User.id == user_id)
+    )
+
+
+def load_user_context(user_id, fresh=False):
+    """UserContext for `user_id`, or None if there is no such user.
+    With fresh=True it is read from the database, unless this request already did."""
+    contexts = g.setdefault('user_contexts', {}) # user_id -> (context, read from the database)
+    entry = contexts.get(user_id)
+    if entry is not None and (entry[1] or not fresh):
+        return entry[0]
+
+    cache = _cache()
+    context = None if fresh or not caches_synced() else cache.get(user_id)
+    from_db = context is None
+    if not from_db:
+        metrics.inc_counter('user_context_lookups_total', result='hit')
+    else:
+        metrics.inc_counter('user_context_lookups_total', result='miss')
+        user = user_context_query(user_id).first()
+        if user is None:
+            return None
+        context = _snapshot(user)
+        cache.set(user_id, context)
+
+    contexts[user_id] = (context, from_db)
+    return context
+
+
+def invalidate_user_context(user_id):
+    """Drop `user_id`'s cached context on every worker (and in the current request)."""
+    invalidate('user_context_cache', user_id)
+    g.get('user_contexts', {}).pop(user_id, None)
@@ -1,12 +1,36 @@
 
 from flask import current_app
-from twilio.rest import Client
+from app.services.twilio_client import get_twilio_client
+from app.utils.circuit_breaker import get_breaker, CircuitOpenError
 import logging
 import threading
 
 logger = logging.getLogger(__name__)
 
 
+def _send_whatsapp_direct(to_number, message):
+    """
+    Send a WhatsApp message directly via Twilio (no thread).
+    Used by the notification outbox worker. Returns the message SID;
+    raises if Twilio rejects the message or CircuitOpenError if WhatsApp is tripped.
+    """
+    account_sid = current_app.config.get('TWILIO_ACCOUNT_SID')
+    auth_token = current_app.config.get('TWILIO_AUTH_TOKEN')
+    whatsapp_from = current_app.config.get('TWILIO_WHATSAPP_FROM')
+
+    if not all([account_sid, auth_token, whatsapp_from]):
+        logger.warning("Twilio WhatsApp credentials not configured, skipping alert.")
+        return "mock-sid"
+
+    if not to_number.startswith('whatsapp:'):
+        to_number = f'whatsapp:{to_number}'
+
+    client = get_twilio_client(account_sid, auth_token)
+    msg = get_breaker('whatsapp').call(client.messages.create, from_=whatsapp_from, body=message, to=to_number)
+    logger.info(f"WhatsApp alert sent: {msg.sid}")
+    return msg.sid
+
+
 def send_whatsapp_alert(to_number, message):
     """
     Send a WhatsApp message via Twilio directly in a background thread.
@@ -36,13 +60,16 @@ def send_whatsapp_alert(to_number, message):
         def _send():
             with app.app_context():
                 try:
-                    client = Client(account_sid, auth_token)
-                    msg = client.messages.create(
+                    client = get_twilio_client(account_sid, auth_token)
+                    msg = get_breaker('whatsapp').call(
+                        client.messages.create,
                         from_=whatsapp_from,
                         body=message,
                         to=to_number
                     )
                     logger.info(f"WhatsApp alert sent: {msg.sid}")
+                except CircuitOpenError:
+                    logger.warning(f"WhatsApp provider circuit open, dropping alert to {to_number}")
                 except Exception as e:
                     logger.error(f"Failed to send WhatsApp alert: {e}")
 
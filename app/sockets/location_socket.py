@@ -1,101 +1,170 @@
-
-from flask import request
+from flask import request, session
 from flask_socketio import emit, join_room, leave_room
-from app.extensions import socketio, db # Added db import
+from app.extensions import socketio
 from flask_jwt_extended import decode_token
 from app.services.location_service import update_location
-from app.models.trusted_contact import TrustedContact # Added model import
-from app.models.user import User # Added model import
+from app.services.broadcast_service import tracking_room, room_joined, room_left
+from app.services.tracking_service import can_track
+from app.services.token_blocklist import is_token_revoked
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------------
+# Per-connection identity
+#
+# The access token is verified once, on connect (or on `refresh_auth`), and the
+# user id and expiry are kept in this connection's Socket.IO session.
+# Event handlers read that instead of decoding a JWT on every event. Once the
+# token expires, events are refused with TOKEN_EXPIRED until the client sends
+# `refresh_auth` with a fresh access token.
+# ---------------------------------------------------------------------------
+def _decode_access_token(token):
+    """Decoded `token`. Raises ValueError for refresh tokens and revoked tokens."""
+    # decode_token() checks signature and expiry but not the blocklist
+    decoded = decode_token(token)
+    if decoded.get('type') != 'access':
+        raise ValueError('Only access tokens are accepted')
+    if is_token_revoked(decoded):
+        raise ValueError('Token has been revoked')
+    return decoded
+
+def _authenticate(token, decoded=None):
+    """Verify `token` and store the identity in this connection's session."""
+    decoded = decoded or _decode_access_token(token)
+    identity = {'user_id': decoded['sub'], 'exp': decoded.get('exp'), 'jti': decoded.get('jti')}
+    # Flask-SocketIO gives each connection its own session (manage_session=True)
+    session['identity'] = identity
+    return identity
+
+def _current_user_id():
+    """User id for this connection, or None (after emitting an error) if it has expired."""
+    identity = session.get('identity')
+    if not identity:
+        emit('error', {'code': 'UNAUTHORIZED', 'msg': 'Not authenticated'})
+        return None
+    if identity.get('exp') is not None and identity['exp'] <= time.time():
+        emit('error', {'code': 'TOKEN_EXPIRED', 'msg': 'Access token expired, send refresh_auth with a new token'})
+        return None
+    return identity['user_id']
+
+# ---------------------------------------------------------------------------
+# Tracking room membership
+#
+# Rooms joined are kept in the connection's session so occupancy counts
+# (used to skip broadcasts nobody would receive) are decremented exactly once,
+# on leave_tracking or on disconnect.
+# ---------------------------------------------------------------------------
+def _join_tracking_room(target_user_id):
+    room = tracking_room(target_user_id)
+    joined = session.setdefault('tracking_rooms', [])
+    join_room(room)
+    if room not in joined:
+        session['tracking_rooms'] = joined + [room]
+        room_joined(room)
+    return room
+
+def _leave_tracking_room(target_user_id):
+    room = tracking_room(target_user_id)
+    joined = session.get('tracking_rooms', [])
+    leave_room(room)
+    if room in joined:
+        session['tracking_rooms'] = [r for r in joined if r != room]
+        room_left(room)
+    return room
 
 @socketio.on('connect', namespace='/location')
-def connect():
-    token = request.args.get('token')
+def connect(auth=None):
+    # Socket.IO v5 clients send the token in the auth payload, older ones in the query string
+    token = (auth or {}).get('token') if isinstance(auth, dict) else None
+    token = token or request.args.get('token')
     if not token:
         return False # Reject connection
-    
+
     try:
-        decoded = decode_token(token)
-        user_id = decoded['sub']
+        identity = _authenticate(token)
         # Join own room for self-updates or device updates
-        join_room(f"user_{user_id}") 
-        emit('status', {'msg': 'Connected to location stream'})
+        join_room(f"user_{identity['user_id']}")
+        emit('status', {'msg': 'Connected to location stream', 'expires_at': identity['exp']})
     except Exception as e:
-        print(f"Socket connection failed: {e}")
+        logger.warning(f"Socket connection failed: {e}")
         return False
 
+@socketio.on('disconnect', namespace='/location')
+def disconnect():
+    for room in session.pop('tracking_rooms', []):
+        room_left(room)
+
+@socketio.on('refresh_auth', namespace='/location')
+def handle_refresh_auth(data):
+    """Replace this connection's identity with a fresh access token for the same user."""
+    token = (data or {}).get('token')
+    if not token:
+        emit('error', {'code': 'VALIDATION_ERROR', 'msg': 'Missing token'})
+        return
+
+    current = session.get('identity') or {}
+    try:
+        decoded = _decode_access_token(token)
+    except Exception as e:
+        emit('error', {'code': 'UNAUTHORIZED', 'msg': str(e)})
+        return
+    if current.get('user_id') and decoded['sub'] != current['user_id']:
+        emit('error', {'code': 'UNAUTHORIZED', 'msg': 'Token belongs to a different user'})
+        return
+
+    identity = _authenticate(token, decoded)
+    emit('auth_refreshed', {'expires_at': identity['exp']})
+
 @socketio.on('join_tracking', namespace='/location')
 def handle_join_tracking(data):
     """
     Allow a trusted contact to join the tracking room of a user.
     data = { 'target_user_id': 'uuid' }
     """
-    token = request.args.get('token') # Or passed in data
-    if not token:
-        # Try getting from data if not in query params (client variation)
-        token = data.get('token')
-        
-    if not token or 'target_user_id' not in data:
-        emit('error', {'msg': 'Missing token or target_user_id'})
+    if 'target_user_id' not in data:
+        emit('error', {'msg': 'Missing target_user_id'})
+        return
+
+    requester_id = _current_user_id()
+    if not requester_id:
         return
 
     try:
-        decoded = decode_token(token)
-        requester_id = decoded['sub']
         target_user_id = data['target_user_id']
 
-        # 1. Check if requester is authorized (is a trusted contact or the user themselves)
-        if requester_id == target_user_id:
-            join_room(f"tracking_{target_user_id}")
-            emit('joined', {'room': f"tracking_{target_user_id}", 'msg': 'Joined own tracking room'})
+        # The requester's own room, or a user who lists the requester's phone as a trusted contact
+        if not can_track(requester_id, target_user_id):
+            emit('error', {'msg': 'Unauthorized: You are not a trusted contact'})
             return
 
-        # Check trusted contact relationship
-        # Logic: Does target_user have requester_user in their contacts?
-        # NOTE: The current TrustedContact model likely stores contacts by phone/email, 
-        # not necessarily linking to a User ID directly if they aren't registered.
-        # But if they are using the app (websocket), they must be a registered User.
-        # We need to find if target_user has a contact record that matches requester's phone/email.
-        
-        requester = User.query.get(requester_id)
-        if not requester:
-             emit('error', {'msg': 'Requester user not found'})
-             return
-
-        # Find if target user has listed this requester as a contact
-        # This assumes TrustedContact has phone field we can match against requester.phone
-        contact_record = TrustedContact.query.filter_by(
-            user_id=target_user_id,
-            phone=requester.phone
-        ).first()
-
-        if contact_record:
-            join_room(f"tracking_{target_user_id}")
-            emit('joined', {'room': f"tracking_{target_user_id}", 'msg': f"Tracking user {target_user_id}"})
+        room = _join_tracking_room(target_user_id)
+        if requester_id == target_user_id:
+            emit('joined', {'room': room, 'msg': 'Joined own tracking room'})
         else:
-            emit('error', {'msg': 'Unauthorized: You are not a trusted contact'})
+            emit('joined', {'room': room, 'msg': f"Tracking user {target_user_id}"})
 
     except Exception as e:
-        print(f"Join tracking failed: {e}")
+        logger.error(f"Join tracking failed: {e}")
         emit('error', {'msg': str(e)})
 
 @socketio.on('leave_tracking', namespace='/location')
 def handle_leave_tracking(data):
     target_user_id = data.get('target_user_id')
     if target_user_id:
-        leave_room(f"tracking_{target_user_id}")
-        emit('left', {'room': f"tracking_{target_user_id}"})
+        room = _leave_tracking_room(target_user_id)
+        emit('left', {'room': room})
 
 @socketio.on('location_update', namespace='/location')
 def handle_location_update(data):
-    # expect data = { token, latitude, longitude, accuracy, is_sharing }
-    token = data.get('token')
-    if not token:
+    # expect data = { latitude, longitude, accuracy, is_sharing }
+    # (a `token` field from older clients is ignored: the connection is already authenticated)
+    user_id = _current_user_id()
+    if not user_id:
         return
 
     try:
-        decoded = decode_token(token)
-        user_id = decoded['sub']
-        
         # update location service
         update_location(
             user_id,
@@ -105,4 +174,4 @@ def handle_location_update(data):
             data.get('accuracy')
         )
     except Exception as e:
-        print(f"Location update failed: {e}")
+        logger.error(f"Location update failed: {e}")
@@ -0,0 +1,5 @@
+# Celery tasks. Imported by create_app() so workers register them.
+from app.tasks import notification_tasks
+from app.tasks import sos_tasks
+from app.tasks import location_tasks
+from app.tasks import auth_tasks
@@ -0,0 +1,14 @@
+from celery import shared_task
+from app.utils.otp import purge_expired_otps
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(name='auth.purge_expired_otps')
+def purge_otps():
+    """Delete expired and used OTP rows (only does anything with the SQL OTP backend)."""
+    removed = purge_expired_otps()
+    if removed:
+        logger.info(f"Purged {removed} OTP record(s)")
+    return removed
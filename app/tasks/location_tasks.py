@@ -0,0 +1,35 @@
+from celery import shared_task
+from app.services.location_service import compact_location_history
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(name='ingest.compact_location_history')
+def compact_history(day=None):
+    """Douglas-Peucker compaction of one day of stored tracks (ISO date, default: the configured age)."""
+    from datetime import date
+    removed = compact_location_history(day=date.fromisoformat(day) if day else None)
+    logger.info(f"Location compaction removed {removed} point(s)")
+    return removed
+
+
+@shared_task(name='ingest.rollup_location_history')
+def rollup_history(day=None):
+    """Build daily rollups for one day (ISO date, default: yesterday UTC)."""
+    from datetime import date, datetime, timedelta
+    from app.services.location_retention import rollup_day
+    day = date.fromisoformat(day) if day else (datetime.utcnow() - timedelta(days=1)).date()
+    users = rollup_day(day)
+    logger.info(f"Rolled up location history for {day}: {users} user(s)")
+    return users
+
+
+@shared_task(name='ingest.maintain_location_partitions')
+def maintain_partitions():
+    """Create upcoming monthly partitions and apply retention to old ones."""
+    from app.services.location_retention import ensure_future_partitions, apply_retention
+    created = ensure_future_partitions()
+    removed = apply_retention()
+    logger.info(f"Location partitions: created {created}, retention removed {removed}")
+    return {'created': created, 'removed': removed}
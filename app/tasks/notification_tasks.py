@@ -0,0 +1,13 @@
+from celery import shared_task
+from app.services.notification_service import deliver_pending
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(name='sos.deliver_notifications')
+def deliver_notifications(alert_id=None):
+    """Deliver pending outbox rows, optionally restricted to one alert."""
+    delivered = deliver_pending(alert_id=alert_id)
+    logger.info(f"Delivered {delivered} notification(s) (alert={alert_id or 'all'})")
+    return delivered
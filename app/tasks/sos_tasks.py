@@ -0,0 +1,13 @@
+from celery import shared_task
+from app.services.sos_service import expire_stale_countdowns
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(name='sos.expire_stale_countdowns')
+def expire_countdowns():
+    """Cancel countdown alerts that were never dispatched or cancelled."""
+    swept = expire_stale_countdowns()
+    logger.info(f"Countdown sweep: {swept} alert(s) expired")
+    return swept
@@ -0,0 +1,125 @@
+"""
+Invalidation of the per-worker TTLCaches across all workers.
+
+Each worker keeps its own in-process caches (app.extensions[...]), so a change
+made through one worker has to reach the others. invalidate() applies an
+invalidation to this worker's cache and, when CACHE_REDIS_URL is set,
+publishes it on the `cache_invalidation` channel. Every worker subscribes to
+that channel from a background thread and applies what the others publish.
+
+Each cache is registered once with register_cache(cache_name), optionally
+with a handler for invalidations that are more than "delete this key".
+Handler arguments travel as JSON, so keep them to strings, numbers and None.
+
+While the subscription is down, a worker can miss invalidations, so
+caches_synced() is False and callers should read through to the database.
+On resubscribing, the worker clears its registered caches before trusting
+them again. Without Redis (tests, single-process dev) invalidations stay
+local, which is all there is.
+"""
+from app.utils.redis_client import get_redis
+from flask import current_app
+import json
+import logging
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'cache_invalidation'
+
+_handlers = {} # cache name -> fn(cache, *args)
+
+
+def _delete_key(cache, key):
+    cache.delete(key)
+
+
+def register_cache(cache_name, handler=_delete_key):
+    """Make app.extensions[cache_name] invalidatable; handler(cache, *args) applies one invalidation."""
+    _handlers[cache_name] = handler
+
+
+class _Invalidator:
+    def __init__(self, app, client):
+        self.app = app
+        self.client = client
+        self.origin = uuid.uuid4().hex # Skip our own messages, already applied locally
+        self.synced = client is None
+        if client is not None:
+            threading.Thread(target=self._listen, name='cache-invalidation', daemon=True).start()
+
+    def apply(self, cache_name, args):
+        cache = self.app.extensions.get(cache_name)
+        handler = _handlers.get(cache_name)
+        if cache is not None and handler is not None:
+            handler(cache, *args)
+
+    def invalidate(self, cache_name, args):
+        self.apply(cache_name, args)
+        if self.client is None:
+            return
+        try:
+            self.client.publish(CHANNEL, json.dumps({'origin': self.origin, 'cache': cache_name, 'args': list(args)}))
+        except Exception as e:
+            logger.warning(f"Cache invalidation publish failed for {cache_name}: {e}")
+
+    def _clear_all(self):
+        for cache_name in _handlers:
+            cache = self.app.extensions.get(cache_name)
+            if cache is not None:
+                cache.clear()
+
+    def _listen(self):
+        backoff = 1
+        while True:
+            pubsub = None
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CHANNEL)
+                # Anything cached before (re)subscribing may have missed an invalidation
+                self._clear_all()
+                self.synced = True
+                backoff = 1
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if not message or message.get('type') != 'message':
+                        continue
+                    payload = json.loads(message['data'])
+                    if payload.get('origin') != self.origin:
+                        self.apply(payload['cache'], payload.get('args', []))
+            except Exception as e:
+                self.synced = False
+                logger.warning(f"Cache invalidation subscription lost, retrying in {backoff}s: {e}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+
+_init_lock = threading.Lock()
+
+def _invalidator():
+    invalidator = current_app.extensions.get('cache_invalidation')
+    if invalidator is None:
+        with _init_lock:
+            invalidator = current_app.extensions.get('cache_invalidation')
+            if invalidator is None:
+                invalidator = _Invalidator(current_app._get_current_object(), get_redis())
+                current_app.extensions['cache_invalidation'] = invalidator
+    return invalidator
+
+
+def invalidate(cache_name, *args):
+    """Invalidate `cache_name` (by default: delete key args[0]) on this and every other worker."""
+    _invalidator().invalidate(cache_name, args)
+
+
+def caches_synced():
+    """False while this worker may be missing other workers' invalidations."""
+    return _invalidator().synced
@@ -1,6 +1,8 @@
-
 from celery import Celery, Task
+from celery.signals import before_task_publish, task_prerun
 from flask import Flask
+from app.utils import metrics
+import time
 
 def celery_init_app(app: Flask) -> Celery:
     class FlaskTask(Task):
@@ -13,3 +15,34 @@ def celery_init_app(app: Flask) -> Celery:
     celery.set_default()
     app.extensions["celery"] = celery
     return celery
+
+
+# ---------------------------------------------------------------------------
+# Queue latency: stamp tasks when published, measure the wait when a worker starts them
+# ---------------------------------------------------------------------------
+@before_task_publish.connect
+def _stamp_enqueued_at(headers=None, **kwargs):
+    if headers is not None:
+        headers.setdefault('enqueued_at', time.time())
+
+
+def _task_queue(task):
+    delivery_info = task.request.delivery_info or {}
+    queue = delivery_info.get('routing_key')
+    if not queue:
+        route = task.app.amqp.router.route({}, task.name)
+        queue = getattr(route.get('queue'), 'name', None)
+    return queue or task.app.conf.task_default_queue
+
+
+@task_prerun.connect
+def _record_queue_wait(task=None, **kwargs):
+    if task is None:
+        return
+    enqueued_at = task.request.get('enqueued_at') or (task.request.headers or {}).get('enqueued_at')
+    if not enqueued_at:
+        return
+    wait = max(time.time() - float(enqueued_at), 0.0)
+    queue = _task_queue(task)
+    metrics.set_gauge('celery_queue_wait_seconds', wait, queue=queue)
+    metrics.observe('celery_queue_wait_seconds', wait, queue=queue)
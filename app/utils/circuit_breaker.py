@@ -0,0 +1,202 @@
+"""
+Per-provider circuit breakers (Twilio SMS, Twilio WhatsApp, SMTP, FCM).
+
+A breaker watches the last N calls to a provider. When the failure rate or the
+slow-call rate crosses its threshold it opens and rejects calls immediately
+(CircuitOpenError) instead of letting threads pile up on a degraded provider.
+After BREAKER_OPEN_SECONDS it goes half-open and lets a few probe calls
+through: if they succeed it closes, otherwise it opens again.
+
+Only provider failures count. A call rejected for something about the request
+itself (an HTTP 4xx such as a bad phone number or a dead push token) shows the
+provider is up, so by default it counts as a successful call; callers can pass
+their own is_failure predicate.
+"""
+from collections import deque
+from datetime import datetime, timedelta
+from flask import current_app, has_app_context
+from app.config import Config
+from app.utils import metrics
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+HALF_OPEN = 'half_open'
+OPEN = 'open'
+
+# Numeric encoding for the circuit_breaker_state gauge
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose breaker is open."""
+
+    def __init__(self, name, retry_at):
+        super().__init__(f"Circuit open for {name}")
+        self.name = name
+        self.retry_at = retry_at
+
+
+def is_client_error(error):
+    """True if the provider rejected the request itself (HTTP 4xx other than 408/429).
+    Reads the status from Twilio (`status`), Firebase (`http_response`) and requests (`response`) errors."""
+    status = getattr(error, 'status', None)
+    if not isinstance(status, int):
+        response = getattr(error, 'http_response', None) or getattr(error, 'response', None)
+        status = getattr(response, 'status_code', None)
+    # Timeouts and rate limiting are the provider struggling, not a bad request
+    return isinstance(status, int) and 400 <= status < 500 and status not in (408, 429)
+
+
+def is_provider_failure(error):
+    """Default is_failure predicate: everything except client errors."""
+    return not is_client_error(error)
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_rate=0.5, slow_call_seconds=5.0, slow_call_rate=0.5,
+                 min_calls=5, window_size=20, open_seconds=30.0, half_open_calls=2):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=window_size) # (failed, slow) per call
+        self._state = CLOSED
+        self._opened_at = None
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        metrics.set_gauge('circuit_breaker_state', _STATE_VALUES[CLOSED], provider=name)
+
+    # -- state -------------------------------------------------------------
+    @property
+    def state(self):
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def retry_at(self):
+        """Wall-clock time at which an open breaker will start probing again."""
+        with self._lock:
+            if self._state != OPEN:
+                return datetime.utcnow()
+            remaining = max(self.open_seconds - (time.monotonic() - self._opened_at), 0)
+            return datetime.utcnow() + timedelta(seconds=remaining)
+
+    def _transition(self, state):
+        if state == self._state:
+            return
+        logger.warning(f"Circuit breaker '{self.name}': {self._state} -> {state}")
+        self._state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        if state in (OPEN, HALF_OPEN):
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+        if state == CLOSED:
+            self._outcomes.clear()
+        metrics.set_gauge('circuit_breaker_state', _STATE_VALUES[state], provider=self.name)
+        metrics.inc_counter('circuit_breaker_transitions_total', provider=self.name, state=state)
+
+    def _maybe_half_open(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._transition(HALF_OPEN)
+
+    # -- calls -------------------------------------------------------------
+    def _before_call(self):
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == HALF_OPEN and self._probes_in_flight < self.half_open_calls:
+                self._probes_in_flight += 1
+                return
+            if self._state != CLOSED:
+                metrics.inc_counter('circuit_breaker_calls_total', provider=self.name, outcome='rejected')
+                remaining = self.open_seconds
+                if self._state == OPEN:
+                    remaining = max(self.open_seconds - (time.monotonic() - self._opened_at), 0)
+                raise CircuitOpenError(self.name, datetime.utcnow() + timedelta(seconds=remaining))
+
+    def _after_call(self, failed, duration, outcome=None):
+        slow = duration >= self.slow_call_seconds
+        outcome = 'failure' if failed else ('slow' if slow else outcome or 'success')
+        metrics.inc_counter('circuit_breaker_calls_total', provider=self.name, outcome=outcome)
+
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes_in_flight = max(self._probes_in_flight - 1, 0)
+                if failed or slow:
+                    self._transition(OPEN)
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_calls:
+                        self._transition(CLOSED)
+                return
+
+            self._outcomes.append((failed, slow))
+            if len(self._outcomes) < self.min_calls:
+                return
+            total = len(self._outcomes)
+            failures = sum(1 for f, _ in self._outcomes if f)
+            slow_calls = sum(1 for _, s in self._outcomes if s)
+            if failures / total >= self.failure_rate or slow_calls / total >= self.slow_call_rate:
+                self._transition(OPEN)
+
+    def call(self, fn, *args, is_failure=is_provider_failure, **kwargs):
+        """Call `fn` through the breaker. Raises CircuitOpenError if it's open.
+        An exception from `fn` counts against the provider only if is_failure(exception) is true."""
+        self._before_call()
+        started = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            failed = is_failure(e)
+            self._after_call(failed, time.monotonic() - started, outcome=None if failed else 'client_error')
+            raise
+        self._after_call(False, time.monotonic() - started)
+        return result
+
+
+# ---------------------------------------------------------------------------
+# Registry
+# ---------------------------------------------------------------------------
+_breakers = {}
+_registry_lock = threading.Lock()
+
+
+def _setting(key):
+    if has_app_context():
+        return current_app.config.get(key, getattr(Config, key))
+    return getattr(Config, key)
+
+
+def get_breaker(name):
+    """Process-wide breaker for provider `name`, created from config on first use."""
+    breaker = _breakers.get(name)
+    if breaker is not None:
+        return breaker
+    with _registry_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(
+                name,
+                failure_rate=float(_setting('BREAKER_FAILURE_RATE')),
+                slow_call_seconds=float(_setting('BREAKER_SLOW_CALL_SECONDS')),
+                slow_call_rate=float(_setting('BREAKER_SLOW_CALL_RATE')),
+                min_calls=int(_setting('BREAKER_MIN_CALLS')),
+                window_size=int(_setting('BREAKER_WINDOW_SIZE')),
+                open_seconds=float(_setting('BREAKER_OPEN_SECONDS')),
+                half_open_calls=int(_setting('BREAKER_HALF_OPEN_CALLS')),
+            )
+        return _breakers[name]
+
+
+def reset_breakers():
+    """Drop all breakers (tests)."""
+    with _registry_lock:
+        _breakers.clear()
@@ -0,0 +1,133 @@
+"""
+Geometry helpers for GPS tracks. Distances are in metres.
+"""
+import math
+
+EARTH_RADIUS_M = 6371008.8
+METRES_PER_DEGREE_LAT = 111320.0
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two points."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _to_xy(lat, lng, ref_lat):
+    # Equirectangular projection: accurate enough over the extent of one track
+    x = math.radians(lng) * EARTH_RADIUS_M * math.cos(math.radians(ref_lat))
+    y = math.radians(lat) * EARTH_RADIUS_M
+    return x, y
+
+
+def _segment_distance(p, a, b):
+    px, py = p
+    ax, ay = a
+    bx, by = b
+    dx, dy = bx - ax, by - ay
+    if dx == 0 and dy == 0:
+        return math.hypot(px - ax, py - ay)
+    t = max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / (dx * dx + dy * dy)))
+    return math.hypot(px - (ax + t * dx), py - (ay + t * dy))
+
+
+def douglas_peucker(points, epsilon_m):
+    """Indices of the points to keep when simplifying a (lat, lng) track.
+
+    A point is dropped if it lies within `epsilon_m` metres of the line between
+    the points kept around it. The first and last points are always kept.
+    """
+    n = len(points)
+    if n <= 2:
+        return list(range(n))
+
+    ref_lat = points[0][0]
+    xy = [_to_xy(lat, lng, ref_lat) for lat, lng in points]
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        max_dist, index = 0.0, None
+        for i in range(start + 1, end):
+            dist = _segment_distance(xy[i], xy[start], xy[end])
+            if dist > max_dist:
+                max_dist, index = dist, i
+        if index is not None and max_dist > epsilon_m:
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+
+    return [i for i in range(n) if keep[i]]
+
+
+def _encode_value(value):
+    value = ~(value << 1) if value < 0 else value << 1
+    chunks = []
+    while value >= 0x20:
+        chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+    chunks.append(chr(value + 63))
+    return ''.join(chunks)
+
+
+def encode_polyline(points, precision=5):
+    """Encode (lat, lng) points in Google's encoded polyline format."""
+    factor = 10 ** precision
+    out = []
+    prev_lat = prev_lng = 0
+    for lat, lng in points:
+        lat_i, lng_i = int(round(lat * factor)), int(round(lng * factor))
+        out.append(_encode_value(lat_i - prev_lat))
+        out.append(_encode_value(lng_i - prev_lng))
+        prev_lat, prev_lng = lat_i, lng_i
+    return ''.join(out)
+
+
+class GridIndex:
+    """Spatial hash of circles on a fixed lat/lng grid.
+
+    Each circle is registered in every `cell_deg` x `cell_deg` cell its bounding
+    box touches, so finding the circles that may contain a point is one dict
+    lookup plus an exact distance check on the few circles in that cell,
+    however many circles are indexed. Circles crossing the antimeridian are not
+    supported.
+    """
+
+    def __init__(self, cell_deg=0.01):
+        self.cell_deg = cell_deg
+        self._cells = {}
+        self._circles = {}
+
+    def _cell(self, lat, lng):
+        return math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg)
+
+    def add(self, key, lat, lng, radius_m):
+        dlat = radius_m / METRES_PER_DEGREE_LAT
+        dlng = radius_m / (METRES_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01))
+        row0, col0 = self._cell(lat - dlat, lng - dlng)
+        row1, col1 = self._cell(lat + dlat, lng + dlng)
+        for row in range(row0, row1 + 1):
+            for col in range(col0, col1 + 1):
+                self._cells.setdefault((row, col), []).append(key)
+        self._circles[key] = (lat, lng, radius_m)
+
+    def candidates(self, lat, lng):
+        """Keys of circles whose bounding box covers the point's cell."""
+        return self._cells.get(self._cell(lat, lng), ())
+
+    def containing(self, lat, lng):
+        """Keys of circles that contain the point."""
+        found = []
+        for key in self.candidates(lat, lng):
+            c_lat, c_lng, radius_m = self._circles[key]
+            if haversine_m(lat, lng, c_lat, c_lng) <= radius_m:
+                found.append(key)
+        return found
+
+    def __len__(self):
+        return len(self._circles)
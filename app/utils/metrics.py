@@ -0,0 +1,72 @@
+"""
+Minimal in-process metrics registry, rendered in Prometheus text format at /metrics.
+Values are per process; scrape each worker separately.
+"""
+import threading
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc_counter(name, amount=1, **labels):
+    """Increase a counter by `amount`."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def set_gauge(name, value, **labels):
+    """Set a gauge to `value`."""
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name, value, **labels):
+    """Record one observation as `<name>_count` and `<name>_sum` counters."""
+    inc_counter(f"{name}_count", 1, **labels)
+    inc_counter(f"{name}_sum", value, **labels)
+
+
+def get_value(name, **labels):
+    """Current value of a counter or gauge, or None if never recorded."""
+    key = _key(name, labels)
+    with _lock:
+        if key in _gauges:
+            return _gauges[key]
+        return _counters.get(key)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    inner = ','.join(f'{k}="{v}"' for k, v in labels)
+    return '{' + inner + '}'
+
+
+def render_prometheus():
+    """Render all metrics in the Prometheus text exposition format."""
+    with _lock:
+        counters = sorted(_counters.items())
+        gauges = sorted(_gauges.items())
+
+    lines = []
+    seen = set()
+    for kind, items in (('counter', counters), ('gauge', gauges)):
+        for (name, labels), value in items:
+            if name not in seen:
+                lines.append(f"# TYPE {name} {kind}")
+                seen.add(name)
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    """Clear all metrics (tests)."""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
@@ -1,75 +1,225 @@
+"""
+One-time codes for phone login and email verification.
 
-import random
-import string
-from datetime import datetime, timedelta
+Codes are never stored in clear: only an HMAC-SHA256 of the code (keyed with
+SECRET_KEY and bound to the purpose and recipient) is kept. Where codes live
+is set by OTP_BACKEND:
+  - "redis": one hash per (purpose, recipient) with a native TTL. Attempts are
+    counted and the code consumed atomically by a Lua script. No SQL at all,
+    and expired codes disappear on their own.
+  - "memory": the same semantics in-process (tests, single-process dev).
+  - "sql": otp_records rows (the original storage). Expired rows are removed
+    by the auth.purge_expired_otps periodic task.
+  - "auto" (default): "redis" when CACHE_REDIS_URL is set, otherwise "sql".
+Storing a new code for a recipient and purpose replaces any earlier one.
+"""
 from app.extensions import db
 from app.models.otp import OTPRecord
-from app.config import Config
+from app.utils.redis_client import get_redis
+from flask import current_app
+from sqlalchemy import delete, update
+from datetime import datetime, timedelta
+import hashlib
+import hmac
+import logging
+import secrets
+import string
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+NOT_FOUND = "OTP not found or expired"
+TOO_MANY = "Too many attempts"
+INVALID = "Invalid OTP"
+VERIFIED = "OTP verified"
 
 def generate_otp(length=6):
     """Generate a numeric OTP of given length."""
-    return ''.join(random.choices(string.digits, k=length))
+    return ''.join(secrets.choice(string.digits) for _ in range(length))
 
-def store_otp(phone=None, email=None, otp_code=None, purpose=None):
-    """Store OTP in database."""
-    if not phone and not email:
-        raise ValueError("Either phone or email must be provided")
+def _recipient(phone, email):
+    return f"phone:{phone}" if phone else f"email:{email.lower()}"
 
-    # Invalidate existing OTPs
-    query_filter = {
-        'purpose': purpose,
-        'is_used': False
-    }
-    if phone:
-        query_filter['phone'] = phone
-    if email:
-        query_filter['email'] = email
-        
-    OTPRecord.query.filter_by(**query_filter).update({'is_used': True})
-    
-    expires_at = datetime.utcnow() + timedelta(seconds=int(Config.OTP_EXPIRY_SECONDS or 300))
-    
-    otp_record = OTPRecord(
-        phone=phone,
-        email=email,
-        otp_code=otp_code,
-        purpose=purpose,
-        expires_at=expires_at
-    )
-    db.session.add(otp_record)
-    db.session.commit()
-    return otp_record
+def _hash_code(purpose, recipient, otp_code):
+    secret = (current_app.config.get('SECRET_KEY') or '').encode('utf-8')
+    message = f"{purpose}|{recipient}|{otp_code}".encode('utf-8')
+    return hmac.new(secret, message, hashlib.sha256).hexdigest()
 
-def verify_otp(phone=None, email=None, otp_code=None, purpose=None):
-    """Verify OTP."""
-    if not phone and not email:
-        return False, "Identifier required"
+def _settings():
+    config = current_app.config
+    return int(config.get('OTP_EXPIRY_SECONDS', 300)), int(config.get('MAX_OTP_ATTEMPTS', 5))
 
-    query_filter = {
-        'purpose': purpose,
-        'is_used': False
-    }
+
+# ---------------------------------------------------------------------------
+# Backends: store(purpose, phone, email, code_hash, ttl) / verify(purpose, phone,
+# email, code_hash, max_attempts) -> (ok, message)
+# ---------------------------------------------------------------------------
+def unused_otp_query(purpose, phone=None, email=None):
+    """Unused codes for (recipient, purpose), newest first."""
+    # is_(False) renders a literal predicate that matches the partial *_lookup indexes
+    query = OTPRecord.query.filter(OTPRecord.purpose == purpose, OTPRecord.is_used.is_(False))
     if phone:
-        query_filter['phone'] = phone
+        query = query.filter(OTPRecord.phone == phone)
     if email:
-        query_filter['email'] = email
+        query = query.filter(OTPRecord.email == email)
+    return query.order_by(OTPRecord.created_at.desc())
+
 
-    otp_record = OTPRecord.query.filter_by(**query_filter).order_by(OTPRecord.created_at.desc()).first()
+class _SQLBackend:
+    def store(self, purpose, phone, email, code_hash, ttl):
+        unused_otp_query(purpose, phone, email).order_by(None).update({'is_used': True})
 
-    if not otp_record:
-        return False, "OTP not found or expired"
+        db.session.add(OTPRecord(
+            phone=phone,
+            email=email,
+            otp_code=code_hash,
+            purpose=purpose,
+            expires_at=datetime.utcnow() + timedelta(seconds=ttl)
+        ))
+        db.session.commit()
 
-    if otp_record.expires_at < datetime.utcnow():
-        return False, "OTP expired"
+    def verify(self, purpose, phone, email, code_hash, max_attempts):
+        record = unused_otp_query(purpose, phone, email).first()
 
-    if otp_record.attempts >= int(Config.MAX_OTP_ATTEMPTS or 5):
-         return False, "Too many attempts"
+        if not record or record.expires_at < datetime.utcnow():
+            return False, NOT_FOUND
+        if record.attempts >= max_attempts:
+            return False, TOO_MANY
+        if not hmac.compare_digest(record.otp_code, code_hash):
+            # Counted in SQL so concurrent wrong guesses can't share one attempt
+            db.session.execute(
+                update(OTPRecord).where(OTPRecord.id == record.id)
+                .values(attempts=OTPRecord.attempts + 1)
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+            return False, INVALID
 
-    if otp_record.otp_code != otp_code:
-        otp_record.attempts += 1
+        record.is_used = True
         db.session.commit()
-        return False, "Invalid OTP"
+        return True, VERIFIED
+
+
+# KEYS[1] = otp key; ARGV[1] = submitted code hash, ARGV[2] = max attempts.
+# 1 = verified (and consumed), 0 = missing/expired, -1 = too many attempts, -2 = wrong code
+_VERIFY_SCRIPT = """
+local stored = redis.call('HGET', KEYS[1], 'code')
+if not stored then return 0 end
+local attempts = tonumber(redis.call('HGET', KEYS[1], 'attempts') or '0')
+if attempts >= tonumber(ARGV[2]) then return -1 end
+if stored == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    return 1
+end
+redis.call('HINCRBY', KEYS[1], 'attempts', 1)
+return -2
+"""
+_VERIFY_RESULTS = {1: (True, VERIFIED), 0: (False, NOT_FOUND), -1: (False, TOO_MANY), -2: (False, INVALID)}
 
-    otp_record.is_used = True
+class _RedisBackend:
+    def __init__(self, client):
+        self.client = client
+        self._verify = client.register_script(_VERIFY_SCRIPT)
+
+    @staticmethod
+    def _key(purpose, phone, email):
+        return f"otp:{purpose}:{_recipient(phone, email)}"
+
+    def store(self, purpose, phone, email, code_hash, ttl):
+        key = self._key(purpose, phone, email)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(key)
+        pipe.hset(key, mapping={'code': code_hash, 'attempts': 0})
+        pipe.expire(key, ttl)
+        pipe.execute()
+
+    def verify(self, purpose, phone, email, code_hash, max_attempts):
+        result = self._verify(keys=[self._key(purpose, phone, email)], args=[code_hash, max_attempts])
+        return _VERIFY_RESULTS[int(result)]
+
+
+class _MemoryBackend:
+    def __init__(self):
+        self._codes = {} # key -> [code_hash, attempts, expires_at]
+        self._lock = threading.Lock()
+
+    def store(self, purpose, phone, email, code_hash, ttl):
+        with self._lock:
+            now = time.monotonic()
+            # Drop expired entries so the dict doesn't grow without bound
+            for key in [k for k, entry in self._codes.items() if entry[2] <= now]:
+                del self._codes[key]
+            self._codes[(purpose, _recipient(phone, email))] = [code_hash, 0, now + ttl]
+
+    def verify(self, purpose, phone, email, code_hash, max_attempts):
+        key = (purpose, _recipient(phone, email))
+        with self._lock:
+            entry = self._codes.get(key)
+            if entry is None or entry[2] <= time.monotonic():
+                self._codes.pop(key, None)
+                return False, NOT_FOUND
+            if entry[1] >= max_attempts:
+                return False, TOO_MANY
+            if not hmac.compare_digest(entry[0], code_hash):
+                entry[1] += 1
+                return False, INVALID
+            del self._codes[key]
+            return True, VERIFIED
+
+
+_backend_lock = threading.Lock()
+
+def _backend():
+    backend = current_app.extensions.get('otp_backend')
+    if backend is not None:
+        return backend
+    name = current_app.config.get('OTP_BACKEND', 'auto')
+    if name == 'auto':
+        name = 'redis' if current_app.config.get('CACHE_REDIS_URL') else 'sql'
+    with _backend_lock:
+        if 'otp_backend' not in current_app.extensions:
+            client = get_redis() if name == 'redis' else None
+            if name == 'redis' and client is None:
+                logger.warning("OTP_BACKEND is redis but CACHE_REDIS_URL is unset; using sql")
+                name = 'sql'
+            if name == 'redis':
+                backend = _RedisBackend(client)
+            elif name == 'memory':
+                backend = _MemoryBackend()
+            elif name == 'sql':
+                backend = _SQLBackend()
+            else:
+                raise ValueError(f"Unknown OTP_BACKEND {name!r}")
+            current_app.extensions['otp_backend'] = backend
+            logger.info(f"OTP backend: {name}")
+    return current_app.extensions['otp_backend']
+
+
+def store_otp(phone=None, email=None, otp_code=None, purpose=None):
+    """Store a (hashed) OTP, replacing any earlier code for this recipient and purpose."""
+    if not phone and not email:
+        raise ValueError("Either phone or email must be provided")
+    ttl, _ = _settings()
+    code_hash = _hash_code(purpose, _recipient(phone, email), otp_code)
+    _backend().store(purpose, phone, email, code_hash, ttl)
+
+def verify_otp(phone=None, email=None, otp_code=None, purpose=None):
+    """Verify OTP. Returns (ok, message); a verified code can't be used again."""
+    if not phone and not email:
+        return False, "Identifier required"
+    _, max_attempts = _settings()
+    code_hash = _hash_code(purpose, _recipient(phone, email), otp_code or '')
+    return _backend().verify(purpose, phone, email, code_hash, max_attempts)
+
+def purge_expired_otps():
+    """Delete expired or used otp_records rows (SQL backend). Returns rows deleted."""
+    if not isinstance(_backend(), _SQLBackend):
+        return 0
+    result = db.session.execute(
+        delete(OTPRecord)
+        .where((OTPRecord.expires_at < datetime.utcnow()) | (OTPRecord.is_used.is_(True)))
+        .execution_options(synchronize_session=False)
+    )
     db.session.commit()
-    return True, "OTP verified"
+    return result.rowcount or 0
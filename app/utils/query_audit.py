@@ -0,0 +1,137 @@
+"""
+EXPLAIN audit of the hot service queries: fails if any of them would read a
+whole table instead of using an index.
+
+Each entry of _hot_queries() is the statement a service or route runs, for a
+sample user. Service queries come from the services' own builders; the simple
+lookups written inline in routes are repeated here, and
+tests/test_query_audit.py checks they still match what the routes run.
+run_audit() seeds rows for that user, runs EXPLAIN
+on each statement, and rolls everything back. On PostgreSQL it also sets
+`SET LOCAL enable_seqscan = off`, so a Seq Scan in a plan means no usable
+index exists, not that the planner chose a scan for a small table.
+On SQLite it reads EXPLAIN QUERY PLAN, where a full table or index scan
+shows up as "SCAN <table>" rather than "SEARCH <table> USING INDEX".
+
+Run it with `flask explain-audit` (see app/commands.py).
+"""
+from app.extensions import db
+from app.models.device import ConnectedDevice
+from app.models.location import LocationHistory
+from app.models.ml_model import MLModel
+from app.models.otp import OTPRecord
+from app.models.settings import UserSettings
+from app.models.sos_alert import SOSAlert
+from app.models.support import SupportTicket
+from app.models.trusted_contact import TrustedContact
+from app.models.user import User
+from app.services.location_service import location_history_query
+from app.services.notification_service import claimable_query, delivery_counts_query
+from app.services.sos_service import active_countdown_query, sos_history_query, stale_countdowns_update
+from app.services.tracking_service import can_track_query
+from app.services.user_context import user_context_query
+from app.utils.otp import unused_otp_query
+from sqlalchemy import text
+from datetime import datetime, timedelta
+import re
+
+AUDIT_USER_ID = '00000000-0000-4000-8000-00000000a0d1'
+AUDIT_PHONE = '+910000000001'
+AUDIT_EMAIL = 'explain-audit@example.invalid'
+AUDIT_MAC = '00:00:00:00:A0:D1'
+
+
+def _hot_queries(user_id, now):
+    day_ago = now - timedelta(days=1)
+    return [
+        # Service builders
+        ("user context (profile, SOS)", user_context_query(user_id).limit(1).statement),
+        ("can_track contact probe", can_track_query(AUDIT_USER_ID, user_id).statement),
+        ("location history page", location_history_query(user_id, start=day_ago).limit(501).statement),
+        ("SOS live countdown", active_countdown_query(user_id, now)),
+        ("SOS countdown sweeper", stale_countdowns_update(now)),
+        ("SOS history", sos_history_query(user_id)),
+        ("outbox claim sweep", claimable_query(now, 50).statement),
+        ("outbox claim for alert", claimable_query(now, 50, alert_id='audit-alert').statement),
+        ("outbox status counts", delivery_counts_query('audit-alert').statement),
+        ("OTP verify by phone", unused_otp_query('login', phone=AUDIT_PHONE).limit(1).statement),
+        ("OTP verify by email", unused_otp_query('email_verification', email=AUDIT_EMAIL).limit(1).statement),
+        # Inline lookups, as written in the routes and services that run them
+        ("user by phone (OTP login)", User.query.filter_by(phone=AUDIT_PHONE).limit(1).statement),
+        ("trusted contacts of user", TrustedContact.query.filter_by(user_id=user_id).statement),
+        ("settings of user", UserSettings.query.filter_by(user_id=user_id).limit(1).statement),
+        ("device by MAC", ConnectedDevice.query.filter_by(device_mac=AUDIT_MAC).limit(1).statement),
+        ("latest device of user", ConnectedDevice.query.filter_by(user_id=user_id)
+            .order_by(ConnectedDevice.last_seen.desc()).limit(1).statement),
+        ("connected device of user", ConnectedDevice.query.filter_by(user_id=user_id, is_connected=True).limit(1).statement),
+        ("active ML model", MLModel.query.filter_by(is_active=True).order_by(MLModel.created_at.desc()).limit(1).statement),
+        ("support tickets of user", SupportTicket.query.filter_by(user_id=user_id)
+            .order_by(SupportTicket.created_at.desc()).statement),
+    ]
+
+
+def seed(rows=200, user_id=AUDIT_USER_ID):
+    """Add `rows` rows per hot table for one throwaway user. Flushed, not committed."""
+    now = datetime.utcnow()
+    db.session.add(User(id=user_id, full_name='Explain Audit', email=AUDIT_EMAIL, auth_provider='email'))
+    db.session.add(UserSettings(user_id=user_id))
+    db.session.flush()
+    objects = []
+    for i in range(rows):
+        at = now - timedelta(minutes=i)
+        objects += [
+            TrustedContact(user_id=user_id, name=f'Contact {i}', phone=f'+9100{i:08d}'),
+            LocationHistory(user_id=user_id, latitude=12.0, longitude=77.0, recorded_at=at),
+            SOSAlert(user_id=user_id, trigger_type='manual', latitude=12.0, longitude=77.0, status='resolved',
+                     sos_message='audit', contacted_numbers=[], triggered_at=at),
+            OTPRecord(phone=f'+9100{i:08d}', otp_code='0' * 64, purpose='login', is_used=True,
+                      expires_at=at, created_at=at),
+            ConnectedDevice(user_id=user_id, device_name=f'Device {i}', device_mac=f'02:00:00:00:{i // 256:02X}:{i % 256:02X}',
+                            last_seen=at),
+            SupportTicket(user_id=user_id, subject='audit', message='audit', created_at=at),
+        ]
+    db.session.add_all(objects)
+    db.session.flush()
+
+
+# "SCAN t" (or "SCAN TABLE t" before SQLite 3.36), with or without "USING INDEX", walks every row.
+# Scans of a subquery's result (CO-ROUTINE / MATERIALIZE) and of "CONSTANT ROW" aren't table scans.
+_SQLITE_FULL_SCAN = re.compile(r'^SCAN (?:TABLE |SUBQUERY )?(?!CONSTANT ROW)(\w+)')
+_SQLITE_SUBQUERY = re.compile(r'^(?:CO-ROUTINE|MATERIALIZE) (?:SUBQUERY )?(\w+)')
+
+
+def explain(statement):
+    """(plan lines, full-scan tables) for `statement` on the current connection."""
+    connection = db.session.connection()
+    dialect = connection.dialect
+    # render_postcompile: values bound with literal_execute (see sos_service._is_countdown) go in inline
+    compiled = statement.compile(dialect=dialect, compile_kwargs={'render_postcompile': True})
+    params = compiled.construct_params()
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+
+    if dialect.name == 'postgresql':
+        plan = [row[0] for row in connection.exec_driver_sql(f"EXPLAIN {compiled}", params)]
+        scans = [m.group(1) for m in (re.search(r'Seq Scan on (\w+)', line) for line in plan) if m]
+    elif dialect.name == 'sqlite':
+        plan = [row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params)]
+        subqueries = {m.group(1) for m in (_SQLITE_SUBQUERY.match(line) for line in plan) if m}
+        scans = [m.group(1) for m in (_SQLITE_FULL_SCAN.match(line) for line in plan)
+                 if m and m.group(1) not in subqueries]
+    else:
+        raise RuntimeError(f"EXPLAIN audit doesn't support {dialect.name}")
+    return plan, scans
+
+
+def run_audit(seed_rows=200, queries=None):
+    """EXPLAIN every hot query. Returns [(name, plan lines, full-scan tables)].
+    Nothing is written: seeded rows and planner settings are rolled back."""
+    try:
+        if seed_rows:
+            seed(seed_rows)
+        if db.session.connection().dialect.name == 'postgresql':
+            db.session.execute(text("SET LOCAL enable_seqscan = off"))
+        queries = queries or _hot_queries(AUDIT_USER_ID, datetime.utcnow())
+        return [(name, *explain(statement)) for name, statement in queries]
+    finally:
+        db.session.rollback()
@@ -0,0 +1,140 @@
+"""
+SQL query counts and time per request and per Celery task.
+
+Every statement run through SQLAlchemy is timed by cursor-execute hooks and
+added to the innermost active scope, and to each scope that encloses it:
+  - each request (label: the endpoint). With DEBUG or SQL_QUERY_HEADERS on,
+    responses carry X-DB-Queries and X-DB-Time (milliseconds).
+  - each Celery task (label: the task name)
+  - track_queries() blocks, which tests use for query budgets
+Statements slower than SQL_SLOW_QUERY_MS are logged with the endpoint or
+task they ran in.
+
+Per-scope totals are recorded as db_queries / db_time_seconds observations
+(`_count` and `_sum`).
+"""
+from app.utils import metrics
+from celery.signals import task_prerun, task_postrun
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('query_stats', default=None)
+_slow_query_seconds = 0.2
+_task_tokens = {}
+
+
+class QueryStats:
+    __slots__ = ('label', 'count', 'seconds', 'statements', 'parent')
+
+    def __init__(self, label, record=False, parent=None):
+        self.label = label
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = [] if record else None
+        self.parent = parent
+
+
+@contextmanager
+def track_queries(label='block', record=True):
+    """Count the queries run inside the block. Yields a QueryStats."""
+    stats = QueryStats(label, record=record, parent=_current.get())
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+def current_query_stats():
+    """The innermost active QueryStats, or None outside any scope."""
+    return _current.get()
+
+
+# The start time lives on the statement's execution context, which is dropped
+# with the statement, so one that raises leaves nothing behind
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_query_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    stats = _current.get()
+    if stats is None:
+        return
+
+    if elapsed >= _slow_query_seconds:
+        metrics.inc_counter('db_slow_queries_total', scope=stats.label)
+        logger.warning(f"Slow query ({elapsed * 1000:.0f} ms) in {stats.label}: {' '.join(statement.split())[:500]}")
+    while stats is not None:
+        stats.count += 1
+        stats.seconds += elapsed
+        if stats.statements is not None:
+            stats.statements.append(statement)
+        stats = stats.parent
+
+
+def _finish(stats, **labels):
+    metrics.observe('db_queries', stats.count, **labels)
+    metrics.observe('db_time_seconds', stats.seconds, **labels)
+
+
+def init_query_stats(app):
+    """Track queries for each request of `app` (and each Celery task in this process)."""
+    global _slow_query_seconds
+    _slow_query_seconds = float(app.config.get('SQL_SLOW_QUERY_MS', 200)) / 1000
+    with_headers = app.debug or app.config.get('SQL_QUERY_HEADERS', False)
+
+    @app.before_request
+    def _start_request_stats():
+        stats = QueryStats(request.endpoint or request.path, parent=_current.get())
+        g.query_stats = stats
+        g.query_stats_token = _current.set(stats)
+
+    @app.after_request
+    def _add_query_headers(response):
+        stats = g.get('query_stats')
+        if stats is not None and with_headers:
+            response.headers['X-DB-Queries'] = str(stats.count)
+            response.headers['X-DB-Time'] = f"{stats.seconds * 1000:.1f}"
+        return response
+
+    @app.teardown_request
+    def _end_request_stats(exc):
+        token = g.pop('query_stats_token', None)
+        stats = g.pop('query_stats', None)
+        if token is not None:
+            _current.reset(token)
+        if stats is not None:
+            _finish(stats, endpoint=stats.label)
+
+
+@task_prerun.connect
+def _start_task_stats(task_id=None, task=None, **kwargs):
+    stats = QueryStats(getattr(task, 'name', 'task'), parent=_current.get())
+    _task_tokens[task_id] = (stats, _current.set(stats))
+
+
+@task_postrun.connect
+def _end_task_stats(task_id=None, **kwargs):
+    entry = _task_tokens.pop(task_id, None)
+    if entry is None:
+        return
+    stats, token = entry
+    try:
+        _current.reset(token)
+    except ValueError:
+        _current.set(stats.parent) # Reset from a different context (shouldn't happen in workers)
+    _finish(stats, task=stats.label)
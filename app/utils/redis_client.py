@@ -0,0 +1,33 @@
+"""
+Shared Redis connection for caches. Redis is optional: when CACHE_REDIS_URL is
+unset, get_redis() returns None and callers fall back to memory/database.
+"""
+from flask import current_app
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def get_redis():
+    """Redis client for CACHE_REDIS_URL, or None if caching in Redis is disabled."""
+    url = current_app.config.get('CACHE_REDIS_URL')
+    if not url:
+        return None
+    client = _clients.get(url)
+    if client is not None:
+        return client
+    with _lock:
+        if url not in _clients:
+            import redis
+            timeout = float(current_app.config.get('CACHE_REDIS_TIMEOUT', 0.5))
+            _clients[url] = redis.Redis.from_url(
+                url,
+                socket_timeout=timeout,
+                socket_connect_timeout=timeout,
+                decode_responses=True
+            )
+        return _clients[url]
@@ -1,6 +1,37 @@
 
+from flask import current_app, has_app_context
 import re
 
+_PHONE_FORMATTING = re.compile(r"[\s\-().]")
+
+def normalize_phone(phone, default_country_code=None):
+    """
+    Best-effort E.164 normalization: strips formatting, turns a leading 00 into +,
+    and prefixes `default_country_code` to 10-digit national numbers (dropping a
+    trunk 0). Numbers it can't interpret are returned with formatting stripped.
+    """
+    if not phone:
+        return phone
+    cleaned = _PHONE_FORMATTING.sub("", phone.strip())
+    if cleaned.startswith("00"):
+        cleaned = "+" + cleaned[2:]
+    if cleaned.startswith("+"):
+        return "+" + re.sub(r"\D", "", cleaned)
+    if not cleaned.isdigit() or not default_country_code:
+        return cleaned
+
+    national = cleaned.lstrip("0")
+    if len(national) == 10:
+        return f"+{default_country_code}{national}"
+    if national.startswith(default_country_code) and len(national) == len(default_country_code) + 10:
+        return f"+{national}"
+    return cleaned
+
+def to_e164(phone):
+    """normalize_phone() with the configured DEFAULT_PHONE_COUNTRY_CODE."""
+    country_code = current_app.config.get('DEFAULT_PHONE_COUNTRY_CODE') if has_app_context() else None
+    return normalize_phone(phone, country_code)
+
 def validate_phone(phone):
     """
     Basic E.164 validation.
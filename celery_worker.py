@@ -1,4 +1,75 @@
+"""
+Celery worker entry point.
+
+    celery -A celery_worker.celery worker -Q sos        # plain Celery CLI still works
+    python celery_worker.py --queue sos                 # dedicated SOS worker
+    python celery_worker.py --queue ingest --queue ml   # background worker
+    python celery_worker.py --beat                      # scheduler only
+
+`--queue` applies the concurrency and prefetch settings from CELERY_WORKER_QUEUES,
+so SOS tasks get their own worker pool and never wait behind bulk work.
+"""
 from app import create_app
+import argparse
 
 app = create_app()
 celery = app.extensions["celery"]
+
+
+def _worker_argv(queues, loglevel):
+    settings = [app.config['CELERY_WORKER_QUEUES'][q] for q in queues]
+    concurrency = sum(s['concurrency'] for s in settings)
+    # Shared worker: the most latency-sensitive queue decides the prefetch
+    prefetch = min(s['prefetch_multiplier'] for s in settings)
+    return [
+        'worker',
+        f'--queues={",".join(queues)}',
+        f'--concurrency={concurrency}',
+        f'--prefetch-multiplier={prefetch}',
+        f'--hostname={"-".join(queues)}@%h',
+        f'--loglevel={loglevel}',
+    ]
+
+
+def _serve_metrics(port):
+    """Expose this worker's metrics (queue wait, breakers) for Prometheus."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from app.utils.metrics import render_prometheus
+    import threading
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = render_prometheus().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('0.0.0.0', port), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+
+if __name__ == '__main__':
+    queue_names = sorted(app.config['CELERY_WORKER_QUEUES'])
+    parser = argparse.ArgumentParser(description='Start a Celery worker or beat scheduler.')
+    parser.add_argument('--queue', action='append', choices=queue_names,
+                        help='Queue to consume (repeatable). Defaults to all queues.')
+    parser.add_argument('--beat', action='store_true', help='Run the beat scheduler instead of a worker.')
+    parser.add_argument('--metrics-port', type=int, help='Serve /metrics for this worker on the given port.')
+    parser.add_argument('--loglevel', default='info')
+    args = parser.parse_args()
+
+    if args.beat:
+        celery.start(['beat', f'--loglevel={args.loglevel}'])
+    else:
+        if args.metrics_port:
+            # Threads pool so the metrics registry is shared with the tasks
+            _serve_metrics(args.metrics_port)
+        argv = _worker_argv(args.queue or queue_names, args.loglevel)
+        if args.metrics_port:
+            argv.append('--pool=threads')
+        celery.worker_main(argv)
@@ -0,0 +1,68 @@
+"""Normalize stored phone numbers to E.164 and index trusted_contacts(user_id, phone)
+
+Revision ID: a5d2f7c9e1b3
+Revises: f3c6a1d8b5e4
+Create Date: 2026-10-19 17:05:41.362910
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import os
+import re
+
+
+# revision identifiers, used by Alembic.
+revision = 'a5d2f7c9e1b3'
+down_revision = 'f3c6a1d8b5e4'
+branch_labels = None
+depends_on = None
+
+
+def normalize_phone(phone, default_country_code):
+    # Frozen copy of app.utils.validators.normalize_phone as of this revision
+    cleaned = re.sub(r"[\s\-().]", "", phone.strip())
+    if cleaned.startswith("00"):
+        cleaned = "+" + cleaned[2:]
+    if cleaned.startswith("+"):
+        return "+" + re.sub(r"\D", "", cleaned)
+    if not cleaned.isdigit() or not default_country_code:
+        return cleaned
+    national = cleaned.lstrip("0")
+    if len(national) == 10:
+        return f"+{default_country_code}{national}"
+    if national.startswith(default_country_code) and len(national) == len(default_country_code) + 10:
+        return f"+{national}"
+    return cleaned
+
+
+def _normalized(connection, table):
+    country_code = os.environ.get('DEFAULT_PHONE_COUNTRY_CODE', '91')
+    rows = connection.execute(sa.text(f"SELECT id, phone FROM {table} WHERE phone IS NOT NULL")).fetchall()
+    for row_id, phone in rows:
+        normalized = normalize_phone(phone, country_code)
+        if normalized != phone:
+            yield row_id, phone, normalized
+
+
+def upgrade():
+    connection = op.get_bind()
+
+    for row_id, _, phone in _normalized(connection, 'trusted_contacts'):
+        connection.execute(sa.text("UPDATE trusted_contacts SET phone = :phone WHERE id = :id"), {'phone': phone, 'id': row_id})
+
+    # users.phone is unique: leave a number alone if its normalized form is already taken
+    for row_id, original, phone in _normalized(connection, 'users'):
+        taken = connection.execute(sa.text("SELECT 1 FROM users WHERE phone = :phone AND id != :id"), {'phone': phone, 'id': row_id}).first()
+        if taken:
+            print(f"Skipping phone normalization for user {row_id}: {phone} already in use (was {original})")
+            continue
+        connection.execute(sa.text("UPDATE users SET phone = :phone WHERE id = :id"), {'phone': phone, 'id': row_id})
+
+    with op.batch_alter_table('trusted_contacts', schema=None) as batch_op:
+        batch_op.create_index('ix_trusted_contacts_user_phone', ['user_id', 'phone'], unique=False)
+
+
+def downgrade():
+    # Normalized numbers are kept: the original formatting isn't recoverable
+    with op.batch_alter_table('trusted_contacts', schema=None) as batch_op:
+        batch_op.drop_index('ix_trusted_contacts_user_phone')
@@ -0,0 +1,50 @@
+"""Add notification_outbox table
+
+Revision ID: b3c1d9e4a7f2
+Revises: 6ae25ed0c87d
+Create Date: 2026-10-19 09:12:41.208311
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3c1d9e4a7f2'
+down_revision = '6ae25ed0c87d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('notification_outbox',
+    sa.Column('id', sa.String(length=36), nullable=False),
+    sa.Column('alert_id', sa.String(length=36), nullable=False),
+    sa.Column('channel', sa.Enum('sms', 'whatsapp', 'push', 'email', name='notification_channel_enum'), nullable=False),
+    sa.Column('recipient', sa.String(length=255), nullable=False),
+    sa.Column('body', sa.Text(), nullable=False),
+    sa.Column('status', sa.Enum('pending', 'processing', 'sent', 'failed', name='notification_status_enum'), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('last_error', sa.String(length=500), nullable=True),
+    sa.Column('provider_message_id', sa.String(length=100), nullable=True),
+    sa.Column('latency_ms', sa.Float(), nullable=True),
+    sa.Column('next_attempt_at', sa.DateTime(), nullable=True),
+    sa.Column('claimed_at', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('sent_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['alert_id'], ['sos_alerts.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('notification_outbox', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_notification_outbox_alert_id'), ['alert_id'], unique=False)
+        batch_op.create_index('ix_notification_outbox_status_next_attempt', ['status', 'next_attempt_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('notification_outbox', schema=None) as batch_op:
+        batch_op.drop_index('ix_notification_outbox_status_next_attempt')
+        batch_op.drop_index(batch_op.f('ix_notification_outbox_alert_id'))
+
+    op.drop_table('notification_outbox')
+    sa.Enum(name='notification_status_enum').drop(op.get_bind(), checkfirst=True)
+    sa.Enum(name='notification_channel_enum').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,49 @@
+"""Add geofences (safe zones) and the 'geofence' SOS trigger type
+
+Revision ID: b7e3c9f2a4d6
+Revises: a5d2f7c9e1b3
+Create Date: 2026-10-19 18:12:26.540318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e3c9f2a4d6'
+down_revision = 'a5d2f7c9e1b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('geofences',
+    sa.Column('id', sa.String(length=36), nullable=False),
+    sa.Column('user_id', sa.String(length=36), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('latitude', sa.Float(), nullable=False),
+    sa.Column('longitude', sa.Float(), nullable=False),
+    sa.Column('radius_m', sa.Float(), nullable=False),
+    sa.Column('notify_on', sa.Enum('exit', 'enter', 'both', name='geofence_notify_enum'), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=False),
+    sa.Column('is_inside', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('geofences', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_geofences_user_id'), ['user_id'], unique=False)
+
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.execute("ALTER TYPE trigger_type_enum ADD VALUE IF NOT EXISTS 'geofence'")
+
+
+def downgrade():
+    # The 'geofence' enum value is left in place: PostgreSQL can't drop enum values
+    with op.batch_alter_table('geofences', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_geofences_user_id'))
+
+    op.drop_table('geofences')
+    sa.Enum(name='geofence_notify_enum').drop(op.get_bind(), checkfirst=True)
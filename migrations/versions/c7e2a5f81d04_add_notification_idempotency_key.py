@@ -0,0 +1,54 @@
+"""Add idempotency key to notification_outbox and sensor trigger types
+
+Revision ID: c7e2a5f81d04
+Revises: b3c1d9e4a7f2
+Create Date: 2026-10-19 11:03:17.554902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7e2a5f81d04'
+down_revision = 'b3c1d9e4a7f2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Drop duplicates left by repeated dispatches. Keep the row with the most
+    # progress (sent, then in flight, then pending, then failed), then the
+    # oldest. ids are random uuid4s, so they only break exact ties.
+    op.execute("""
+        DELETE FROM notification_outbox
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY alert_id, recipient, channel
+                    ORDER BY CASE status
+                                 WHEN 'sent' THEN 0
+                                 WHEN 'processing' THEN 1
+                                 WHEN 'pending' THEN 2
+                                 ELSE 3
+                             END,
+                             created_at, id
+                ) AS position
+                FROM notification_outbox
+            ) ranked
+            WHERE position > 1
+        )
+    """)
+    with op.batch_alter_table('notification_outbox', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_notification_outbox_alert_recipient_channel', ['alert_id', 'recipient', 'channel'])
+
+    # Sensor auto-triggers use these trigger types
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for value in ('auto_accelerometer', 'auto_gyroscope', 'auto_sensor_window'):
+                op.execute(f"ALTER TYPE trigger_type_enum ADD VALUE IF NOT EXISTS '{value}'")
+
+
+def downgrade():
+    with op.batch_alter_table('notification_outbox', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_notification_outbox_alert_recipient_channel', type_='unique')
@@ -0,0 +1,37 @@
+"""Add tracking_sessions for public live-location links
+
+Revision ID: c9f4b2e6d8a1
+Revises: b7e3c9f2a4d6
+Create Date: 2026-10-19 19:03:47.215904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c9f4b2e6d8a1'
+down_revision = 'b7e3c9f2a4d6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('tracking_sessions',
+    sa.Column('id', sa.String(length=36), nullable=False),
+    sa.Column('user_id', sa.String(length=36), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.Column('ended_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('tracking_sessions', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_tracking_sessions_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('tracking_sessions', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_tracking_sessions_user_id'))
+
+    op.drop_table('tracking_sessions')
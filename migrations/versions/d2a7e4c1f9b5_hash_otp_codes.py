@@ -0,0 +1,42 @@
+"""Store OTP codes hashed and index otp_records lookups
+
+Revision ID: d2a7e4c1f9b5
+Revises: c9f4b2e6d8a1
+Create Date: 2026-10-19 20:11:05.634182
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a7e4c1f9b5'
+down_revision = 'c9f4b2e6d8a1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Outstanding codes are plaintext and can't be checked against hashes; they
+    # expire within minutes anyway, so users simply request a new one.
+    op.execute("DELETE FROM otp_records")
+    with op.batch_alter_table('otp_records', schema=None) as batch_op:
+        batch_op.alter_column('otp_code',
+               existing_type=sa.String(length=6),
+               type_=sa.String(length=64),
+               existing_nullable=False)
+        batch_op.create_index('ix_otp_records_phone_purpose', ['phone', 'purpose'], unique=False)
+        batch_op.create_index('ix_otp_records_email_purpose', ['email', 'purpose'], unique=False)
+        batch_op.create_index('ix_otp_records_expires_at', ['expires_at'], unique=False)
+
+
+def downgrade():
+    op.execute("DELETE FROM otp_records")
+    with op.batch_alter_table('otp_records', schema=None) as batch_op:
+        batch_op.drop_index('ix_otp_records_expires_at')
+        batch_op.drop_index('ix_otp_records_email_purpose')
+        batch_op.drop_index('ix_otp_records_phone_purpose')
+        batch_op.alter_column('otp_code',
+               existing_type=sa.String(length=64),
+               type_=sa.String(length=6),
+               existing_nullable=False)
@@ -0,0 +1,29 @@
+"""Partial index on sos_alerts(user_id) for live countdowns
+
+Revision ID: d4a9e3b7f1c2
+Revises: c7e2a5f81d04
+Create Date: 2026-10-19 13:42:08.118230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4a9e3b7f1c2'
+down_revision = 'c7e2a5f81d04'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Countdowns already stuck are expired by the first sweeper run
+    op.create_index(
+        'ix_sos_alerts_user_countdown', 'sos_alerts', ['user_id'],
+        postgresql_where=sa.text("status = 'countdown'"),
+        sqlite_where=sa.text("status = 'countdown'")
+    )
+
+
+def downgrade():
+    op.drop_index('ix_sos_alerts_user_countdown', table_name='sos_alerts')
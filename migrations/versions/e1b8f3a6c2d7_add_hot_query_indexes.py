@@ -0,0 +1,56 @@
+"""Indexes for hot service queries (see `flask explain-audit`)
+
+Revision ID: e1b8f3a6c2d7
+Revises: d2a7e4c1f9b5
+Create Date: 2026-10-19 21:26:40.471903
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1b8f3a6c2d7'
+down_revision = 'd2a7e4c1f9b5'
+branch_labels = None
+depends_on = None
+
+# (name, table, columns)
+INDEXES = [
+    ('ix_sos_alerts_user_triggered', 'sos_alerts', ['user_id', 'triggered_at']),
+    ('ix_connected_devices_device_mac', 'connected_devices', ['device_mac']),
+    ('ix_connected_devices_user_last_seen', 'connected_devices', ['user_id', 'last_seen']),
+    ('ix_sensor_training_data_user_type_ts', 'sensor_training_data', ['user_id', 'sensor_type', 'timestamp']),
+    ('ix_ml_models_active_created', 'ml_models', ['is_active', 'created_at']),
+    ('ix_support_tickets_user_created', 'support_tickets', ['user_id', 'created_at']),
+]
+
+# Only rows the hot query can match
+# (name, table, columns, PostgreSQL predicate, SQLite predicate), as declared on the models
+PARTIAL_INDEXES = [
+    ('ix_sos_alerts_countdown_triggered', 'sos_alerts', ['triggered_at'], "status = 'countdown'", "status = 'countdown'"),
+    ('ix_otp_records_phone_lookup', 'otp_records', ['phone', 'purpose', 'created_at'], 'is_used IS false', 'is_used IS 0'),
+    ('ix_otp_records_email_lookup', 'otp_records', ['email', 'purpose', 'created_at'], 'is_used IS false', 'is_used IS 0'),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+    for name, table, columns, pg_predicate, sqlite_predicate in PARTIAL_INDEXES:
+        op.create_index(name, table, columns, unique=False,
+                        postgresql_where=sa.text(pg_predicate), sqlite_where=sa.text(sqlite_predicate))
+
+    # Superseded by the *_lookup indexes, which also cover is_used and the ORDER BY
+    op.drop_index('ix_otp_records_phone_purpose', table_name='otp_records')
+    op.drop_index('ix_otp_records_email_purpose', table_name='otp_records')
+
+
+def downgrade():
+    op.create_index('ix_otp_records_email_purpose', 'otp_records', ['email', 'purpose'], unique=False)
+    op.create_index('ix_otp_records_phone_purpose', 'otp_records', ['phone', 'purpose'], unique=False)
+
+    for name, table, *_ in reversed(PARTIAL_INDEXES):
+        op.drop_index(name, table_name=table)
+    for name, table, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
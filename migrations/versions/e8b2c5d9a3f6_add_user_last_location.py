@@ -0,0 +1,54 @@
+"""Add user_last_location and a (user_id, recorded_at) index on location_history
+
+Revision ID: e8b2c5d9a3f6
+Revises: d4a9e3b7f1c2
+Create Date: 2026-10-19 14:27:53.604117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8b2c5d9a3f6'
+down_revision = 'd4a9e3b7f1c2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_last_location',
+    sa.Column('user_id', sa.String(length=36), nullable=False),
+    sa.Column('latitude', sa.Float(), nullable=False),
+    sa.Column('longitude', sa.Float(), nullable=False),
+    sa.Column('address', sa.String(length=500), nullable=True),
+    sa.Column('accuracy', sa.Float(), nullable=True),
+    sa.Column('is_sharing', sa.Boolean(), nullable=False),
+    sa.Column('recorded_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    with op.batch_alter_table('location_history', schema=None) as batch_op:
+        batch_op.create_index('ix_location_history_user_recorded', ['user_id', 'recorded_at'], unique=False)
+
+    # Backfill each user's latest point (ties broken by id)
+    op.execute("""
+        INSERT INTO user_last_location (user_id, latitude, longitude, address, accuracy, is_sharing, recorded_at, updated_at)
+        SELECT lh.user_id, lh.latitude, lh.longitude, lh.address, lh.accuracy,
+               COALESCE(lh.is_sharing, false), lh.recorded_at, lh.recorded_at
+        FROM location_history lh
+        WHERE NOT EXISTS (
+            SELECT 1 FROM location_history newer
+            WHERE newer.user_id = lh.user_id
+              AND (newer.recorded_at > lh.recorded_at
+                   OR (newer.recorded_at = lh.recorded_at AND newer.id > lh.id))
+        )
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('location_history', schema=None) as batch_op:
+        batch_op.drop_index('ix_location_history_user_recorded')
+
+    op.drop_table('user_last_location')
@@ -0,0 +1,108 @@
+"""Monthly partitions for location_history and a daily rollup table
+
+Revision ID: f3c6a1d8b5e4
+Revises: e8b2c5d9a3f6
+Create Date: 2026-10-19 15:48:36.291774
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from datetime import date, datetime
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3c6a1d8b5e4'
+down_revision = 'e8b2c5d9a3f6'
+branch_labels = None
+depends_on = None
+
+MONTHS_AHEAD = 3
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def upgrade():
+    op.create_table('location_daily_rollup',
+    sa.Column('user_id', sa.String(length=36), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('point_count', sa.Integer(), nullable=False),
+    sa.Column('min_latitude', sa.Float(), nullable=False),
+    sa.Column('max_latitude', sa.Float(), nullable=False),
+    sa.Column('min_longitude', sa.Float(), nullable=False),
+    sa.Column('max_longitude', sa.Float(), nullable=False),
+    sa.Column('distance_m', sa.Float(), nullable=False),
+    sa.Column('first_recorded_at', sa.DateTime(), nullable=False),
+    sa.Column('last_recorded_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'day')
+    )
+
+    # Range partitioning is PostgreSQL only; SQLite keeps the plain table
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+
+    op.execute("ALTER TABLE location_history RENAME TO location_history_legacy")
+    op.execute("ALTER INDEX ix_location_history_user_recorded RENAME TO ix_location_history_legacy_user_recorded")
+    op.execute("""
+        CREATE TABLE location_history (
+            id VARCHAR(36) NOT NULL,
+            user_id VARCHAR(36) NOT NULL REFERENCES users (id),
+            latitude FLOAT NOT NULL,
+            longitude FLOAT NOT NULL,
+            address VARCHAR(500),
+            accuracy FLOAT,
+            is_sharing BOOLEAN,
+            recorded_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            -- The partition key has to be part of the primary key
+            PRIMARY KEY (id, recorded_at)
+        ) PARTITION BY RANGE (recorded_at)
+    """)
+    op.execute("CREATE INDEX ix_location_history_user_recorded ON location_history (user_id, recorded_at)")
+
+    oldest = bind.execute(sa.text("SELECT MIN(recorded_at) FROM location_history_legacy")).scalar()
+    current = date(datetime.utcnow().year, datetime.utcnow().month, 1)
+    month = date(oldest.year, oldest.month, 1) if oldest else current
+    while month <= _add_months(current, MONTHS_AHEAD):
+        name = f"location_history_y{month.year:04d}m{month.month:02d}"
+        op.execute(
+            f"CREATE TABLE {name} PARTITION OF location_history "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+        )
+        month = _add_months(month, 1)
+    # Catches points outside every monthly partition (not created yet, or long
+    # gone), so an insert never fails for want of a partition
+    op.execute("CREATE TABLE location_history_default PARTITION OF location_history DEFAULT")
+
+    op.execute("""
+        INSERT INTO location_history (id, user_id, latitude, longitude, address, accuracy, is_sharing, recorded_at)
+        SELECT id, user_id, latitude, longitude, address, accuracy, is_sharing, recorded_at
+        FROM location_history_legacy
+    """)
+    op.execute("DROP TABLE location_history_legacy")
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute("""
+            CREATE TABLE location_history_plain (
+                id VARCHAR(36) NOT NULL PRIMARY KEY,
+                user_id VARCHAR(36) NOT NULL REFERENCES users (id),
+                latitude FLOAT NOT NULL,
+                longitude FLOAT NOT NULL,
+                address VARCHAR(500),
+                accuracy FLOAT,
+                is_sharing BOOLEAN,
+                recorded_at TIMESTAMP WITHOUT TIME ZONE NOT NULL
+            )
+        """)
+        op.execute("INSERT INTO location_history_plain SELECT id, user_id, latitude, longitude, address, accuracy, is_sharing, recorded_at FROM location_history")
+        op.execute("DROP TABLE location_history CASCADE")
+        op.execute("ALTER TABLE location_history_plain RENAME TO location_history")
+        op.execute("CREATE INDEX ix_location_history_user_recorded ON location_history (user_id, recorded_at)")
+
+    op.drop_table('location_daily_rollup')
@@ -0,0 +1,79 @@
+"""
+Geofence lookup cost: linear scan vs. GridIndex, with 100k zones.
+
+Zones are circles (100 m - 2 km radius) scattered over a ~70 km square around
+Bangalore. Reports lookups per second for:
+  - "scan all zones": a distance check against every zone on each ping
+  - "grid index": one shared grid over all zones (worst case: every zone in
+    one city, so busy cells hold hundreds of overlapping zones)
+  - "per-user grid": how geofence_service indexes them, one grid per user
+    with MAX_GEOFENCES_PER_USER (20) zones each
+
+    python scripts/bench_geofence.py [ZONES] [PINGS]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.geo import GridIndex, haversine_m
+
+CENTRE = (12.9716, 77.5946)
+SPREAD_DEG = 0.3
+
+
+def _random_point(rng):
+    return CENTRE[0] + rng.uniform(-SPREAD_DEG, SPREAD_DEG), CENTRE[1] + rng.uniform(-SPREAD_DEG, SPREAD_DEG)
+
+
+def main():
+    zone_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    ping_count = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    rng = random.Random(42)
+
+    zones = [(i, *_random_point(rng), rng.uniform(100, 2000)) for i in range(zone_count)]
+    pings = [_random_point(rng) for _ in range(ping_count)]
+
+    started = time.perf_counter()
+    grid = GridIndex(cell_deg=0.01)
+    for key, lat, lng, radius_m in zones:
+        grid.add(key, lat, lng, radius_m)
+    build = time.perf_counter() - started
+
+    started = time.perf_counter()
+    grid_hits = [grid.containing(lat, lng) for lat, lng in pings]
+    grid_rate = ping_count / (time.perf_counter() - started)
+
+    # The scan is ~5 orders of magnitude slower: time a sample of pings
+    sample = pings[:max(1, min(ping_count, 50))]
+    started = time.perf_counter()
+    scan_hits = [
+        [key for key, z_lat, z_lng, radius_m in zones if haversine_m(lat, lng, z_lat, z_lng) <= radius_m]
+        for lat, lng in sample
+    ]
+    scan_rate = len(sample) / (time.perf_counter() - started)
+
+    per_user = 20
+    user_grids = {}
+    for key, lat, lng, radius_m in zones:
+        user_grids.setdefault(key // per_user, GridIndex(cell_deg=0.01)).add(key, lat, lng, radius_m)
+    users = [rng.randrange(len(user_grids)) for _ in pings]
+    started = time.perf_counter()
+    for user, (lat, lng) in zip(users, pings):
+        user_grids[user].containing(lat, lng)
+    user_rate = ping_count / (time.perf_counter() - started)
+
+    assert [sorted(hits) for hits in scan_hits] == [sorted(hits) for hits in grid_hits[:len(sample)]]
+    candidates = sum(len(grid.candidates(lat, lng)) for lat, lng in pings) / ping_count
+
+    print(f"📊 {zone_count} zones, {ping_count} pings (index built in {build:.2f}s)")
+    print(f"   scan all zones : {scan_rate:12.1f} lookups/s")
+    print(f"   grid index     : {grid_rate:12.1f} lookups/s ({candidates:.1f} candidates per ping)")
+    print(f"   per-user grid  : {user_rate:12.1f} lookups/s ({len(user_grids)} users x {per_user} zones)")
+    print(f"   speed-up       : {grid_rate / scan_rate:12.0f}x shared grid, {user_rate / scan_rate:.0f}x per-user grid")
+
+
+if __name__ == '__main__':
+    main()
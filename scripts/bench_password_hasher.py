@@ -0,0 +1,82 @@
+"""
+Event-loop stall during a login burst: inline bcrypt vs. password_hasher.
+
+Runs under eventlet, like the production gunicorn worker. A ticker greenlet
+wakes every 5 ms and records how late it was. Meanwhile N concurrent "logins"
+each verify a bcrypt hash, first with bcrypt.checkpw inline (the old
+login_email) and then through password_hasher.verify_password (eventlet.tpool).
+The worst lateness is how long every other connection was frozen.
+
+    python scripts/bench_password_hasher.py [LOGINS] [ROUNDS]
+"""
+import eventlet
+eventlet.monkey_patch()
+
+import os
+import sys
+import time
+
+os.environ.setdefault('FLASK_TESTING', 'True')
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bcrypt
+from app import create_app
+from app.config import Config
+from app.services.password_hasher import verify_password
+
+TICK = 0.005
+
+
+class BenchConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+
+
+def _burst(app, logins, verify):
+    lateness = []
+    done = []
+
+    def ticker():
+        while not done:
+            started = time.perf_counter()
+            eventlet.sleep(TICK)
+            lateness.append(time.perf_counter() - started - TICK)
+
+    def login():
+        with app.app_context():
+            verify()
+
+    tick = eventlet.spawn(ticker)
+    eventlet.sleep(0)
+    started = time.perf_counter()
+    pool = eventlet.GreenPool(logins)
+    for _ in range(logins):
+        pool.spawn(login)
+    pool.waitall()
+    elapsed = time.perf_counter() - started
+    done.append(True)
+    tick.wait()
+
+    lateness.sort()
+    return elapsed, lateness[-1] * 1000, lateness[int(len(lateness) * 0.99) - 1] * 1000
+
+
+def main():
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 12
+    app = create_app(BenchConfig)
+    app.config['BCRYPT_ROUNDS'] = rounds
+    password = b'correct horse battery staple'
+    hashed = bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+    inline = _burst(app, logins, lambda: bcrypt.checkpw(password, hashed))
+    offloaded = _burst(app, logins, lambda: verify_password(password.decode(), hashed.decode()))
+
+    print(f"📊 {logins} concurrent logins, bcrypt cost {rounds}")
+    print(f"   {'':18} {'wall':>8} {'max stall':>11} {'p99 stall':>11}")
+    for label, (elapsed, worst, p99) in (("inline checkpw", inline), ("password_hasher", offloaded)):
+        print(f"   {label:18} {elapsed:7.2f}s {worst:9.1f}ms {p99:9.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Socket event throughput: per-event JWT decoding vs. per-connection identity.
+
+Sends N `location_update` events through the Flask-SocketIO test client and
+reports events per second for:
+  - "decode per event": what the handler used to do (decode_token on every event)
+  - "session identity": the current handler (token verified once on connect)
+
+Location writes are stubbed out so only socket dispatch and auth are measured.
+
+    python scripts/bench_socket_auth.py [N]
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault('FLASK_TESTING', 'True')
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.config import Config
+from app.extensions import socketio
+from app.sockets import location_socket
+from flask_jwt_extended import create_access_token, decode_token
+
+
+class BenchConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SOCKETIO_MESSAGE_QUEUE = None
+
+
+def _run(app, token, count, per_event_decode):
+    sio = socketio.test_client(app, namespace='/location', auth={'token': token})
+    payload = {'latitude': 12.97, 'longitude': 77.59, 'token': token}
+
+    started = time.perf_counter()
+    for _ in range(count):
+        if per_event_decode:
+            decode_token(token) # The old handler's cost on every event
+        sio.emit('location_update', payload, namespace='/location')
+    elapsed = time.perf_counter() - started
+
+    sio.disconnect(namespace='/location')
+    return count / elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+        token = create_access_token(identity='bench-user')
+
+        # Measure dispatch + auth only
+        location_socket.update_location = lambda *args, **kwargs: None
+
+        _run(app, token, 200, False) # warm up
+        before = _run(app, token, count, True)
+        after = _run(app, token, count, False)
+
+    print(f"📊 {count} location_update events")
+    print(f"   decode per event : {before:10.0f} events/s")
+    print(f"   session identity : {after:10.0f} events/s")
+    print(f"   speed-up         : {after / before:10.2f}x")
+
+
+if __name__ == '__main__':
+    main()
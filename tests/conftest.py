@@ -1,6 +1,7 @@
 import pytest
 import json
 import os
+from contextlib import contextmanager
 
 # Set testing environment before importing app to avoid eventlet issues
 os.environ['FLASK_TESTING'] = 'True'
@@ -12,8 +13,13 @@ class TestConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
-    CELERY = {'task_always_eager': True} # Use eager mode for tests
+    CELERY = dict(Config.CELERY, task_always_eager=True) # Use eager mode for tests, keep queue routing
     MAIL_SUPPRESS_SEND = True
+    NOTIFICATION_DELIVERY_MODE = 'inline' # Deliver outbox rows within the request
+    LOCATION_FLUSH_INTERVAL = 0 # Write location points within the request
+    BCRYPT_ROUNDS = 4 # Cheapest cost bcrypt allows
+    OTP_BACKEND = 'memory'
+    SQL_QUERY_HEADERS = True
 
 @pytest.fixture
 def app():
@@ -25,6 +31,19 @@ def app():
         db.session.remove()
         db.drop_all()
 
+@pytest.fixture
+def query_budget():
+    """`with query_budget(n): ...` fails if the block runs more than n SQL statements."""
+    from app.utils.query_stats import track_queries
+
+    @contextmanager
+    def budget(max_queries):
+        with track_queries('query_budget') as stats:
+            yield stats
+        listing = '\n'.join(stats.statements)
+        assert stats.count <= max_queries, f"{stats.count} queries (budget {max_queries}):\n{listing}"
+    return budget
+
 @pytest.fixture
 def client(app):
     return app.test_client()
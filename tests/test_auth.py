@@ -40,3 +40,81 @@ def test_health_check(client):
     assert response.status_code == 200
     data = json.loads(response.data)
     assert data['status'] == 'healthy'
+
+def test_password_hash_uses_configured_cost(client, app):
+    from app.models.user import User
+    client.post('/api/auth/register/email', json={
+        "email": "cost@example.com", "password": "password123", "full_name": "Cost User", "country": "India"
+    })
+    user = User.query.filter_by(email="cost@example.com").first()
+    assert user.password_hash.startswith("$2b$04$")
+
+def test_login_rehashes_when_cost_changes(client, app):
+    from app.models.user import User
+    client.post('/api/auth/register/email', json={
+        "email": "rehash@example.com", "password": "password123", "full_name": "Rehash User", "country": "India"
+    })
+    old_hash = User.query.filter_by(email="rehash@example.com").first().password_hash
+
+    app.config['BCRYPT_ROUNDS'] = 5
+    response = client.post('/api/auth/login/email', json={"email": "rehash@example.com", "password": "password123"})
+    assert response.status_code == 200
+
+    new_hash = User.query.filter_by(email="rehash@example.com").first().password_hash
+    assert new_hash != old_hash and new_hash.startswith("$2b$05$")
+    # Still logs in with the upgraded hash
+    response = client.post('/api/auth/login/email', json={"email": "rehash@example.com", "password": "password123"})
+    assert response.status_code == 200
+
+def test_password_hashing_runs_off_the_request_thread(app, monkeypatch):
+    import threading
+    import bcrypt
+    from app.services import password_hasher
+
+    seen = []
+    real_hashpw = bcrypt.hashpw
+    def spy(*args):
+        seen.append(threading.current_thread().name)
+        return real_hashpw(*args)
+
+    monkeypatch.setattr(password_hasher.bcrypt, 'hashpw', spy)
+    password_hash = password_hasher.hash_password("secret1")
+    assert seen and seen[0].startswith("password-hasher")
+    assert password_hasher.verify_password("secret1", password_hash)
+    assert not password_hasher.verify_password("secret2", password_hash)
+    assert not password_hasher.verify_password("secret1", "not-a-bcrypt-hash")
+
+def _login(client, email):
+    client.post('/api/auth/register/email', json={
+        "email": email, "password": "password123", "full_name": "Logout User", "country": "India"
+    })
+    data = client.post('/api/auth/login/email', json={"email": email, "password": "password123"}).get_json()['data']
+    return data['access_token'], data['refresh_token']
+
+def test_logout_revokes_access_and_refresh_tokens(client):
+    access, refresh = _login(client, "logout@example.com")
+    other_access, _ = _login(client, "logout@example.com")
+
+    response = client.post('/api/auth/logout', headers={'Authorization': f'Bearer {access}'}, json={"refresh_token": refresh})
+    assert response.status_code == 200
+
+    response = client.get('/api/auth/validate', headers={'Authorization': f'Bearer {access}'})
+    assert response.status_code == 401
+    assert response.get_json()['error']['code'] == 'TOKEN_REVOKED'
+    assert client.post('/api/auth/refresh', headers={'Authorization': f'Bearer {refresh}'}).status_code == 401
+    # Other sessions are untouched
+    assert client.get('/api/auth/validate', headers={'Authorization': f'Bearer {other_access}'}).status_code == 200
+
+def test_blocklist_filter_answers_without_the_store(app):
+    from app.services import token_blocklist
+    from app.utils import metrics
+    metrics.reset()
+
+    token_blocklist.revoke_token({'jti': 'revoked-jti', 'exp': 4102444800})
+    assert token_blocklist.is_token_revoked({'jti': 'revoked-jti'})
+    for i in range(200):
+        assert not token_blocklist.is_token_revoked({'jti': f'live-{i}'})
+    assert metrics.get_value('token_blocklist_checks_total', result='clear') >= 199
+    # Expired revocations are forgotten
+    token_blocklist.revoke_token({'jti': 'old-jti', 'exp': 1})
+    assert not token_blocklist.is_token_revoked({'jti': 'old-jti'})
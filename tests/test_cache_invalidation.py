@@ -0,0 +1,66 @@
+import json
+import queue
+import time
+from app.utils.cache import TTLCache
+from app.utils.cache_invalidation import CHANNEL, _Invalidator, register_cache
+
+
+class _Broker:
+    """Just enough of a Redis client for publish/subscribe between two workers."""
+    def __init__(self):
+        self.subscribers = []
+
+    def publish(self, channel, message):
+        for subscriber in self.subscribers:
+            subscriber.put({'type': 'message', 'channel': channel, 'data': message})
+
+    def pubsub(self, **kwargs):
+        broker = self
+        class _PubSub:
+            def __init__(self):
+                self.messages = queue.Queue()
+            def subscribe(self, channel):
+                assert channel == CHANNEL
+                broker.subscribers.append(self.messages)
+            def get_message(self, timeout=None):
+                try:
+                    return self.messages.get(timeout=timeout)
+                except queue.Empty:
+                    return None
+            def close(self):
+                broker.subscribers.remove(self.messages)
+        return _PubSub()
+
+
+def _wait(predicate, timeout=3.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_invalidation_reaches_other_workers():
+    class Worker:
+        def __init__(self, broker):
+            self.extensions = {'test_cache': TTLCache(), 'test_pairs': TTLCache()}
+            self.invalidator = _Invalidator(self, broker)
+
+    register_cache('test_cache')
+    register_cache('test_pairs', lambda cache, first: cache.discard_where(lambda key: key[0] == first))
+    broker = _Broker()
+    one, two = Worker(broker), Worker(broker)
+    assert _wait(lambda: one.invalidator.synced and two.invalidator.synced)
+
+    for worker in (one, two):
+        worker.extensions['test_cache'].set('user-1', 'stale')
+        worker.extensions['test_pairs'].set(('a', 'b'), True)
+        worker.extensions['test_pairs'].set(('c', 'b'), True)
+
+    one.invalidator.invalidate('test_cache', ('user-1',))
+    one.invalidator.invalidate('test_pairs', ('a',))
+    assert one.extensions['test_cache'].get('user-1') is None
+    assert _wait(lambda: two.extensions['test_cache'].get('user-1') is None)
+    assert _wait(lambda: two.extensions['test_pairs'].get(('a', 'b')) is None)
+    assert two.extensions['test_pairs'].get(('c', 'b')) is True
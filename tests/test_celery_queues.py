@@ -0,0 +1,30 @@
+import time
+from app.tasks.notification_tasks import deliver_notifications
+from app.utils import metrics
+
+
+def test_tasks_route_to_their_queue(app):
+    celery = app.extensions['celery']
+    router = celery.amqp.router
+
+    assert router.route({}, deliver_notifications.name)['queue'].name == 'sos'
+    assert router.route({}, 'ingest.flush_locations')['queue'].name == 'ingest'
+    assert router.route({}, 'ml.retrain')['queue'].name == 'ml'
+    # Anything unrouted lands on the bulk queue, never on sos
+    assert router.route({}, 'misc.cleanup')['queue'].name == 'notifications'
+
+
+def test_worker_settings_cover_every_queue(app):
+    queues = {q.name for q in app.config['CELERY']['task_queues']}
+    assert set(app.config['CELERY_WORKER_QUEUES']) == queues
+    assert app.config['CELERY_WORKER_QUEUES']['sos']['prefetch_multiplier'] == 1
+
+
+def test_queue_wait_is_recorded(app):
+    metrics.reset()
+    with app.app_context():
+        deliver_notifications.apply(headers={'enqueued_at': time.time() - 2})
+
+    wait = metrics.get_value('celery_queue_wait_seconds', queue='sos')
+    assert wait is not None and wait >= 2
+    assert metrics.get_value('celery_queue_wait_seconds_count', queue='sos') == 1
@@ -0,0 +1,195 @@
+import json
+import time
+import pytest
+from app.models.notification import NotificationOutbox
+from app.utils import metrics
+from app.utils.circuit_breaker import CircuitBreaker, CircuitOpenError, get_breaker, reset_breakers, OPEN, HALF_OPEN, CLOSED
+
+
+@pytest.fixture(autouse=True)
+def _fresh_breakers():
+    reset_breakers()
+    yield
+    reset_breakers()
+
+
+def _fail():
+    raise RuntimeError("provider down")
+
+
+def test_breaker_opens_on_failure_rate():
+    breaker = CircuitBreaker('test', failure_rate=0.5, min_calls=4, window_size=4, open_seconds=60)
+    for _ in range(4):
+        with pytest.raises(RuntimeError):
+            breaker.call(_fail)
+
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: "ok")
+    assert metrics.get_value('circuit_breaker_state', provider='test') == 2
+
+
+def test_breaker_opens_on_slow_calls(monkeypatch):
+    breaker = CircuitBreaker('slow', slow_call_seconds=0.0, slow_call_rate=0.5, min_calls=2, window_size=2)
+    breaker.call(lambda: "ok")
+    breaker.call(lambda: "ok")
+    assert breaker.state == OPEN
+
+
+def test_half_open_probe_closes_breaker():
+    breaker = CircuitBreaker('probe', min_calls=1, window_size=1, open_seconds=0.0, half_open_calls=1)
+    with pytest.raises(RuntimeError):
+        breaker.call(_fail)
+
+    # open_seconds=0 -> next check goes straight to half-open
+    assert breaker.state == HALF_OPEN
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == CLOSED
+
+
+def test_failed_probe_reopens_breaker():
+    breaker = CircuitBreaker('reprobe', min_calls=1, window_size=1, open_seconds=0.0, half_open_calls=1)
+    with pytest.raises(RuntimeError):
+        breaker.call(_fail)
+    with pytest.raises(RuntimeError):
+        breaker.call(_fail)
+    assert breaker._state == OPEN
+
+
+def test_open_sms_breaker_defers_and_routes_to_whatsapp(client, auth_header, monkeypatch):
+    """With SMS tripped, SOS still goes out on WhatsApp and SMS waits for the breaker."""
+    client.post('/api/contacts', headers=auth_header, json={"name": "Mom", "phone": "+1234567890"})
+    breaker = get_breaker('sms')
+    monkeypatch.setattr(breaker, '_state', OPEN)
+    monkeypatch.setattr(breaker, '_opened_at', time.monotonic())
+
+    class _FakeTwilio:
+        class messages:
+            @staticmethod
+            def create(**kwargs):
+                return type('Msg', (), {'sid': 'SM-fake'})()
+
+    from app.services import sms_service, whatsapp_service
+    monkeypatch.setattr(sms_service, 'get_twilio_client', lambda sid, token: _FakeTwilio)
+    monkeypatch.setattr(whatsapp_service, 'get_twilio_client', lambda sid, token: _FakeTwilio)
+    client.application.config.update(TWILIO_ACCOUNT_SID='AC123', TWILIO_AUTH_TOKEN='token', TWILIO_PHONE_NUMBER='+15550001111')
+
+    resp = client.post('/api/sos/trigger', headers=auth_header, json={"latitude": 1.0, "longitude": 2.0})
+    alert_id = json.loads(resp.data)['data']['alert_id']
+
+    rows = {r.channel: r for r in NotificationOutbox.query.filter_by(alert_id=alert_id)}
+    assert rows['sms'].status == 'pending'
+    assert rows['sms'].attempts == 0
+    assert rows['sms'].next_attempt_at is not None
+    # WhatsApp was queued already, so nothing new is rerouted
+    assert rows['whatsapp'].status == 'sent'
+    assert NotificationOutbox.query.filter_by(alert_id=alert_id).count() == 2
+
+
+def test_open_breaker_reroutes_to_a_channel_not_yet_queued(app, monkeypatch):
+    from app.extensions import db
+    from app.models.sos_alert import SOSAlert
+    from app.models.user import User
+    from app.services import whatsapp_service
+    from app.services.notification_service import deliver_pending, enqueue_notification
+
+    user = User(full_name='Solo', email='solo@example.com', auth_provider='email')
+    db.session.add(user)
+    db.session.flush()
+    alert = SOSAlert(user_id=user.id, trigger_type='manual', latitude=1.0, longitude=2.0,
+                     status='sent', sos_message='help', contacted_numbers=[])
+    db.session.add(alert)
+    enqueue_notification(alert, 'sms', '+1234567890', 'help')
+    db.session.commit()
+
+    breaker = get_breaker('sms')
+    monkeypatch.setattr(breaker, '_state', OPEN)
+    monkeypatch.setattr(breaker, '_opened_at', time.monotonic())
+    app.config.update(TWILIO_ACCOUNT_SID='AC123', TWILIO_AUTH_TOKEN='token', TWILIO_PHONE_NUMBER='+15550001111')
+    sent = []
+    monkeypatch.setattr(whatsapp_service, '_send_whatsapp_direct', lambda to, body: sent.append(to) or 'WA-1')
+
+    deliver_pending(alert_id=alert.id)
+
+    rows = {r.channel: r for r in NotificationOutbox.query.filter_by(alert_id=alert.id)}
+    assert rows['sms'].status == 'pending'
+    assert rows['whatsapp'].status == 'sent'
+    assert sent == ['+1234567890']
+
+
+def test_open_breaker_expedites_a_fallback_waiting_on_backoff(app, monkeypatch):
+    """The contact's WhatsApp row is backing off from an earlier failure. With SMS
+    tripped it is sent now instead of after its backoff."""
+    from datetime import datetime, timedelta
+    from app.extensions import db
+    from app.models.sos_alert import SOSAlert
+    from app.models.user import User
+    from app.services import whatsapp_service
+    from app.services.notification_service import deliver_pending, enqueue_notification
+
+    user = User(full_name='Solo', email='solo@example.com', auth_provider='email')
+    db.session.add(user)
+    db.session.flush()
+    alert = SOSAlert(user_id=user.id, trigger_type='manual', latitude=1.0, longitude=2.0,
+                     status='sent', sos_message='help', contacted_numbers=[])
+    db.session.add(alert)
+    enqueue_notification(alert, 'sms', '+1234567890', 'help')
+    whatsapp = enqueue_notification(alert, 'whatsapp', '+1234567890', 'help')
+    whatsapp.attempts = 1
+    whatsapp.next_attempt_at = datetime.utcnow() + timedelta(minutes=5)
+    db.session.commit()
+
+    breaker = get_breaker('sms')
+    monkeypatch.setattr(breaker, '_state', OPEN)
+    monkeypatch.setattr(breaker, '_opened_at', time.monotonic())
+    app.config.update(TWILIO_ACCOUNT_SID='AC123', TWILIO_AUTH_TOKEN='token', TWILIO_PHONE_NUMBER='+15550001111')
+    sent = []
+    monkeypatch.setattr(whatsapp_service, '_send_whatsapp_direct', lambda to, body: sent.append(to) or 'WA-1')
+
+    deliver_pending(alert_id=alert.id)
+
+    rows = {r.channel: r for r in NotificationOutbox.query.filter_by(alert_id=alert.id)}
+    assert rows['sms'].status == 'pending'
+    assert rows['whatsapp'].status == 'sent'
+    assert sent == ['+1234567890']
+    assert NotificationOutbox.query.filter_by(alert_id=alert.id).count() == 2
+
+
+def test_client_errors_do_not_open_the_breaker():
+    from twilio.base.exceptions import TwilioRestException
+
+    breaker = CircuitBreaker('client', failure_rate=0.5, min_calls=4, window_size=4, open_seconds=60)
+    def _bad_number():
+        raise TwilioRestException(400, '/Messages', msg='Invalid To number')
+    for _ in range(4):
+        with pytest.raises(TwilioRestException):
+            breaker.call(_bad_number)
+    assert breaker.state == CLOSED
+
+    def _twilio_down():
+        raise TwilioRestException(503, '/Messages', msg='Service unavailable')
+    # Two server errors in the window of four reach the 50% failure rate
+    for _ in range(2):
+        with pytest.raises(TwilioRestException):
+            breaker.call(_twilio_down)
+    assert breaker.state == OPEN
+
+
+def test_fcm_token_errors_do_not_open_the_breaker():
+    from firebase_admin import messaging
+    from app.services.fcm_service import _is_fcm_failure
+
+    breaker = CircuitBreaker('fcm-test', failure_rate=0.5, min_calls=2, window_size=2, open_seconds=60)
+    def _dead_token():
+        raise messaging.UnregisteredError('Requested entity was not found.')
+    for _ in range(2):
+        with pytest.raises(messaging.UnregisteredError):
+            breaker.call(_dead_token, is_failure=_is_fcm_failure)
+    assert breaker.state == CLOSED
+
+
+def test_metrics_endpoint_exposes_breaker_state(client):
+    get_breaker('email')
+    resp = client.get('/metrics')
+    assert resp.status_code == 200
+    assert 'circuit_breaker_state{provider="email"} 0' in resp.get_data(as_text=True)
@@ -47,3 +47,12 @@ def test_delete_contact(client, auth_header):
     get_resp = client.get('/api/contacts', headers=auth_header)
     contacts = json.loads(get_resp.data)['data']
     assert not any(c['id'] == contact_id for c in contacts)
+
+def test_contact_phone_is_normalized_to_e164(client, auth_header):
+    """Formatting and national numbers are stored as E.164."""
+    response = client.post('/api/contacts', headers=auth_header, json={
+        "name": "Aunt",
+        "phone": "0091 (98765) 43210"
+    })
+    assert response.status_code == 201
+    assert json.loads(response.data)['data']['phone'] == "+919876543210"
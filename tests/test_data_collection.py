@@ -19,10 +19,6 @@ class TestDataCollection(unittest.TestCase):
         self.patcher = patch('flask_jwt_extended.view_decorators.verify_jwt_in_request')
         self.mock_jwt = self.patcher.start()
         
-        # Mock JWT
-        self.patcher = patch('flask_jwt_extended.view_decorators.verify_jwt_in_request')
-        self.mock_jwt = self.patcher.start()
-        
         # Patch the function where it is USED
         self.patcher_id = patch('app.routes.protection.get_jwt_identity')
         self.mock_get_jwt_identity = self.patcher_id.start()
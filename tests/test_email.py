@@ -0,0 +1,82 @@
+import socket
+import time
+import pytest
+from flask_mail import Mail
+from app.services import email_service
+
+aiosmtpd_controller = pytest.importorskip('aiosmtpd.controller')
+
+
+class _RecordingHandler:
+    def __init__(self):
+        self.messages = []
+        self.sessions = []
+
+    async def handle_DATA(self, server, session, envelope):
+        # One aiosmtpd session per SMTP connection; keep references so ids aren't reused
+        if not any(s is session for s in self.sessions):
+            self.sessions.append(session)
+        self.messages.append(envelope)
+        return '250 OK'
+
+
+@pytest.fixture
+def smtp_server(app):
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    handler = _RecordingHandler()
+    controller = aiosmtpd_controller.Controller(handler, hostname='127.0.0.1', port=port)
+    controller.start()
+
+    app.config.update(
+        MAIL_SERVER='127.0.0.1', MAIL_PORT=port, MAIL_USE_TLS=False, MAIL_USE_SSL=False,
+        MAIL_USERNAME='alerts@asfalis.app', MAIL_PASSWORD=None, MAIL_SUPPRESS_SEND=False,
+        MAIL_POOL_IDLE_TIMEOUT=0.5
+    )
+    app.extensions['mail'] = Mail().init_mail(app.config)
+    app.extensions.pop('mail_sender', None)
+    yield handler
+    controller.stop()
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_burst_reuses_one_smtp_connection(app, smtp_server):
+    """A burst of OTP emails goes out over a single pooled SMTP session."""
+    for i in range(5):
+        assert email_service.send_otp_email(f"user{i}@example.com", f"12345{i}")
+
+    assert _wait_for(lambda: len(smtp_server.messages) == 5)
+    assert len(smtp_server.sessions) == 1
+    assert b"123454" in smtp_server.messages[-1].content
+
+
+def test_reconnects_after_idle_timeout(app, smtp_server):
+    """The idle connection is closed and transparently reopened for the next email."""
+    email_service.send_otp_email("first@example.com", "111111")
+    assert _wait_for(lambda: len(smtp_server.messages) == 1)
+
+    sender = app.extensions['mail_sender']
+    assert _wait_for(lambda: sender._connection is None)
+
+    email_service.send_otp_email("second@example.com", "222222")
+    assert _wait_for(lambda: len(smtp_server.messages) == 2)
+    assert len(smtp_server.sessions) == 2
+
+
+def test_contact_added_template_escapes_names(app, smtp_server):
+    email_service.send_contact_added_email(
+        "mom@example.com", "Mom", "<b>Eve</b>", "+1 555 000", "join sandbox-code"
+    )
+    assert _wait_for(lambda: len(smtp_server.messages) == 1)
+    content = smtp_server.messages[0].content
+    assert b"&lt;b&gt;Eve&lt;/b&gt;" in content
+    assert b"https://wa.me/1555000?text=join%20sandbox-code" in content
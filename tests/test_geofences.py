@@ -0,0 +1,99 @@
+import json
+
+HOME = (12.9716, 77.5946)
+
+def _add_zone(client, auth_header, **overrides):
+    body = {"name": "Home", "latitude": HOME[0], "longitude": HOME[1], "radius_m": 200}
+    body.update(overrides)
+    return client.post('/api/geofences', headers=auth_header, json=body)
+
+def _move(client, auth_header, lat, lng):
+    client.post('/api/location/update', headers=auth_header, json={"latitude": lat, "longitude": lng})
+
+def test_geofence_crud(client, auth_header):
+    response = _add_zone(client, auth_header)
+    assert response.status_code == 201
+    zone_id = json.loads(response.data)['data']['id']
+
+    assert _add_zone(client, auth_header, radius_m=1000000).status_code == 400
+    assert _add_zone(client, auth_header, latitude=95).status_code == 400
+
+    response = client.put(f'/api/geofences/{zone_id}', headers=auth_header, json={"name": "Hostel", "notify_on": "both"})
+    assert json.loads(response.data)['data']['notify_on'] == 'both'
+
+    data = json.loads(client.get('/api/geofences', headers=auth_header).data)
+    assert [zone['name'] for zone in data['data']] == ['Hostel']
+
+    assert client.delete(f'/api/geofences/{zone_id}', headers=auth_header).status_code == 200
+    assert json.loads(client.get('/api/geofences', headers=auth_header).data)['count'] == 0
+
+def test_leaving_a_zone_alerts_contacts_once(client, auth_header):
+    from app.models.sos_alert import SOSAlert
+    from app.models.notification import NotificationOutbox
+
+    client.post('/api/contacts', headers=auth_header, json={"name": "Mom", "phone": "+1234567890"})
+    _add_zone(client, auth_header)
+
+    _move(client, auth_header, *HOME) # baseline: inside, no alert
+    _move(client, auth_header, HOME[0] + 0.0005, HOME[1]) # ~55 m, still inside
+    assert SOSAlert.query.count() == 0
+
+    _move(client, auth_header, HOME[0] + 0.01, HOME[1]) # ~1.1 km away
+    _move(client, auth_header, HOME[0] + 0.02, HOME[1])
+    alerts = SOSAlert.query.all()
+    assert len(alerts) == 1
+    assert alerts[0].trigger_type == 'geofence'
+    assert 'left the safe zone "Home"' in alerts[0].sos_message
+    assert {row.channel for row in NotificationOutbox.query.filter_by(alert_id=alerts[0].id)} == {'sms', 'whatsapp'}
+
+    # Coming back home doesn't alert unless the zone asks for enter events
+    _move(client, auth_header, *HOME)
+    assert SOSAlert.query.count() == 1
+
+    # A zone notice isn't an SOS: it stays out of the SOS history
+    history = json.loads(client.get('/api/sos/history', headers=auth_header).data)['data']
+    assert history == []
+
+def test_boundary_jitter_does_not_flap(client, auth_header):
+    from app.models.sos_alert import SOSAlert
+
+    client.post('/api/contacts', headers=auth_header, json={"name": "Mom", "phone": "+1234567890"})
+    _add_zone(client, auth_header, notify_on='both')
+
+    _move(client, auth_header, *HOME)
+    # Oscillate just around the 200 m edge, inside the hysteresis band
+    for offset in (0.00175, 0.00185, 0.00175, 0.00188):
+        _move(client, auth_header, HOME[0] + offset, HOME[1])
+    assert SOSAlert.query.count() == 0
+
+def test_zone_disabled_on_another_worker_stops_alerting(client, auth_header, app):
+    from app import db
+    from app.models.geofence import Geofence
+    from app.models.sos_alert import SOSAlert
+    from app.utils.cache_invalidation import caches_synced
+
+    client.post('/api/contacts', headers=auth_header, json={"name": "Mom", "phone": "+1234567890"})
+    zone_id = json.loads(_add_zone(client, auth_header).data)['data']['id']
+    _move(client, auth_header, *HOME) # zones now cached on this worker
+
+    # Another worker disables the zone and publishes the invalidation
+    db.session.get(Geofence, zone_id).is_active = False
+    db.session.commit()
+    caches_synced()
+    app.extensions['cache_invalidation'].apply('geofence_index', [db.session.get(Geofence, zone_id).user_id])
+
+    _move(client, auth_header, HOME[0] + 0.01, HOME[1])
+    assert SOSAlert.query.count() == 0
+
+def test_grid_index_finds_only_containing_circles():
+    from app.utils.geo import GridIndex
+
+    grid = GridIndex(cell_deg=0.01)
+    grid.add('a', 12.9716, 77.5946, 600)
+    grid.add('b', 12.9816, 77.5946, 600)
+    grid.add('far', 28.6139, 77.2090, 600)
+
+    assert grid.containing(12.9716, 77.5946) == ['a']
+    assert sorted(grid.containing(12.9766, 77.5946)) == ['a', 'b'] # ~556 m from both centres
+    assert grid.containing(13.5, 77.5946) == []
+    assert 'far' not in grid.candidates(12.9716, 77.5946)
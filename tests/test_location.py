@@ -26,3 +26,359 @@ def test_get_location_history(client, auth_header):
     # /current returns a single object in data, not a list
     assert data['success'] is True
     assert data['data']['latitude'] == 37.7749
+
+def test_current_location_served_from_last_location(client, auth_header, app):
+    """/current reads the latest-point cache, not location_history."""
+    from app.models.location import LocationHistory, UserLastLocation
+    from app import db
+
+    for lat in (10.0, 11.0, 12.0):
+        client.post('/api/location/update', headers=auth_header, json={
+            "latitude": lat,
+            "longitude": 77.0
+        })
+
+    assert UserLastLocation.query.count() == 1
+    # Clearing history must not affect the latest point
+    LocationHistory.query.delete()
+    db.session.commit()
+
+    response = client.get('/api/location/current', headers=auth_header)
+    assert response.status_code == 200
+    assert json.loads(response.data)['data']['latitude'] == 12.0
+
+    # Cold in-process cache falls back to the durable table
+    app.extensions['last_location_cache'].clear()
+    response = client.get('/api/location/current', headers=auth_header)
+    assert json.loads(response.data)['data']['latitude'] == 12.0
+
+def test_sharing_flag_updates_last_location(client, auth_header):
+    client.post('/api/location/update', headers=auth_header, json={
+        "latitude": 37.7749,
+        "longitude": -122.4194
+    })
+    client.post('/api/location/share/start', headers=auth_header)
+    response = client.get('/api/location/current', headers=auth_header)
+    assert json.loads(response.data)['data']['is_sharing'] is True
+
+    client.post('/api/location/share/stop', headers=auth_header)
+    response = client.get('/api/location/current', headers=auth_header)
+    assert json.loads(response.data)['data']['is_sharing'] is False
+
+def test_location_points_are_buffered_and_flushed_in_batches(client, auth_header, app):
+    """With a flush interval, points are written together; the latest point is visible at once."""
+    from app.models.location import LocationHistory, UserLastLocation
+    from app.services.location_ingest import flush_pending, get_ingest_buffer
+    from app.utils import metrics
+
+    app.config['LOCATION_FLUSH_INTERVAL'] = 3600
+    for lat in (10.0, 11.0, 12.0):
+        client.post('/api/location/update', headers=auth_header, json={
+            "latitude": lat,
+            "longitude": 77.0
+        })
+
+    assert LocationHistory.query.count() == 0
+    assert get_ingest_buffer().depth == 3
+    assert metrics.get_value('location_ingest_buffer_depth') == 3
+    response = client.get('/api/location/current', headers=auth_header)
+    assert json.loads(response.data)['data']['latitude'] == 12.0
+
+    assert flush_pending() == 3
+    assert LocationHistory.query.count() == 3
+    assert UserLastLocation.query.one().latitude == 12.0
+    assert get_ingest_buffer().depth == 0
+
+def test_failed_location_flush_is_retried(client, auth_header, app, monkeypatch):
+    from app.models.location import LocationHistory
+    from app.services import location_ingest
+
+    app.config['LOCATION_FLUSH_INTERVAL'] = 3600
+    client.post('/api/location/update', headers=auth_header, json={
+        "latitude": 10.0,
+        "longitude": 77.0
+    })
+
+    real_write = location_ingest._write_points
+    def _broken(points):
+        raise RuntimeError("database unavailable")
+    monkeypatch.setattr(location_ingest, '_write_points', _broken)
+    assert location_ingest.flush_pending() == 0
+    assert location_ingest.get_ingest_buffer().depth == 1
+
+    monkeypatch.setattr(location_ingest, '_write_points', real_write)
+    assert location_ingest.flush_pending() == 1
+    assert LocationHistory.query.count() == 1
+
+def test_bad_location_point_does_not_fail_the_batch(client, auth_header, app, monkeypatch):
+    from app.models.location import LocationHistory
+    from app.services import location_ingest
+
+    app.config['LOCATION_FLUSH_INTERVAL'] = 3600
+    client.post('/api/location/update', headers=auth_header, json={"latitude": 10.0, "longitude": 77.0})
+    buffer = location_ingest.get_ingest_buffer()
+    good = dict(buffer._points[0])
+    buffer.submit(dict(good, user_id='no-such-user'))
+
+    real_write = location_ingest._write_points
+    def _rejects_unknown_users(points):
+        if any(point['user_id'] == 'no-such-user' for point in points):
+            raise RuntimeError("violates foreign key constraint")
+        return real_write(points)
+    monkeypatch.setattr(location_ingest, '_write_points', _rejects_unknown_users)
+
+    assert location_ingest.flush_pending() == 1
+    assert buffer.depth == 0
+    assert LocationHistory.query.count() == 1
+
+def test_deleting_account_discards_buffered_points(client, auth_header, app):
+    from app.models.location import LocationHistory
+    from app.services.location_ingest import flush_pending, get_ingest_buffer
+
+    app.config['LOCATION_FLUSH_INTERVAL'] = 3600
+    client.post('/api/location/update', headers=auth_header, json={"latitude": 10.0, "longitude": 77.0})
+    assert get_ingest_buffer().depth == 1
+
+    assert client.delete('/api/user/account', headers=auth_header).status_code == 200
+    assert get_ingest_buffer().depth == 0
+    assert flush_pending() == 0
+    assert LocationHistory.query.count() == 0
+
+def test_stationary_pings_are_not_persisted(client, auth_header):
+    """Pings that barely move only refresh the latest point; moves and sharing changes are stored."""
+    from app.models.location import LocationHistory
+
+    def ping(lat, lng, **extra):
+        client.post('/api/location/update', headers=auth_header, json=dict(latitude=lat, longitude=lng, **extra))
+
+    ping(12.97160, 77.59460)
+    ping(12.97161, 77.59461)   # ~1.5 m away, seconds later
+    ping(12.97162, 77.59460)
+    assert LocationHistory.query.count() == 1
+
+    ping(12.97300, 77.59460)   # ~155 m away
+    assert LocationHistory.query.count() == 2
+
+    ping(12.97300, 77.59460, is_sharing=True)
+    assert LocationHistory.query.count() == 3
+
+    response = client.get('/api/location/current', headers=auth_header)
+    assert json.loads(response.data)['data']['is_sharing'] is True
+
+def test_douglas_peucker_keeps_corners():
+    from app.utils.geo import douglas_peucker
+
+    # Straight line north with a small wobble, then a turn east
+    track = [(0.0, 0.0), (0.001, 0.00001), (0.002, 0.0), (0.003, 0.0), (0.003, 0.001), (0.003, 0.002)]
+    assert douglas_peucker(track, epsilon_m=10) == [0, 3, 5]
+    assert douglas_peucker(track, epsilon_m=0.1) == [0, 1, 2, 3, 5]
+
+def test_compaction_drops_redundant_points(app, auth_header):
+    from app.models.location import LocationHistory
+    from app.models.user import User
+    from app.tasks.location_tasks import compact_history
+    from app import db
+    from datetime import datetime, timedelta
+
+    user = User.query.filter_by(email="auth_test@example.com").first()
+    day = datetime(2026, 1, 5, 8, 0)
+    for i in range(10):
+        # Walking due north in a straight line
+        db.session.add(LocationHistory(user_id=user.id, latitude=12.9 + i * 0.001, longitude=77.5,
+                                       recorded_at=day + timedelta(minutes=i)))
+    db.session.commit()
+
+    removed = compact_history.apply(args=['2026-01-05']).get()
+
+    assert removed == 8
+    remaining = LocationHistory.query.order_by(LocationHistory.recorded_at).all()
+    assert [p.latitude for p in remaining] == [12.9, 12.9 + 9 * 0.001]
+
+def _add_points(user_id, start, coords, step_minutes=10):
+    from app.models.location import LocationHistory
+    from app import db
+    from datetime import timedelta
+    for i, (lat, lng) in enumerate(coords):
+        db.session.add(LocationHistory(user_id=user_id, latitude=lat, longitude=lng,
+                                       recorded_at=start + timedelta(minutes=i * step_minutes)))
+    db.session.commit()
+
+def test_daily_rollup_and_history_view(client, auth_header):
+    from app.models.user import User
+    from app.tasks.location_tasks import rollup_history
+    from datetime import datetime
+
+    user = User.query.filter_by(email="auth_test@example.com").first()
+    _add_points(user.id, datetime(2026, 3, 2, 9, 0), [(12.90, 77.50), (12.91, 77.50), (12.91, 77.52)])
+
+    assert rollup_history.apply(args=['2026-03-02']).get() == 1
+
+    response = client.get('/api/location/history/daily?from=2026-03-01&to=2026-03-31', headers=auth_header)
+    assert response.status_code == 200
+    days = json.loads(response.data)['data']
+    assert len(days) == 1
+    assert days[0]['day'] == '2026-03-02'
+    assert days[0]['point_count'] == 3
+    assert days[0]['bounding_box'] == {'min_latitude': 12.90, 'max_latitude': 12.91,
+                                       'min_longitude': 77.50, 'max_longitude': 77.52}
+    # ~1.11 km north then ~2.17 km east
+    assert 3200 < days[0]['distance_m'] < 3350
+
+def test_retention_rolls_up_then_removes_old_points(app, auth_header):
+    from app.models.location import LocationHistory, LocationDailyRollup
+    from app.models.user import User
+    from app.services.location_retention import apply_retention
+    from datetime import datetime, timedelta
+
+    user = User.query.filter_by(email="auth_test@example.com").first()
+    old = (datetime.utcnow() - timedelta(days=500)).replace(hour=12, minute=0)
+    _add_points(user.id, old, [(12.90, 77.50), (12.91, 77.50)])
+    _add_points(user.id, datetime.utcnow() - timedelta(hours=1), [(12.95, 77.55)])
+
+    assert apply_retention(retention_months=12) == 2
+    assert LocationHistory.query.count() == 1
+    rollup = LocationDailyRollup.query.one()
+    assert rollup.day == old.date() and rollup.point_count == 2
+
+def test_delete_account_purges_location_data(client, auth_header):
+    from app.models.location import LocationHistory, UserLastLocation
+
+    client.post('/api/location/update', headers=auth_header, json={"latitude": 12.9, "longitude": 77.5})
+    assert LocationHistory.query.count() == 1
+
+    response = client.delete('/api/user/account', headers=auth_header)
+    assert response.status_code == 200
+    assert LocationHistory.query.count() == 0
+    assert UserLastLocation.query.count() == 0
+
+def test_history_keyset_pagination_and_range(client, auth_header):
+    from app.models.user import User
+    from datetime import datetime
+
+    user = User.query.filter_by(email="auth_test@example.com").first()
+    _add_points(user.id, datetime(2026, 4, 1, 8, 0), [(12.9 + i * 0.001, 77.5) for i in range(7)])
+
+    seen = []
+    cursor = None
+    while True:
+        url = '/api/location/history?from=2026-04-01T08:10:00Z&to=2026-04-01T09:00:00&limit=2'
+        if cursor:
+            url += f'&cursor={cursor}'
+        data = json.loads(client.get(url, headers=auth_header).data)['data']
+        seen.extend(p['recorded_at'] for p in data['points'])
+        cursor = data['next_cursor']
+        if not cursor:
+            break
+
+    # 08:10 .. 08:50 inclusive, in order, no duplicates
+    assert seen == [f"2026-04-01T08:{m}:00" for m in (10, 20, 30, 40, 50)]
+
+def test_history_polyline_and_ndjson(client, auth_header):
+    from app.models.user import User
+    from datetime import datetime
+
+    user = User.query.filter_by(email="auth_test@example.com").first()
+    _add_points(user.id, datetime(2026, 4, 2, 8, 0), [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)])
+
+    response = client.get('/api/location/history?format=polyline', headers=auth_header)
+    data = json.loads(response.data)['data']
+    assert data['polyline'] == '_p~iF~ps|U_ulLnnqC_mqNvxq`@'
+    assert data['count'] == 3 and data['next_cursor'] is None
+
+    response = client.get('/api/location/history?format=ndjson', headers=auth_header)
+    assert response.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert [p['latitude'] for p in lines] == [38.5, 40.7, 43.252]
+
+def test_history_rejects_bad_cursor(client, auth_header):
+    response = client.get('/api/location/history?cursor=not-a-cursor', headers=auth_header)
+    assert response.status_code == 400
+
+def test_batch_upload_keeps_client_timestamps(client, auth_header):
+    from app.models.location import LocationHistory
+    from datetime import datetime, timedelta
+
+    start = datetime.utcnow().replace(microsecond=0) - timedelta(hours=1)
+    points = [
+        {"latitude": 12.90 + i * 0.01, "longitude": 77.5, "recorded_at": (start + timedelta(minutes=i)).isoformat() + "Z"}
+        for i in range(5)
+    ]
+    response = client.post('/api/location/batch', headers=auth_header, json={"points": list(reversed(points))})
+    assert response.status_code == 200
+    assert json.loads(response.data)['data']['accepted'] == 5
+
+    # Every point is kept (no downsampling) with its own timestamp
+    stored = LocationHistory.query.order_by(LocationHistory.recorded_at).all()
+    assert [p.recorded_at for p in stored] == [start + timedelta(minutes=i) for i in range(5)]
+
+    current = json.loads(client.get('/api/location/current', headers=auth_header).data)['data']
+    assert current['latitude'] == 12.94
+
+    # A live update is newer than a late replay of older points
+    client.post('/api/location/update', headers=auth_header, json={"latitude": 13.5, "longitude": 77.5})
+    client.post('/api/location/batch', headers=auth_header, json={"points": [
+        {"latitude": 1.0, "longitude": 1.0, "recorded_at": (start - timedelta(hours=1)).isoformat()}
+    ]})
+    current = json.loads(client.get('/api/location/current', headers=auth_header).data)['data']
+    assert current['latitude'] == 13.5
+
+def test_batch_upload_is_validated_as_a_whole(client, auth_header):
+    from app.models.location import LocationHistory
+
+    response = client.post('/api/location/batch', headers=auth_header, json={"points": [
+        {"latitude": 12.9, "longitude": 77.5, "recorded_at": "2026-01-01T10:00:00Z"},
+        {"latitude": 120.0, "longitude": 77.5, "recorded_at": "2026-01-01T10:01:00Z"}
+    ]})
+    assert response.status_code == 400
+    assert '1' in json.dumps(json.loads(response.data)['error']['details'])
+    assert LocationHistory.query.count() == 0
+
+    response = client.post('/api/location/batch', headers=auth_header, json={"points": []})
+    assert response.status_code == 400
+
+def test_batch_points_are_bounded_by_server_time_and_retention(client, auth_header):
+    from datetime import datetime, timedelta
+
+    # A point from a fast client clock doesn't freeze later live updates
+    ahead = datetime.utcnow() + timedelta(minutes=4)
+    response = client.post('/api/location/batch', headers=auth_header, json={"points": [
+        {"latitude": 1.0, "longitude": 1.0, "recorded_at": ahead.isoformat()}
+    ]})
+    assert response.status_code == 200
+    assert datetime.fromisoformat(response.get_json()['data']['latest_recorded_at']) <= datetime.utcnow()
+    client.post('/api/location/update', headers=auth_header, json={"latitude": 13.5, "longitude": 77.5})
+    current = json.loads(client.get('/api/location/current', headers=auth_header).data)['data']
+    assert current['latitude'] == 13.5
+
+    too_old = datetime.utcnow() - timedelta(days=800)
+    response = client.post('/api/location/batch', headers=auth_header, json={"points": [
+        {"latitude": 1.0, "longitude": 1.0, "recorded_at": too_old.isoformat()}
+    ]})
+    assert response.status_code == 400
+
+def test_daily_history_default_range_is_in_utc(client, auth_header, monkeypatch):
+    import time
+    from app import db
+    from app.models.location import LocationDailyRollup
+    from app.models.user import User
+    from datetime import datetime, timedelta
+
+    user = User.query.filter_by(email="auth_test@example.com").first()
+    today = datetime.utcnow().date()
+    for day in (today - timedelta(days=30), today):
+        at = datetime.combine(day, datetime.min.time())
+        db.session.add(LocationDailyRollup(user_id=user.id, day=day, point_count=1, min_latitude=12.9, max_latitude=12.9,
+                                           min_longitude=77.5, max_longitude=77.5, distance_m=0.0,
+                                           first_recorded_at=at, last_recorded_at=at))
+    db.session.commit()
+
+    # A server clock whose local date is not the UTC date right now
+    monkeypatch.setenv('TZ', 'Etc/GMT-14' if datetime.utcnow().hour >= 10 else 'Etc/GMT+12')
+    time.tzset()
+    try:
+        response = client.get('/api/location/history/daily', headers=auth_header)
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+    days = [entry['day'] for entry in json.loads(response.data)['data']]
+    assert days == [(today - timedelta(days=30)).isoformat(), today.isoformat()]
@@ -0,0 +1,236 @@
+import json
+from app.extensions import db
+from app.models.notification import NotificationOutbox
+from app.models.sos_alert import SOSAlert
+from app.services.notification_service import claim_batch, deliver_batch
+
+
+def _add_contact(client, auth_header, phone="+1234567890"):
+    client.post('/api/contacts', headers=auth_header, json={
+        "name": "Mom",
+        "phone": phone,
+        "relationship": "Parent"
+    })
+
+
+def _trigger(client, auth_header):
+    resp = client.post('/api/sos/trigger', headers=auth_header, json={
+        "latitude": 37.7749,
+        "longitude": -122.4194,
+        "trigger_type": "manual"
+    })
+    assert resp.status_code == 201
+    return json.loads(resp.data)['data']['alert_id']
+
+
+def test_trigger_writes_outbox_rows(client, auth_header):
+    """Triggering an SOS records one row per contact and channel, delivered inline in tests."""
+    _add_contact(client, auth_header, "+1234567890")
+    _add_contact(client, auth_header, "+1987654321")
+    alert_id = _trigger(client, auth_header)
+
+    rows = NotificationOutbox.query.filter_by(alert_id=alert_id).all()
+    assert len(rows) == 4
+    assert {r.channel for r in rows} == {'sms', 'whatsapp'}
+    assert all(r.status == 'sent' for r in rows)
+    assert all(r.latency_ms is not None for r in rows)
+
+    alert = SOSAlert.query.get(alert_id)
+    assert alert.status == 'sent'
+    assert sorted(alert.contacted_numbers) == ["+1234567890", "+1987654321"]
+
+
+def test_claim_batch_does_not_double_claim(client, auth_header, monkeypatch):
+    """A row claimed by one worker is not handed to another."""
+    _add_contact(client, auth_header)
+    alert_id = _trigger(client, auth_header)
+    NotificationOutbox.query.filter_by(alert_id=alert_id).update({'status': 'pending'})
+    db.session.commit()
+
+    first = claim_batch(limit=10)
+    second = claim_batch(limit=10)
+    assert len(first) == 2
+    assert second == []
+
+
+def test_failed_delivery_is_retried_later(client, auth_header, monkeypatch):
+    """A provider error puts the row back to pending with a retry time."""
+    _add_contact(client, auth_header)
+    alert_id = _trigger(client, auth_header)
+    NotificationOutbox.query.filter_by(alert_id=alert_id).update({'status': 'pending', 'attempts': 0})
+    db.session.commit()
+
+    def _boom(channel, recipient, body):
+        raise RuntimeError("provider down")
+    monkeypatch.setattr('app.services.notification_service._send', _boom)
+
+    deliver_batch(claim_batch(limit=10))
+
+    rows = NotificationOutbox.query.filter_by(alert_id=alert_id).all()
+    assert all(r.status == 'pending' for r in rows)
+    assert all(r.attempts == 1 and r.next_attempt_at is not None for r in rows)
+    assert all(r.last_error == "provider down" for r in rows)
+    # Backed off rows are not claimable yet
+    assert claim_batch(limit=10) == []
+
+
+def test_dispatch_is_idempotent(client, auth_header):
+    """Dispatching an already sent alert does not queue a second message per channel."""
+    _add_contact(client, auth_header)
+    alert_id = _trigger(client, auth_header)
+
+    resp = client.post('/api/sos/send-now', headers=auth_header, json={"alert_id": alert_id})
+    assert resp.status_code == 200
+
+    rows = NotificationOutbox.query.filter_by(alert_id=alert_id).all()
+    assert sorted(r.channel for r in rows) == ['sms', 'whatsapp']
+
+
+def test_sensor_trigger_sends_single_message_with_context(app, client, auth_header, monkeypatch):
+    """An auto-SOS folds the detection detail into the one dispatched message."""
+    from app.models.user import User
+    from app.services import protection_service
+
+    _add_contact(client, auth_header)
+    user = User.query.filter_by(email="auth_test@example.com").first()
+    monkeypatch.setattr(protection_service, 'predict_danger', lambda window, sensor_type='accelerometer': (1, 0.9))
+    monkeypatch.setattr(protection_service, 'save_training_data', lambda *args, **kwargs: (True, ""))
+    protection_service.toggle_protection(user.id, True)
+    try:
+        result = protection_service.analyze_sensor_data(
+            user.id, 'accelerometer', [{'x': 0.0, 'y': 0.0, 'z': 9.8, 'timestamp': 1}], 'medium'
+        )
+    finally:
+        protection_service.toggle_protection(user.id, False)
+
+    assert result['alert_triggered'] is True
+    rows = NotificationOutbox.query.filter_by(alert_id=result['alert_id']).all()
+    assert sorted(r.channel for r in rows) == ['sms', 'whatsapp']
+    assert all("Danger detected via accelerometer" in r.body for r in rows)
+
+
+def test_push_multicast_with_stub_transport(client, auth_header, monkeypatch):
+    """Contacts who use the app get one batched FCM multicast; dead tokens are pruned."""
+    from firebase_admin import messaging
+    from app.models.user import User
+    from app.services import fcm_service
+
+    for i, phone in enumerate(["+15550000001", "+15550000002"]):
+        db.session.add(User(full_name=f"Guardian {i}", phone=phone, auth_provider='phone', fcm_token=f"token-{i}"))
+    db.session.commit()
+    _add_contact(client, auth_header, "+15550000001")
+    _add_contact(client, auth_header, "+15550000002")
+
+    sent_batches = []
+
+    def _stub_transport(message):
+        sent_batches.append(list(message.tokens))
+        return messaging.BatchResponse([
+            messaging.SendResponse({'name': f"msg-{token}"}, None) if token == "token-0"
+            else messaging.SendResponse(None, messaging.UnregisteredError("Token not registered"))
+            for token in message.tokens
+        ])
+
+    monkeypatch.setattr(fcm_service, '_is_firebase_ready', lambda: True)
+    monkeypatch.setattr(fcm_service, '_send_each_for_multicast', _stub_transport)
+
+    alert_id = _trigger(client, auth_header)
+
+    assert sent_batches == [["token-0", "token-1"]]
+    push_rows = {r.recipient: r for r in NotificationOutbox.query.filter_by(alert_id=alert_id, channel='push')}
+    guardian_0 = User.query.filter_by(phone="+15550000001").first()
+    guardian_1 = User.query.filter_by(phone="+15550000002").first()
+    assert push_rows[guardian_0.id].status == 'sent'
+    assert push_rows[guardian_0.id].provider_message_id == "msg-token-0"
+    assert push_rows[guardian_1.id].status == 'failed'
+    assert guardian_1.fcm_token is None
+    assert guardian_0.fcm_token == "token-0"
+
+
+def test_multicast_chunks_at_fcm_limit(app, monkeypatch):
+    """Token lists larger than the FCM limit are split into 500-token requests."""
+    from firebase_admin import messaging
+    from app.services import fcm_service
+
+    chunk_sizes = []
+
+    def _stub_transport(message):
+        chunk_sizes.append(len(message.tokens))
+        return messaging.BatchResponse([messaging.SendResponse({'name': 'ok'}, None) for _ in message.tokens])
+
+    monkeypatch.setattr(fcm_service, '_is_firebase_ready', lambda: True)
+    monkeypatch.setattr(fcm_service, '_send_each_for_multicast', _stub_transport)
+
+    results = fcm_service.send_multicast([f"t{i}" for i in range(1201)], "title", "body")
+    assert chunk_sizes == [500, 500, 201]
+    assert len(results) == 1201
+
+
+def test_failed_multicast_chunk_keeps_results_of_sent_chunks(client, auth_header, monkeypatch):
+    """A chunk that fails doesn't discard the chunks already sent: only its own
+    recipients are retried, so nobody gets the push twice."""
+    from firebase_admin import messaging
+    from app.models.user import User
+    from app.services import fcm_service
+    from app.services.notification_service import deliver_pending
+
+    for i, phone in enumerate(["+15550000001", "+15550000002"]):
+        db.session.add(User(full_name=f"Guardian {i}", phone=phone, auth_provider='phone', fcm_token=f"token-{i}"))
+    db.session.commit()
+    _add_contact(client, auth_header, "+15550000001")
+    _add_contact(client, auth_header, "+15550000002")
+
+    sent_tokens = []
+    transport_down = [True]
+
+    def _stub_transport(message):
+        if "token-1" in message.tokens and transport_down[0]:
+            raise RuntimeError("FCM unavailable")
+        sent_tokens.extend(message.tokens)
+        return messaging.BatchResponse([messaging.SendResponse({'name': f"msg-{t}"}, None) for t in message.tokens])
+
+    monkeypatch.setattr(fcm_service, 'MULTICAST_BATCH_SIZE', 1)
+    monkeypatch.setattr(fcm_service, '_is_firebase_ready', lambda: True)
+    monkeypatch.setattr(fcm_service, '_send_each_for_multicast', _stub_transport)
+
+    alert_id = _trigger(client, auth_header)
+
+    guardian_0 = User.query.filter_by(phone="+15550000001").first()
+    guardian_1 = User.query.filter_by(phone="+15550000002").first()
+    push_rows = {r.recipient: r for r in NotificationOutbox.query.filter_by(alert_id=alert_id, channel='push')}
+    assert push_rows[guardian_0.id].status == 'sent'
+    assert push_rows[guardian_1.id].status == 'pending'
+    assert push_rows[guardian_1.id].last_error == "FCM unavailable"
+
+    # The retry only pushes to the recipient whose chunk failed
+    transport_down[0] = False
+    NotificationOutbox.query.filter_by(alert_id=alert_id).update({'next_attempt_at': None})
+    db.session.commit()
+    deliver_pending(alert_id=alert_id)
+    assert sent_tokens == ["token-0", "token-1"]
+    assert NotificationOutbox.query.filter_by(alert_id=alert_id, channel='push', status='sent').count() == 2
+
+
+def test_invalid_argument_fails_the_push_but_keeps_the_token(client, auth_header, monkeypatch):
+    from firebase_admin import exceptions, messaging
+    from app.models.user import User
+    from app.services import fcm_service
+
+    db.session.add(User(full_name="Guardian", phone="+15550000001", auth_provider='phone', fcm_token="token-0"))
+    db.session.commit()
+    _add_contact(client, auth_header, "+15550000001")
+
+    def _stub_transport(message):
+        return messaging.BatchResponse([
+            messaging.SendResponse(None, exceptions.InvalidArgumentError("Invalid payload")) for _ in message.tokens
+        ])
+
+    monkeypatch.setattr(fcm_service, '_is_firebase_ready', lambda: True)
+    monkeypatch.setattr(fcm_service, '_send_each_for_multicast', _stub_transport)
+
+    alert_id = _trigger(client, auth_header)
+
+    row = NotificationOutbox.query.filter_by(alert_id=alert_id, channel='push').one()
+    assert row.status == 'pending' # retried with backoff like any other send failure
+    assert row.last_error == "Invalid payload"
+    assert User.query.filter_by(phone="+15550000001").first().fcm_token == "token-0"
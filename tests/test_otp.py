@@ -0,0 +1,56 @@
+from app.models.otp import OTPRecord
+from app.utils import otp
+
+
+def _use_backend(app, name):
+    app.config['OTP_BACKEND'] = name
+    app.extensions.pop('otp_backend', None)
+
+
+def test_memory_backend_counts_attempts_and_consumes(app):
+    otp.store_otp(phone="+919876543210", otp_code="123456", purpose='login')
+
+    assert otp.verify_otp(phone="+919876543210", otp_code="000000", purpose='login') == (False, otp.INVALID)
+    assert otp.verify_otp(phone="+919876543210", otp_code="123456", purpose='login') == (True, otp.VERIFIED)
+    # Single use
+    assert otp.verify_otp(phone="+919876543210", otp_code="123456", purpose='login') == (False, otp.NOT_FOUND)
+
+    app.config['MAX_OTP_ATTEMPTS'] = 2
+    otp.store_otp(email="a@example.com", otp_code="654321", purpose='email_verification')
+    for _ in range(2):
+        otp.verify_otp(email="a@example.com", otp_code="000000", purpose='email_verification')
+    assert otp.verify_otp(email="a@example.com", otp_code="654321", purpose='email_verification') == (False, otp.TOO_MANY)
+    # A new code resets the count; codes are bound to their purpose
+    otp.store_otp(email="a@example.com", otp_code="111111", purpose='email_verification')
+    assert otp.verify_otp(email="a@example.com", otp_code="111111", purpose='reset_password')[0] is False
+    assert otp.verify_otp(email="a@example.com", otp_code="111111", purpose='email_verification')[0] is True
+
+
+def test_memory_backend_expires_codes(app):
+    app.config['OTP_EXPIRY_SECONDS'] = 0
+    otp.store_otp(phone="+919876543210", otp_code="123456", purpose='login')
+    assert otp.verify_otp(phone="+919876543210", otp_code="123456", purpose='login') == (False, otp.NOT_FOUND)
+
+
+def test_sql_backend_stores_hashes_and_purges(app):
+    _use_backend(app, 'sql')
+    otp.store_otp(phone="+919876543210", otp_code="123456", purpose='login')
+    record = OTPRecord.query.one()
+    assert record.otp_code != "123456" and len(record.otp_code) == 64
+
+    assert otp.verify_otp(phone="+919876543210", otp_code="000000", purpose='login') == (False, otp.INVALID)
+    assert otp.verify_otp(phone="+919876543210", otp_code="123456", purpose='login') == (True, otp.VERIFIED)
+    assert otp.purge_expired_otps() == 1
+    assert OTPRecord.query.count() == 0
+
+
+def test_phone_otp_login_flow(client, monkeypatch):
+    monkeypatch.setattr(otp.secrets, 'choice', lambda digits: '7')
+    response = client.post('/api/auth/send-otp', json={"phone": "9876543210"})
+    assert response.status_code == 200
+
+    response = client.post('/api/auth/verify-otp', json={"phone": "9876543210", "otp_code": "777777"})
+    assert response.status_code == 200
+    assert response.get_json()['data']['access_token']
+    # No otp_records rows with the memory backend
+    assert OTPRecord.query.count() == 0
@@ -7,20 +7,20 @@ def test_sos_message_update(client, auth_header):
     """Test updating and retrieving the SOS message."""
     
     # 1. Update SOS message
-    response = client.put('/user/profile', headers=auth_header, json={
+    response = client.put('/api/user/profile', headers=auth_header, json={
         'sos_message': 'Help me! This is an emergency!'
     })
     assert response.status_code == 200
     assert response.json['success'] == True
 
     # 2. Verify update via GET
-    response = client.get('/user/profile', headers=auth_header)
+    response = client.get('/api/user/profile', headers=auth_header)
     assert response.status_code == 200
     assert response.json['data']['sos_message'] == 'Help me! This is an emergency!'
 
     # 3. Test validation (max length 50)
     long_message = 'a' * 51
-    response = client.put('/user/profile', headers=auth_header, json={
+    response = client.put('/api/user/profile', headers=auth_header, json={
         'sos_message': long_message
     })
     assert response.status_code == 400
@@ -28,5 +28,57 @@ def test_sos_message_update(client, auth_header):
     assert 'sos_message' in response.json['error']['details']
 
     # 4. Verify original message is preserved after failed update
-    response = client.get('/user/profile', headers=auth_header)
+    response = client.get('/api/user/profile', headers=auth_header)
     assert response.json['data']['sos_message'] == 'Help me! This is an emergency!'
+
+def test_profile_loads_in_one_query_and_is_cached(client, auth_header, app, query_budget):
+    client.post('/api/contacts', headers=auth_header, json={"name": "Mom", "phone": "+1234567890"})
+    app.extensions['user_context_cache'].clear()
+
+    with query_budget(1):
+        response = client.get('/api/user/profile', headers=auth_header)
+    assert response.status_code == 200
+    assert response.json['data']['trusted_contacts_count'] == 1
+    assert response.json['data']['emergency_contact'] is not None
+
+    with query_budget(0):
+        client.get('/api/user/profile', headers=auth_header)
+
+def test_writes_invalidate_user_context(client, auth_header):
+    client.get('/api/user/profile', headers=auth_header)
+
+    client.post('/api/contacts', headers=auth_header, json={"name": "Dad", "phone": "+0987654321"})
+    assert client.get('/api/user/profile', headers=auth_header).json['data']['trusted_contacts_count'] == 1
+
+    client.put('/api/settings', headers=auth_header, json={"emergency_number": "112"})
+    assert client.get('/api/user/profile', headers=auth_header).json['data']['emergency_contact'] == "112"
+
+    client.put('/api/user/profile', headers=auth_header, json={"full_name": "Renamed User"})
+    assert client.get('/api/user/profile', headers=auth_header).json['data']['full_name'] == "Renamed User"
+
+def test_sos_reads_contacts_past_a_stale_worker_cache(client, auth_header, app):
+    from flask import g
+    from app.models.trusted_contact import TrustedContact
+    from app.services.user_context import load_user_context
+
+    user = User.query.filter_by(email="auth_test@example.com").first()
+    assert load_user_context(user.id).contacts == ()
+    # Added through another worker: this worker's cache still has no contacts
+    db.session.add(TrustedContact(user_id=user.id, name="Mom", phone="+1234567890"))
+    db.session.commit()
+    g.pop('user_contexts', None)
+
+    response = client.post('/api/sos/trigger', headers=auth_header, json={
+        "latitude": 12.97, "longitude": 77.59, "trigger_type": "manual"
+    })
+    assert response.status_code == 201
+
+def test_dispatch_sos_without_user(app):
+    from app.models.sos_alert import SOSAlert
+    from app.services.sos_service import dispatch_sos
+
+    alert = SOSAlert(user_id='no-such-user', trigger_type='manual', latitude=1.0, longitude=1.0,
+                     status='countdown', sos_message='help', contacted_numbers=[])
+    db.session.add(alert)
+    db.session.commit()
+    assert dispatch_sos(alert.id) == (False, "User not found")
@@ -0,0 +1,62 @@
+from datetime import datetime
+from sqlalchemy import select
+from app.extensions import db
+from app.models.user import User
+from app.utils import otp
+from app.utils.query_audit import _hot_queries, run_audit
+from app.utils.query_stats import track_queries
+import re
+
+INLINE_QUERIES = (
+    "user by phone (OTP login)", "trusted contacts of user", "settings of user", "device by MAC",
+    "latest device of user", "connected device of user", "active ML model", "support tickets of user",
+)
+
+
+def test_hot_queries_use_indexes(runner):
+    result = runner.invoke(args=['explain-audit', '--seed-rows', '20'])
+    assert result.exit_code == 0, result.output
+    assert 'SCAN ' not in result.output
+    # Seeded rows are rolled back
+    assert User.query.count() == 0
+
+
+def test_audit_flags_full_scans(app):
+    [(name, plan, scans)] = run_audit(seed_rows=0, queries=[
+        ("users by name", select(User).where(User.full_name == 'Nobody'))
+    ])
+    assert scans == ['users']
+
+
+def _normalize(sql):
+    """Statement text from FROM on, without whitespace or column aliases."""
+    sql = re.sub(r' AS \w+', '', ' '.join(str(sql).split()))
+    return sql[sql.find(' FROM '):]
+
+
+def test_inline_audit_queries_match_the_routes(app, client, auth_header, monkeypatch):
+    """The inline lookups in _hot_queries() must stay what the routes actually run."""
+    from app.services import protection_service
+    user = User.query.filter_by(email='auth_test@example.com').first()
+    monkeypatch.setattr(otp.secrets, 'choice', lambda digits: '7')
+    monkeypatch.setattr(protection_service, '_model', None)
+
+    with track_queries('audit_sync') as stats:
+        client.post('/api/auth/send-otp', json={"phone": "9876543210"})
+        client.post('/api/auth/verify-otp', json={"phone": "9876543210", "otp_code": "777777"})
+        client.post('/api/location/share/start', headers=auth_header)
+        client.put('/api/settings', headers=auth_header, json={"emergency_number": "112"})
+        client.post('/api/device/register', headers=auth_header,
+                    json={"device_name": "Bracelet", "device_mac": "00:11:22:33:44:55"})
+        client.get('/api/device/status', headers=auth_header)
+        client.get('/api/support/tickets', headers=auth_header)
+        protection_service.get_protection_status(user.id)
+        protection_service._get_model()
+    ran = {_normalize(statement) for statement in stats.statements}
+
+    audited = [(name, statement) for name, statement in _hot_queries(user.id, datetime.utcnow())
+               if name in INLINE_QUERIES]
+    assert len(audited) == len(INLINE_QUERIES)
+    for name, statement in audited:
+        sql = statement.compile(dialect=db.engine.dialect, compile_kwargs={'render_postcompile': True})
+        assert _normalize(sql) in ran, name
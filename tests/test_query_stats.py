@@ -0,0 +1,100 @@
+import logging
+from sqlalchemy import text
+from app.extensions import db
+from app.utils import metrics
+from app.utils.query_stats import track_queries
+
+
+def test_request_query_headers(client, auth_header):
+    response = client.get('/api/user/profile', headers=auth_header)
+    assert int(response.headers['X-DB-Queries']) >= 1
+    assert float(response.headers['X-DB-Time']) >= 0
+
+
+def test_nested_scopes_and_slow_query_log(app, caplog, monkeypatch):
+    from app.utils import query_stats
+    monkeypatch.setattr(query_stats, '_slow_query_seconds', 0)
+    metrics.reset()
+
+    with caplog.at_level(logging.WARNING, logger='app.utils.query_stats'):
+        with track_queries('outer') as outer:
+            db.session.execute(text('SELECT 1'))
+            with track_queries('inner') as inner:
+                db.session.execute(text('SELECT 2'))
+
+    assert (outer.count, inner.count) == (2, 1)
+    assert outer.statements == ['SELECT 1', 'SELECT 2']
+    assert 'Slow query' in caplog.text and 'in inner: SELECT 2' in caplog.text
+    assert metrics.get_value('db_slow_queries_total', scope='outer') == 1
+
+
+def test_failed_statement_leaves_no_timing_behind(app):
+    import pytest
+    from sqlalchemy.exc import OperationalError
+
+    with track_queries('errors') as stats:
+        with pytest.raises(OperationalError):
+            db.session.execute(text('SELECT * FROM no_such_table'))
+        db.session.rollback()
+        db.session.execute(text('SELECT 1'))
+    assert stats.count == 1
+    assert 'query_started' not in db.session.connection().info
+
+
+def test_sos_trigger_query_budget(client, auth_header, query_budget):
+    from flask import g
+
+    client.post('/api/contacts', headers=auth_header, json={"name": "Mom", "phone": "+1234567890"})
+    client.get('/api/user/profile', headers=auth_header) # Warm the user context cache
+    g.pop('user_contexts', None) # Tests share one app context; a real request starts without it
+
+    # User context, countdown check, contacts-with-app lookup, alert + outbox writes, then inline delivery
+    with query_budget(15) as stats:
+        response = client.post('/api/sos/trigger', headers=auth_header, json={"latitude": 1.0, "longitude": 2.0})
+    assert response.status_code == 201
+    # Recipients are read past the cache, once, with settings joined in
+    context_loads = [s for s in stats.statements if 'trusted_contacts' in s and 'user_settings' in s]
+    assert len(context_loads) == 1
+    assert not any(s.lstrip().startswith('SELECT') and 'FROM user_settings' in s for s in stats.statements)
+
+
+def test_location_update_and_batch_query_budgets(client, auth_header, query_budget):
+    # History insert, latest-point upsert, and the user's geofences on first sight
+    with query_budget(3):
+        response = client.post('/api/location/update', headers=auth_header, json={"latitude": 12.0, "longitude": 77.0})
+    assert response.status_code == 200
+
+    # However many points: one multi-row history insert and one latest-point upsert
+    points = [{"latitude": 12.0 + i / 1000, "longitude": 77.0, "recorded_at": f"2026-10-18T10:{i:02d}:00Z"}
+              for i in range(50)]
+    with query_budget(2):
+        response = client.post('/api/location/batch', headers=auth_header, json={"points": points})
+    assert response.status_code == 200
+
+
+def test_contacts_query_budgets(client, auth_header, app, query_budget):
+    from flask import g
+
+    # Limit check (user context, read fresh), insert, reload of the new row
+    with query_budget(3):
+        response = client.post('/api/contacts', headers=auth_header, json={"name": "Mom", "phone": "+1234567890"})
+    assert response.status_code == 201
+
+    app.extensions['user_context_cache'].clear()
+    g.pop('user_contexts', None)
+    with query_budget(1):
+        response = client.get('/api/contacts', headers=auth_header)
+    assert response.status_code == 200
+    with query_budget(0):
+        client.get('/api/contacts', headers=auth_header)
+
+
+def test_tracking_view_query_budget(client, auth_header, app, query_budget):
+    client.post('/api/location/update', headers=auth_header, json={"latitude": 12.0, "longitude": 77.0})
+    session_id = client.post('/api/location/share/start', headers=auth_header).get_json()['data']['sharing_session_id']
+
+    # Session, latest point, display name; then nothing until something changes
+    with query_budget(3):
+        assert client.get(f'/track/{session_id}').status_code == 200
+    with query_budget(0):
+        assert client.get(f'/track/{session_id}').status_code == 200
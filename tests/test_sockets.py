@@ -0,0 +1,294 @@
+import time
+import pytest
+from app import create_app, db
+from app.extensions import socketio
+from tests.conftest import TestConfig
+
+
+def _login(client):
+    client.post('/api/auth/register/email', json={
+        "email": "socket_test@example.com",
+        "password": "password123",
+        "full_name": "Socket User",
+        "country": "India"
+    })
+    resp = client.post('/api/auth/login/email', json={
+        "email": "socket_test@example.com",
+        "password": "password123"
+    })
+    from app.models.user import User
+    user = User.query.filter_by(email="socket_test@example.com").first()
+    return resp.get_json()['data']['access_token'], user.id
+
+
+def _wait_for(sio_client, event, namespace='/location', timeout=3.0):
+    deadline = time.time() + timeout
+    received = []
+    while time.time() < deadline:
+        received.extend(sio_client.get_received(namespace))
+        matches = [msg for msg in received if msg['name'] == event]
+        if matches:
+            return matches
+        time.sleep(0.05)
+    return []
+
+
+class QueueConfig(TestConfig):
+    SOCKETIO_MESSAGE_QUEUE = 'memory://' # In-process stand-in for Redis
+
+
+@pytest.fixture
+def queue_app():
+    app = create_app(QueueConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def test_location_broadcast_reaches_tracking_room(client, app):
+    token, user_id = _login(client)
+
+    viewer = socketio.test_client(app, namespace='/location', query_string=f'token={token}')
+    viewer.emit('join_tracking', {'target_user_id': user_id}, namespace='/location')
+    viewer.get_received('/location')
+
+    client.post('/api/location/update', headers={'Authorization': f'Bearer {token}'}, json={
+        "latitude": 12.9716, "longitude": 77.5946, "is_sharing": True
+    })
+
+    updates = _wait_for(viewer, 'location_update')
+    assert updates and updates[0]['args'][0]['latitude'] == 12.9716
+    viewer.disconnect(namespace='/location')
+
+
+def test_emits_go_through_message_queue(queue_app, monkeypatch):
+    """With a message queue configured, emits are published to it (the web
+    worker holding the connection delivers them), as they would be from Celery."""
+    from socketio import KombuManager
+    from app.services.broadcast_service import emit_to_room, user_room
+
+    manager = socketio.server.manager
+    assert isinstance(manager, KombuManager)
+    published = []
+    monkeypatch.setattr(manager, '_publish', published.append)
+
+    assert emit_to_room('sos_delivery', {'alert_id': 'a1', 'sent': 2}, user_room('u1'))
+
+    assert len(published) == 1
+    message = published[0]
+    assert message['method'] == 'emit'
+    assert message['event'] == 'sos_delivery'
+    assert message['room'] == 'user_u1'
+    assert message['namespace'] == '/location'
+
+
+def test_socket_authenticates_once_per_connection(client, app, monkeypatch):
+    from app.models.location import UserLastLocation
+    from app.sockets import location_socket
+
+    token, user_id = _login(client)
+    sio = socketio.test_client(app, namespace='/location', auth={'token': token})
+    assert sio.is_connected('/location')
+
+    decodes = []
+    real_decode = location_socket.decode_token
+    monkeypatch.setattr(location_socket, 'decode_token', lambda t: decodes.append(t) or real_decode(t))
+
+    # No token in the payload, and no JWT verification per event
+    for lat in (12.90, 12.91, 12.92):
+        sio.emit('location_update', {'latitude': lat, 'longitude': 77.5}, namespace='/location')
+    assert decodes == []
+    assert UserLastLocation.query.get(user_id).latitude == 12.92
+    sio.disconnect(namespace='/location')
+
+
+def test_socket_rejects_expired_identity_until_refreshed(client, app, monkeypatch):
+    from types import SimpleNamespace
+    from app.sockets import location_socket
+
+    token, user_id = _login(client)
+    sio = socketio.test_client(app, namespace='/location', query_string=f'token={token}')
+    sio.get_received('/location')
+
+    real_time = time.time
+    monkeypatch.setattr(location_socket, 'time', SimpleNamespace(time=lambda: real_time() + 7 * 24 * 3600))
+    sio.emit('join_tracking', {'target_user_id': user_id}, namespace='/location')
+    errors = [m['args'][0] for m in sio.get_received('/location') if m['name'] == 'error']
+    assert errors and errors[0]['code'] == 'TOKEN_EXPIRED'
+
+    # A fresh token issued "later" is accepted and the connection carries on
+    monkeypatch.setattr(location_socket, 'time', SimpleNamespace(time=real_time))
+    sio.emit('refresh_auth', {'token': token}, namespace='/location')
+    sio.emit('join_tracking', {'target_user_id': user_id}, namespace='/location')
+    names = [m['name'] for m in sio.get_received('/location')]
+    assert names == ['auth_refreshed', 'joined']
+    sio.disconnect(namespace='/location')
+
+
+def test_socket_connect_requires_valid_token(app):
+    sio = socketio.test_client(app, namespace='/location', query_string='token=garbage')
+    assert not sio.is_connected('/location')
+
+
+def test_broadcast_skipped_when_nobody_is_tracking(client, app, monkeypatch):
+    from app.services import broadcast_service
+
+    token, user_id = _login(client)
+    emitted = []
+    monkeypatch.setattr(broadcast_service, 'emit_to_room', lambda *args, **kwargs: emitted.append(args) or True)
+
+    client.post('/api/location/update', headers={'Authorization': f'Bearer {token}'}, json={
+        "latitude": 12.9716, "longitude": 77.5946, "is_sharing": True
+    })
+
+    assert emitted == []
+    assert app.extensions.get('user_display_cache') is None or app.extensions['user_display_cache'].get(user_id) is None
+
+    # Once a viewer joins (and after they leave) occupancy follows
+    viewer = socketio.test_client(app, namespace='/location', query_string=f'token={token}')
+    viewer.emit('join_tracking', {'target_user_id': user_id}, namespace='/location')
+    viewer.emit('join_tracking', {'target_user_id': user_id}, namespace='/location')
+    assert broadcast_service.room_occupancy(broadcast_service.tracking_room(user_id)) == 1
+    viewer.disconnect(namespace='/location')
+    assert broadcast_service.room_occupancy(broadcast_service.tracking_room(user_id)) == 0
+
+
+def test_broadcast_not_skipped_across_workers_without_shared_occupancy(queue_app, monkeypatch):
+    """With a message queue but no CACHE_REDIS_URL, a viewer may be connected to
+    another worker, so broadcasts go out even with no local joins."""
+    from app.services import broadcast_service
+
+    assert not queue_app.config.get('CACHE_REDIS_URL')
+    client = queue_app.test_client()
+    token, user_id = _login(client)
+    emitted = []
+    monkeypatch.setattr(broadcast_service, 'emit_to_room', lambda *args, **kwargs: emitted.append(args) or True)
+
+    client.post('/api/location/update', headers={'Authorization': f'Bearer {token}'}, json={
+        "latitude": 12.9716, "longitude": 77.5946, "is_sharing": True
+    })
+
+    assert [args[2] for args in emitted] == [broadcast_service.tracking_room(user_id)]
+
+
+def test_broadcasts_are_throttled_per_room(client, app, monkeypatch):
+    from app.services import broadcast_service
+
+    app.config['LOCATION_BROADCAST_MIN_INTERVAL'] = 0.2
+    token, user_id = _login(client)
+    viewer = socketio.test_client(app, namespace='/location', query_string=f'token={token}')
+    viewer.emit('join_tracking', {'target_user_id': user_id}, namespace='/location')
+    viewer.get_received('/location')
+
+    headers = {'Authorization': f'Bearer {token}'}
+    for lat in (12.90, 12.91, 12.92, 12.93):
+        client.post('/api/location/update', headers=headers, json={"latitude": lat, "longitude": 77.5, "is_sharing": True})
+
+    time.sleep(0.5)
+    updates = [m['args'][0]['latitude'] for m in viewer.get_received('/location') if m['name'] == 'location_update']
+    # First update immediately, the rest merged into one carrying the latest point
+    assert updates == [12.90, 12.93]
+    viewer.disconnect(namespace='/location')
+
+
+def test_profile_update_invalidates_broadcast_name(client, app):
+    from app.services.broadcast_service import get_user_display
+
+    token, user_id = _login(client)
+    assert get_user_display(user_id)['name'] == 'Socket User'
+
+    client.put('/api/user/profile', headers={'Authorization': f'Bearer {token}'}, json={"full_name": "Renamed User"})
+
+    assert get_user_display(user_id)['name'] == 'Renamed User'
+
+
+def test_rename_on_another_worker_reaches_the_display_cache(client, app):
+    from app import db
+    from app.models.user import User
+    from app.services.broadcast_service import get_user_display
+    from app.utils.cache_invalidation import caches_synced
+
+    _, user_id = _login(client)
+    assert get_user_display(user_id)['name'] == 'Socket User'
+
+    # Another worker renames the user and publishes the invalidation
+    db.session.get(User, user_id).full_name = 'Renamed User'
+    db.session.commit()
+    assert get_user_display(user_id)['name'] == 'Socket User'
+    caches_synced()
+    app.extensions['cache_invalidation'].apply('user_display_cache', [user_id])
+    assert get_user_display(user_id)['name'] == 'Renamed User'
+
+
+def test_join_tracking_matches_normalized_phone_and_caches_authorization(client, app, auth_header):
+    from app.models.user import User
+    from app.utils import metrics
+
+    target_id = User.query.filter_by(email="auth_test@example.com").first().id
+    resp = client.post('/api/contacts', headers=auth_header, json={"name": "Guardian", "phone": "098765 43210"})
+    contact_id = resp.get_json()['data']['id']
+    assert resp.get_json()['data']['phone'] == '+919876543210'
+
+    token, _ = _login(client)
+    client.put('/api/user/profile', headers={'Authorization': f'Bearer {token}'}, json={"phone": "+91 98765-43210"})
+
+    def join():
+        viewer = socketio.test_client(app, namespace='/location', query_string=f'token={token}')
+        viewer.get_received('/location')
+        viewer.emit('join_tracking', {'target_user_id': target_id}, namespace='/location')
+        names = [m['name'] for m in viewer.get_received('/location')]
+        viewer.disconnect(namespace='/location')
+        return names
+
+    hits = metrics.get_value('tracking_authz_lookups_total', result='hit') or 0
+    assert join() == ['joined']
+    assert join() == ['joined'] # reconnect: answered from cache
+    assert (metrics.get_value('tracking_authz_lookups_total', result='hit') or 0) == hits + 1
+
+    # Removing the contact takes effect immediately
+    client.delete(f'/api/contacts/{contact_id}', headers=auth_header)
+    assert join() == ['error']
+
+
+def test_tracking_authz_cache_bypassed_while_invalidations_may_be_missed(client, auth_header, app):
+    from app.services.tracking_service import can_track
+    from app.utils import metrics
+    from app.utils.cache_invalidation import caches_synced
+
+    from app.models.user import User
+
+    target_id = User.query.filter_by(email="auth_test@example.com").first().id
+    client.post('/api/contacts', headers=auth_header, json={"name": "Viewer", "phone": "+919876543210"})
+    token, viewer_id = _login(client)
+    client.put('/api/user/profile', headers={'Authorization': f'Bearer {token}'}, json={"phone": "+919876543210"})
+
+    assert can_track(viewer_id, target_id)
+    caches_synced() # creates the invalidator
+    app.extensions['cache_invalidation'].synced = False
+    misses = metrics.get_value('tracking_authz_lookups_total', result='miss') or 0
+    assert can_track(viewer_id, target_id)
+    assert metrics.get_value('tracking_authz_lookups_total', result='miss') == misses + 1
+
+
+def test_socket_refuses_revoked_and_refresh_tokens(client, app):
+    token, user_id = _login(client)
+    refresh = client.post('/api/auth/login/email', json={
+        "email": "socket_test@example.com", "password": "password123"
+    }).get_json()['data']['refresh_token']
+
+    sio = socketio.test_client(app, namespace='/location', query_string=f'token={refresh}')
+    assert not sio.is_connected('/location')
+
+    live = socketio.test_client(app, namespace='/location', auth={'token': token})
+    assert live.is_connected('/location')
+    live.get_received('/location')
+    client.post('/api/auth/logout', headers={'Authorization': f'Bearer {token}'})
+
+    sio = socketio.test_client(app, namespace='/location', auth={'token': token})
+    assert not sio.is_connected('/location')
+    live.emit('refresh_auth', {'token': token}, namespace='/location')
+    errors = [m['args'][0] for m in live.get_received('/location') if m['name'] == 'error']
+    assert errors and errors[0]['code'] == 'UNAUTHORIZED'
+    live.disconnect(namespace='/location')
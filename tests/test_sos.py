@@ -42,3 +42,53 @@ def test_get_sos_history(client, auth_header):
     data = json.loads(response.data)
     assert isinstance(data['data'], list)
     assert len(data['data']) >= 1
+
+def _countdown(user_id, age_seconds):
+    from app.models.sos_alert import SOSAlert
+    from app import db
+    from datetime import datetime, timedelta
+    alert = SOSAlert(
+        user_id=user_id, trigger_type='manual', latitude=0.0, longitude=0.0,
+        status='countdown', sos_message="Help", contacted_numbers=[],
+        triggered_at=datetime.utcnow() - timedelta(seconds=age_seconds)
+    )
+    db.session.add(alert)
+    db.session.commit()
+    return alert.id
+
+def test_sweeper_expires_stale_countdowns(client, auth_header):
+    """Stale countdowns are cancelled in bulk; live ones are left alone."""
+    from app.models.sos_alert import SOSAlert
+    from app.models.user import User
+    from app.tasks.sos_tasks import expire_countdowns
+
+    user = User.query.filter_by(email="auth_test@example.com").first()
+    stale_id = _countdown(user.id, 600)
+    live_id = _countdown(user.id, 5)
+
+    swept = expire_countdowns.apply().get()
+
+    assert swept == 1
+    assert SOSAlert.query.get(stale_id).status == 'cancelled'
+    assert SOSAlert.query.get(stale_id).resolved_at is not None
+    assert SOSAlert.query.get(live_id).status == 'countdown'
+
+def test_trigger_ignores_stale_countdown(client, auth_header):
+    """A countdown past its expiry doesn't block a new SOS, even before the sweep runs."""
+    from app.models.user import User
+
+    client.post('/api/contacts', headers=auth_header, json={
+        "name": "Mom",
+        "phone": "+1234567890",
+        "relationship": "Parent"
+    })
+    user = User.query.filter_by(email="auth_test@example.com").first()
+    stale_id = _countdown(user.id, 600)
+
+    response = client.post('/api/sos/trigger', headers=auth_header, json={
+        "latitude": 37.7749,
+        "longitude": -122.4194,
+        "trigger_type": "manual"
+    })
+    assert response.status_code == 201
+    assert json.loads(response.data)['data']['alert_id'] != stale_id
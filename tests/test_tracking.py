@@ -0,0 +1,77 @@
+import json
+import time
+from sqlalchemy import event
+
+def _start(client, auth_header):
+    client.post('/api/location/update', headers=auth_header, json={"latitude": 12.9716, "longitude": 77.5946})
+    data = json.loads(client.post('/api/location/share/start', headers=auth_header).data)['data']
+    return data['sharing_session_id'], data['tracking_url']
+
+def test_tracking_link_is_persisted_and_viewable(client, auth_header):
+    session_id, tracking_url = _start(client, auth_header)
+    assert tracking_url.endswith(f"/track/{session_id}")
+
+    response = client.get(f'/track/{session_id}')
+    assert response.status_code == 200
+    data = json.loads(response.data)['data']
+    assert data['name'] == 'Auth User'
+    assert data['is_sharing'] is True
+    assert data['location']['latitude'] == 12.9716
+
+def test_tracking_views_are_served_from_cache_with_etags(client, auth_header, app):
+    from app import db
+
+    session_id, _ = _start(client, auth_header)
+    first = client.get(f'/track/{session_id}')
+    etag = first.headers['ETag']
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        for _ in range(5):
+            response = client.get(f'/track/{session_id}', headers={'If-None-Match': etag})
+            assert response.status_code == 304
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert statements == []
+
+    # A new position changes the ETag
+    client.post('/api/location/update', headers=auth_header, json={"latitude": 13.0, "longitude": 77.6, "is_sharing": True})
+    response = client.get(f'/track/{session_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert json.loads(response.data)['data']['location']['latitude'] == 13.0
+
+def test_tracking_long_poll_times_out_with_304(client, auth_header, app):
+    app.config['TRACKING_LONG_POLL_INTERVAL'] = 0.05
+    session_id, _ = _start(client, auth_header)
+    etag = client.get(f'/track/{session_id}').headers['ETag']
+
+    started = time.monotonic()
+    response = client.get(f'/track/{session_id}?wait=0.3', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert time.monotonic() - started >= 0.3
+
+def test_stopped_or_unknown_tracking_link_is_not_found(client, auth_header):
+    session_id, _ = _start(client, auth_header)
+    client.post('/api/location/share/stop', headers=auth_header)
+
+    assert client.get(f'/track/{session_id}').status_code == 404
+    assert client.get('/track/does-not-exist').status_code == 404
+
+def test_tracking_link_ended_on_another_worker_is_not_served(client, auth_header, app):
+    from datetime import datetime
+    from app import db
+    from app.models.tracking_session import TrackingSession
+    from app.utils.cache_invalidation import caches_synced
+
+    session_id, _ = _start(client, auth_header)
+    assert client.get(f'/track/{session_id}').status_code == 200 # now cached on this worker
+
+    # Another worker ends the link and publishes the invalidation
+    db.session.get(TrackingSession, session_id).ended_at = datetime.utcnow()
+    db.session.commit()
+    assert client.get(f'/track/{session_id}').status_code == 200
+    caches_synced()
+    app.extensions['cache_invalidation'].apply('tracking_session_cache', [session_id])
+    assert client.get(f'/track/{session_id}').status_code == 404